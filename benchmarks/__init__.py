@@ -0,0 +1,5 @@
+"""离线性能基准工具
+
+使用本地模拟服务代替真实的 provider API，不消耗 API 额度。
+在插件根目录下运行，例如: python -m benchmarks.bench_providers --help
+"""
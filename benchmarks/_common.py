@@ -0,0 +1,120 @@
+"""基准工具公共函数"""
+
+import asyncio
+import importlib
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Optional
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_plugin_module(name: str) -> ModuleType:
+    """以包的形式导入插件内的模块（插件代码使用相对导入）"""
+    parent = str(PLUGIN_ROOT.parent)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    return importlib.import_module(f"{PLUGIN_ROOT.name}.{name}")
+
+
+def percentile(values: list[float], q: float) -> float:
+    """最近秩法分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存 (MB)"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return usage / 1024 / 1024 if sys.platform == "darwin" else usage / 1024
+
+
+def current_rss_mb() -> float:
+    """当前常驻内存 (MB)，无法读取时返回峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def open_sockets() -> Optional[int]:
+    """当前进程打开的 socket 数（仅 Linux）"""
+    fd_dir = "/proc/self/fd"
+    if not os.path.isdir(fd_dir):
+        return None
+    count = 0
+    for fd in os.listdir(fd_dir):
+        try:
+            if os.readlink(os.path.join(fd_dir, fd)).startswith("socket:"):
+                count += 1
+        except OSError:
+            continue
+    return count
+
+
+class ResourceSampler:
+    """后台定期采样内存和 socket 数，记录峰值"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.max_rss_mb = 0.0
+        self.max_sockets = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def sample(self) -> None:
+        self.max_rss_mb = max(self.max_rss_mb, current_rss_mb())
+        sockets = open_sockets()
+        if sockets is not None:
+            self.max_sockets = max(self.max_sockets, sockets)
+
+    def __enter__(self) -> "ResourceSampler":
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.sample()
+        if self._task is not None:
+            self._task.cancel()
+
+
+class LatencyRecorder:
+    """记录一轮压测中每个请求的耗时和结果"""
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.started = time.monotonic()
+        self.finished = self.started
+
+    def record(self, seconds: float, ok: bool) -> None:
+        if ok:
+            self.latencies.append(seconds)
+        else:
+            self.errors += 1
+        self.finished = time.monotonic()
+
+    def summary(self) -> dict[str, float]:
+        elapsed = max(1e-9, self.finished - self.started)
+        return {
+            "ok": len(self.latencies),
+            "errors": self.errors,
+            "throughput": len(self.latencies) / elapsed,
+            "p50": percentile(self.latencies, 50),
+            "p95": percentile(self.latencies, 95),
+            "p99": percentile(self.latencies, 99),
+        }
@@ -0,0 +1,127 @@
+"""Base64 响应解码对事件循环延迟的影响
+
+构造与 SeeDream 组图响应相同结构的 JSON（data 中若干 b64_json），
+分别在事件循环中直接解码（原先的行为）和通过 providers.decoding 按大小放到线程池解码，
+同时运行一个每毫秒唤醒一次的协程，统计其唤醒延迟（事件循环被阻塞的时间）。
+
+用法 (在插件根目录下):
+    python -m benchmarks.bench_decode
+    python -m benchmarks.bench_decode --payload-kb 1024,4096,16384 --images 4 --json decode.json
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+from pathlib import Path
+
+from ._common import import_plugin_module, percentile
+
+TICK_SECONDS = 0.001
+
+
+def make_response(payload_kb: int, images: int) -> bytes:
+    """构造响应体，每张图片 payload_kb KB 随机数据"""
+    data = [
+        {"b64_json": base64.b64encode(os.urandom(payload_kb * 1024)).decode()}
+        for _ in range(images)
+    ]
+    return json.dumps({"data": data}).encode()
+
+
+def decode_inline(raw: bytes) -> list[bytes]:
+    """原先的实现：在事件循环中解析 JSON 并解码每张图片"""
+    result = json.loads(raw)
+    return [base64.b64decode(item["b64_json"]) for item in result["data"]]
+
+
+async def decode_offloaded(decoding, raw: bytes, threshold: int) -> list[bytes]:
+    result = await decoding.loads_json(raw, threshold)
+    return [
+        await decoding.b64decode(item["b64_json"], threshold)
+        for item in result["data"]
+    ]
+
+
+async def measure(decode, rounds: int) -> dict:
+    """在运行 decode 的同时测量事件循环的唤醒延迟"""
+    lags: list[float] = []
+    stop = False
+
+    async def ticker() -> None:
+        while not stop:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - start - TICK_SECONDS))
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await decode()
+        # 让出一次，模拟两次响应之间的其他处理
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    stop = True
+    await task
+    return {
+        "decode_ms": elapsed / rounds * 1000,
+        "lag_p50_ms": percentile(lags, 50) * 1000,
+        "lag_p99_ms": percentile(lags, 99) * 1000,
+        "lag_max_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+async def run(args) -> dict:
+    decoding = import_plugin_module("providers.decoding")
+    threshold = args.threshold_kb * 1024
+    report = {}
+    print(
+        f"{'payload':>10} {'mode':<9} {'decode(ms)':>11} {'lag p50':>8} "
+        f"{'lag p99':>8} {'lag max':>8}"
+    )
+    for payload_kb in args.payload_kb:
+        raw = make_response(payload_kb, args.images)
+
+        async def inline():
+            decode_inline(raw)
+
+        async def offloaded():
+            await decode_offloaded(decoding, raw, threshold)
+
+        for mode, decode in (("inline", inline), ("offload", offloaded)):
+            result = await measure(decode, args.rounds)
+            report[f"{payload_kb}KB/{mode}"] = result
+            print(
+                f"{payload_kb:>8}KB {mode:<9} {result['decode_ms']:>11.1f} "
+                f"{result['lag_p50_ms']:>8.2f} {result['lag_p99_ms']:>8.2f} "
+                f"{result['lag_max_ms']:>8.2f}"
+            )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Base64 响应解码的事件循环延迟基准")
+    parser.add_argument(
+        "--payload-kb",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[256, 1024, 4096],
+        help="每张图片的大小 (KB)，逗号分隔",
+    )
+    parser.add_argument("--images", type=int, default=4, help="每个响应的图片数")
+    parser.add_argument("--rounds", type=int, default=10, help="每种模式解码的响应数")
+    parser.add_argument(
+        "--threshold-kb", type=int, default=256, help="放到线程池解码的阈值 (KB)"
+    )
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""插件导入耗时和内存基准
+
+在全新的子进程中导入插件的 core 和 providers 包，再按配置加载 provider，
+比较只加载所配置 provider 与加载全部 provider（原先的行为）时的耗时和常驻内存。
+插件入口 main.py 依赖 AstrBot，这里只测量插件自身的导入开销。
+
+用法 (在插件根目录下):
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --repeat 10 --json import.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from ._common import PLUGIN_ROOT, current_rss_mb, import_plugin_module
+
+# 场景名 -> 加载的 provider 列表
+SCENARIOS = {
+    "none": [],
+    "aliyun": ["aliyun"],
+    "volcengine": ["volcengine"],
+    "gitee": ["gitee"],
+    "all (eager)": ["gitee", "aliyun", "volcengine"],
+}
+
+
+def child(providers: list[str]) -> None:
+    """子进程：导入插件并加载指定 provider，输出一行 JSON"""
+    rss_before = current_rss_mb()
+    modules_before = len(sys.modules)
+    start = time.perf_counter()
+    import_plugin_module("core")
+    registry = import_plugin_module("providers").PROVIDER_REGISTRY
+    for name in providers:
+        registry[name]
+    elapsed = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "seconds": elapsed,
+                "rss_mb": current_rss_mb() - rss_before,
+                "modules": len(sys.modules) - modules_before,
+                "openai_loaded": "openai" in sys.modules,
+                "httpx_loaded": "httpx" in sys.modules,
+            }
+        )
+    )
+
+
+def run_scenario(providers: list[str], repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_import",
+                "--child",
+                ",".join(providers),
+            ],
+            cwd=PLUGIN_ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "seconds": statistics.median(s["seconds"] for s in samples),
+        "rss_mb": statistics.median(s["rss_mb"] for s in samples),
+        "modules": samples[-1]["modules"],
+        "openai_loaded": samples[-1]["openai_loaded"],
+        "httpx_loaded": samples[-1]["httpx_loaded"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="插件导入耗时和内存基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景的子进程次数")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child([name for name in args.child.split(",") if name])
+        return
+
+    report = {}
+    print(
+        f"{'scenario':<14} {'import(ms)':>11} {'rss(MB)':>8} {'modules':>8} "
+        f"{'openai':>7} {'httpx':>6}"
+    )
+    for name, providers in SCENARIOS.items():
+        result = report[name] = run_scenario(providers, args.repeat)
+        print(
+            f"{name:<14} {result['seconds'] * 1000:>11.1f} {result['rss_mb']:>8.1f} "
+            f"{result['modules']:>8} {str(result['openai_loaded']):>7} "
+            f"{str(result['httpx_loaded']):>6}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
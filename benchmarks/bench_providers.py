@@ -0,0 +1,212 @@
+"""provider 与存储热路径的离线压测
+
+启动本地模拟服务，在逐级增加的并发下驱动 provider 或插件的
+MultiPlatformText2Image._generate_images，输出吞吐量、p50/p95/p99 延迟、
+峰值内存和打开的 socket 数。
+
+用法:
+    python -m benchmarks.bench_providers --target provider --concurrency 1,8,32
+    python -m benchmarks.bench_providers --target plugin --mode b64 --payload-kb 4096
+
+--target plugin 需要在安装了 AstrBot 的环境中运行。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from ._common import LatencyRecorder, ResourceSampler, import_plugin_module
+from .mock_servers import MockProviderServer, add_profile_arguments, profile_from_args
+
+DEFAULT_MODELS = {
+    "gitee": "z-image-turbo",
+    "aliyun": "z-image-turbo",
+    "volcengine": "doubao-seedream-4-5-251128",
+}
+BENCH_API_KEYS = ["bench-key-1", "bench-key-2", "bench-key-3"]
+
+
+async def run_level(
+    func: Callable[[int], Awaitable[None]], concurrency: int, requests: int
+) -> dict[str, float]:
+    """以固定并发执行 requests 次 func，返回统计结果"""
+    recorder = LatencyRecorder()
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        for index in counter:
+            start = time.monotonic()
+            try:
+                await func(index)
+                recorder.record(time.monotonic() - start, True)
+            except Exception:
+                recorder.record(time.monotonic() - start, False)
+
+    with ResourceSampler() as sampler:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    result = recorder.summary()
+    result["concurrency"] = concurrency
+    result["peak_rss_mb"] = sampler.max_rss_mb
+    result["peak_sockets"] = sampler.max_sockets
+    return result
+
+
+def make_provider(
+    providers_module, name: str, base_url: str, async_mode: bool = False
+):
+    """创建指向模拟服务的 provider"""
+    classes = {
+        "gitee": providers_module.GiteeProvider,
+        "aliyun": providers_module.AliyunProvider,
+        "volcengine": providers_module.VolcengineProvider,
+    }
+    return classes[name](
+        api_keys=BENCH_API_KEYS,
+        base_url=base_url,
+        model=DEFAULT_MODELS[name],
+        async_mode=async_mode,
+    )
+
+
+async def bench_provider(
+    name: str, server: MockProviderServer, args: argparse.Namespace, workdir: Path
+) -> list[dict]:
+    """直接压测 provider.generate_images_to_file"""
+    providers_module = import_plugin_module("providers")
+    provider = make_provider(
+        providers_module, name, server.base_urls[name], args.aliyun_async
+    )
+    resolutions = import_plugin_module("providers.resolutions")
+    size = resolutions.select_size(
+        provider.get_supported_ratios(), args.ratio, args.quality
+    )
+
+    def path_factory(extension: str) -> str:
+        return str(workdir / f"{os.urandom(6).hex()}{extension}")
+
+    async def one(index: int) -> None:
+        saved = await provider.generate_images_to_file(
+            f"bench prompt {index}", size, path_factory, args.images
+        )
+        for path, _ in saved:
+            os.remove(path)
+
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            results.append(await run_level(one, concurrency, args.requests))
+    finally:
+        await provider.close()
+    return results
+
+
+async def bench_plugin(
+    name: str, server: MockProviderServer, args: argparse.Namespace, workdir: Path
+) -> list[dict]:
+    """压测插件的 _generate_images（含缓存、存储和 provider 池）"""
+    main_module = import_plugin_module("main")
+    config = {
+        "provider": name,
+        "api_key": BENCH_API_KEYS,
+        "model": DEFAULT_MODELS[name],
+        "base_url": server.base_urls[name],
+        "cache_enabled": args.cache,
+        "http_warmup": False,
+        "metrics_snapshot_interval": 0,
+        "max_images_per_request": args.images,
+        "aliyun_async_mode": args.aliyun_async,
+    }
+    plugin = main_module.MultiPlatformText2Image(None, config)
+    plugin._image_dir = workdir
+
+    async def one(index: int) -> None:
+        # --repeat 控制重复提示词的比例，用于测量缓存和请求合并
+        prompt_id = index % max(1, int(args.requests * (1 - args.repeat)))
+        await plugin._generate_images(
+            f"bench prompt {prompt_id}", args.ratio, args.quality, args.images
+        )
+
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            results.append(await run_level(one, concurrency, args.requests))
+    finally:
+        await plugin.close()
+    return results
+
+
+def print_table(title: str, results: list[dict]) -> None:
+    print(f"\n== {title} ==")
+    print(
+        f"{'conc':>5} {'ok':>6} {'err':>5} {'req/s':>8} {'p50(s)':>8} "
+        f"{'p95(s)':>8} {'p99(s)':>8} {'rss(MB)':>8} {'sockets':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} {r['ok']:>6} {r['errors']:>5} "
+            f"{r['throughput']:>8.2f} {r['p50']:>8.3f} {r['p95']:>8.3f} "
+            f"{r['p99']:>8.3f} {r['peak_rss_mb']:>8.1f} {r['peak_sockets']:>8}"
+        )
+
+
+async def run(args: argparse.Namespace) -> dict[str, list[dict]]:
+    server = MockProviderServer(profile_from_args(args))
+    await server.start()
+    workdir = Path(tempfile.mkdtemp(prefix="t2img-bench-"))
+    bench = bench_plugin if args.target == "plugin" else bench_provider
+    report: dict[str, list[dict]] = {}
+    try:
+        for name in args.providers:
+            report[name] = await bench(name, server, args, workdir)
+            print_table(f"{args.target}:{name} ({args.mode})", report[name])
+    finally:
+        await server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="离线 provider 压测")
+    parser.add_argument("--target", choices=("provider", "plugin"), default="provider")
+    parser.add_argument(
+        "--providers",
+        type=lambda v: v.split(","),
+        default=["gitee", "aliyun", "volcengine"],
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=lambda v: [int(x) for x in v.split(",")],
+        default=[1, 4, 16, 64],
+    )
+    parser.add_argument("--requests", type=int, default=200, help="每级并发的请求数")
+    parser.add_argument("--ratio", default="1:1")
+    parser.add_argument("--quality", default="m")
+    parser.add_argument("--images", type=int, default=1, help="每个请求生成的图片数")
+    parser.add_argument(
+        "--aliyun-async", action="store_true", help="阿里百炼使用异步任务模式"
+    )
+    parser.add_argument("--cache", action="store_true", help="plugin 模式下启用结果缓存")
+    parser.add_argument(
+        "--repeat", type=float, default=0.0, help="plugin 模式下重复提示词的比例 (0-1)"
+    )
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""三个 provider API 的本地模拟服务
+
+- Gitee AI: OpenAI 兼容的 POST /gitee/v1/images/generations
+- 阿里百炼 DashScope: POST /aliyun/generation，异步任务模式为
+  POST /aliyun/services/aigc/text2image/image-synthesis 和 GET /aliyun/tasks/{id}
+- 字节火山 Ark: POST /ark/images/generations
+- 图片下载: GET /files/{name}
+
+每个模拟服务可配置延迟分布、错误率、图片大小，以及 URL / Base64 两种响应模式。
+DashScope 真实接口只返回 URL，因此阿里百炼模拟服务忽略 Base64 模式。
+
+也可单独启动供手动测试:
+    python -m benchmarks.mock_servers --port 18080 --latency-ms 800
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import random
+import time
+from typing import Optional
+
+from aiohttp import web
+
+# PNG 文件头，使模拟图片能被按图片处理
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+class MockProfile:
+    """模拟服务的行为配置"""
+
+    def __init__(
+        self,
+        latency_ms: float = 500.0,
+        latency_sigma: float = 0.3,
+        download_latency_ms: float = 50.0,
+        error_rate: float = 0.0,
+        error_statuses: tuple[int, ...] = (500, 502, 503, 429),
+        payload_kb: int = 512,
+        mode: str = "url",
+        images_per_request: int = 1,
+    ):
+        """初始化配置
+
+        Args:
+            latency_ms: 生成接口延迟中位数（对数正态分布）
+            latency_sigma: 对数正态分布的 sigma，0 表示固定延迟
+            download_latency_ms: 图片下载首字节延迟
+            error_rate: 生成接口返回错误的概率
+            error_statuses: 出错时随机返回的状态码
+            payload_kb: 图片大小 (KB)
+            mode: 响应模式，url 或 b64
+            images_per_request: 默认每次返回的图片数（请求中指定 n 时以请求为准）
+        """
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.download_latency_ms = download_latency_ms
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.payload_kb = payload_kb
+        self.mode = mode
+        self.images_per_request = images_per_request
+
+    def sample_latency(self) -> float:
+        """采样一次生成延迟（秒）"""
+        median = self.latency_ms / 1000
+        if self.latency_sigma <= 0:
+            return median
+        return random.lognormvariate(0, self.latency_sigma) * median
+
+
+class MockProviderServer:
+    """在单个端口上同时模拟三个 provider"""
+
+    def __init__(self, profile: Optional[MockProfile] = None):
+        self.profile = profile or MockProfile()
+        self.requests = 0
+        self.downloads = 0
+        self.task_polls = 0
+        # 异步任务: 任务 ID -> (完成时间, 图片数, 是否失败)
+        self._tasks: dict[str, tuple[float, int, bool]] = {}
+        self._payload: bytes = b""
+        self._runner: Optional[web.AppRunner] = None
+        self.base = ""
+
+    def _build_payload(self) -> bytes:
+        size = max(len(PNG_HEADER), self.profile.payload_kb * 1024)
+        return PNG_HEADER + os.urandom(size - len(PNG_HEADER))
+
+    @property
+    def payload(self) -> bytes:
+        if len(self._payload) != max(len(PNG_HEADER), self.profile.payload_kb * 1024):
+            self._payload = self._build_payload()
+        return self._payload
+
+    @property
+    def base_urls(self) -> dict[str, str]:
+        """各 provider 对应的 base_url"""
+        return {
+            "gitee": f"{self.base}/gitee/v1",
+            "aliyun": f"{self.base}/aliyun",
+            "volcengine": f"{self.base}/ark",
+        }
+
+    async def _simulate(self) -> Optional[web.Response]:
+        """模拟生成耗时和随机错误，出错时返回错误响应"""
+        self.requests += 1
+        await asyncio.sleep(self.profile.sample_latency())
+        if random.random() < self.profile.error_rate:
+            status = random.choice(self.profile.error_statuses)
+            return web.json_response(
+                {"error": {"message": f"mock error {status}"}}, status=status
+            )
+        return None
+
+    async def _image_count(self, request: web.Request) -> int:
+        try:
+            body = await request.json()
+        except Exception:
+            body = {}
+        count = body.get("n") or body.get("parameters", {}).get("n")
+        options = body.get("sequential_image_generation_options") or {}
+        count = count or options.get("max_images")
+        return max(1, int(count or self.profile.images_per_request))
+
+    def _image_items(self, count: int) -> list[dict]:
+        if self.profile.mode == "b64":
+            encoded = base64.b64encode(self.payload).decode()
+            return [{"b64_json": encoded} for _ in range(count)]
+        return [
+            {"url": f"{self.base}/files/{os.urandom(4).hex()}.png"}
+            for _ in range(count)
+        ]
+
+    async def handle_openai_images(self, request: web.Request) -> web.Response:
+        """Gitee AI 与 Ark 共用的 OpenAI 风格图片接口"""
+        count = await self._image_count(request)
+        error = await self._simulate()
+        if error is not None:
+            return error
+        return web.json_response({"created": 0, "data": self._image_items(count)})
+
+    async def handle_dashscope(self, request: web.Request) -> web.Response:
+        """DashScope 多模态生成接口（仅 URL 模式）"""
+        count = await self._image_count(request)
+        error = await self._simulate()
+        if error is not None:
+            return error
+        content = [
+            {"image": f"{self.base}/files/{os.urandom(4).hex()}.png"}
+            for _ in range(count)
+        ]
+        return web.json_response(
+            {"output": {"choices": [{"message": {"content": content}}]}}
+        )
+
+    async def handle_dashscope_submit(self, request: web.Request) -> web.Response:
+        """DashScope 异步任务提交：立即返回任务 ID，生成耗时体现在任务状态上"""
+        if request.headers.get("X-DashScope-Async") != "enable":
+            return web.json_response({"code": "InvalidParameter"}, status=400)
+        count = await self._image_count(request)
+        self.requests += 1
+        task_id = os.urandom(8).hex()
+        self._tasks[task_id] = (
+            time.monotonic() + self.profile.sample_latency(),
+            count,
+            random.random() < self.profile.error_rate,
+        )
+        return web.json_response(
+            {"output": {"task_id": task_id, "task_status": "PENDING"}}
+        )
+
+    async def handle_dashscope_task(self, request: web.Request) -> web.Response:
+        """DashScope 任务状态查询"""
+        self.task_polls += 1
+        task_id = request.match_info["task_id"]
+        task = self._tasks.get(task_id)
+        if task is None:
+            return web.json_response(
+                {"output": {"task_id": task_id, "task_status": "UNKNOWN"}}
+            )
+        ready_at, count, failed = task
+        if time.monotonic() < ready_at:
+            return web.json_response(
+                {"output": {"task_id": task_id, "task_status": "RUNNING"}}
+            )
+        del self._tasks[task_id]
+        if failed:
+            output = {
+                "task_id": task_id,
+                "task_status": "FAILED",
+                "code": "InternalError",
+                "message": "mock task failure",
+            }
+        else:
+            output = {
+                "task_id": task_id,
+                "task_status": "SUCCEEDED",
+                "results": [
+                    {"url": f"{self.base}/files/{os.urandom(4).hex()}.png"}
+                    for _ in range(count)
+                ],
+            }
+        return web.json_response({"output": output})
+
+    async def handle_file(self, request: web.Request) -> web.StreamResponse:
+        """图片下载"""
+        self.downloads += 1
+        await asyncio.sleep(self.profile.download_latency_ms / 1000)
+        return web.Response(body=self.payload, content_type="image/png")
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/gitee/v1/images/generations", self.handle_openai_images)
+        app.router.add_post("/ark/images/generations", self.handle_openai_images)
+        app.router.add_post("/aliyun/generation", self.handle_dashscope)
+        app.router.add_post(
+            "/aliyun/services/aigc/text2image/image-synthesis",
+            self.handle_dashscope_submit,
+        )
+        app.router.add_get("/aliyun/tasks/{task_id}", self.handle_dashscope_task)
+        app.router.add_get("/files/{name}", self.handle_file)
+        # 预热连接用的 HEAD 请求
+        app.router.add_route("HEAD", "/", lambda request: web.Response())
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """启动服务，返回根地址"""
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        sockets = site._server.sockets  # type: ignore[union-attr]
+        bound_port = sockets[0].getsockname()[1]
+        self.base = f"http://{host}:{bound_port}"
+        return self.base
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """向命令行解析器添加模拟服务参数"""
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--download-latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--error-statuses",
+        type=lambda v: tuple(int(x) for x in v.split(",")),
+        default=(500, 502, 503),
+        help="出错时随机返回的状态码，加入 429 可模拟限流",
+    )
+    parser.add_argument("--payload-kb", type=int, default=512)
+    parser.add_argument("--mode", choices=("url", "b64"), default="url")
+
+
+def profile_from_args(args: argparse.Namespace) -> MockProfile:
+    return MockProfile(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        download_latency_ms=args.download_latency_ms,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        payload_kb=args.payload_kb,
+        mode=args.mode,
+    )
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = MockProviderServer(profile_from_args(args))
+    await server.start(args.host, args.port)
+    for name, url in server.base_urls.items():
+        print(f"{name}: {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="启动模拟 provider 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    add_profile_arguments(parser)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""流量记录回放
+
+读取插件在 traffic_record_enabled 开启时写入的 traffic.jsonl，按记录中的到达时间
+（原速或加速）把请求送入插件，provider 指向本地模拟服务。请求走与命令相同的
+限流、质量降级和公平队列路径（不发送消息），可用真实的群聊突发模式检验
+排队、限流和图片清理策略。
+
+提示词原文不在记录中，回放时用提示词哈希和长度构造占位提示词，
+相同的提示词仍相同，缓存和请求合并的效果可以复现。
+加速回放时限流令牌和图片存活时间仍按真实时间计算，比较限流策略时
+应使用原速，或用 --set 将 rate_*_per_minute 按倍速放大。
+
+用法 (在插件根目录下，需要安装 AstrBot):
+    python -m benchmarks.replay traffic.jsonl
+    python -m benchmarks.replay traffic.jsonl.1 traffic.jsonl --speed 10 --max-gap 5
+    python -m benchmarks.replay traffic.jsonl --set max_concurrent_jobs=8 \\
+        --set rate_user_per_minute=3 --latency-from-trace --json replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from ._common import LatencyRecorder, ResourceSampler, import_plugin_module
+from .bench_providers import BENCH_API_KEYS, DEFAULT_MODELS
+from .mock_servers import MockProviderServer, add_profile_arguments, profile_from_args
+
+
+class ReplayEvent:
+    """回放用的最小消息事件，只提供限流和队列需要的接口"""
+
+    def __init__(self, user: str, group: str):
+        self.user = user or "anonymous"
+        self.group = group
+
+    def get_sender_id(self) -> str:
+        return self.user
+
+    def get_group_id(self) -> str:
+        return self.group
+
+    def get_platform_name(self) -> str:
+        return "replay"
+
+
+def load_records(paths: list[str], limit: int = 0) -> list[dict]:
+    """读取并按到达时间排序记录，跳过损坏的行"""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    records.sort(key=lambda r: r["t"])
+    return records[:limit] if limit > 0 else records
+
+
+def schedule(records: list[dict], speed: float, max_gap: float) -> list[float]:
+    """计算每条记录相对回放开始的发送时间，长于 max_gap 的空闲间隔被压缩"""
+    offsets = []
+    offset = 0.0
+    previous = records[0]["t"] if records else 0.0
+    for record in records:
+        gap = record["t"] - previous
+        if max_gap > 0:
+            gap = min(gap, max_gap)
+        offset += gap / speed
+        offsets.append(offset)
+        previous = record["t"]
+    return offsets
+
+
+def placeholder_prompt(fields: dict) -> str:
+    """由提示词哈希和长度构造占位提示词"""
+    prompt = f"replay {fields.get('prompt_hash') or 'prompt'}"
+    return prompt.ljust(max(len(prompt), fields.get("prompt_len", 0)), "x")
+
+
+class Replayer:
+    """把记录送入插件并统计结果"""
+
+    def __init__(self, plugin, prompt_module, queue_module):
+        self.plugin = plugin
+        self.ParsedPrompt = prompt_module.ParsedPrompt
+        self.QueueFullError = queue_module.QueueFullError
+        self.outcomes: Counter = Counter()
+        self.latency = LatencyRecorder()
+        self.peak_pending = 0
+        self.peak_running = 0
+
+    def sample_queue(self) -> None:
+        queue = self.plugin.job_queue
+        self.peak_pending = max(self.peak_pending, queue.pending)
+        self.peak_running = max(self.peak_running, queue.running)
+
+    async def _single(self, event: ReplayEvent, record: dict) -> str:
+        """与 /t2img、draw_image 相同的路径：限流、降级、入队、等待结果"""
+        plugin = self.plugin
+        if plugin._check_rate_limit(event):
+            return "rate_limited"
+        quality, _ = plugin._govern_quality(record.get("quality") or "m")
+        try:
+            _, future = plugin._submit_generation(
+                event,
+                placeholder_prompt(record),
+                record.get("ratio") or plugin.ratio,
+                quality,
+                plugin._clamp_count(int(record.get("count", 1))),
+                fuzzy=record.get("kind") == "draw_image",
+            )
+        except self.QueueFullError:
+            return "queue_full"
+        self.sample_queue()
+        await future
+        return "ok"
+
+    async def _batch(self, event: ReplayEvent, record: dict) -> str:
+        """与 /t2img_batch 相同的路径"""
+        plugin = self.plugin
+        items = [
+            self.ParsedPrompt(
+                placeholder_prompt(item),
+                item.get("ratio") or plugin.ratio,
+                item.get("quality") or "s",
+                plugin._clamp_count(int(item.get("count", 1))),
+            )
+            for item in record["items"]
+        ]
+        workers, rejection = plugin._admit_batch(event, len(items))
+        if rejection:
+            return "rejected"
+        failed = 0
+        async for _, _, result in plugin._run_batch(event, items, workers):
+            self.sample_queue()
+            failed += isinstance(result, Exception)
+        return "ok" if failed == 0 else "partial"
+
+    async def replay(self, record: dict) -> None:
+        event = ReplayEvent(record.get("user", ""), record.get("group", ""))
+        start = time.monotonic()
+        try:
+            if "items" in record:
+                outcome = await self._batch(event, record)
+            else:
+                outcome = await self._single(event, record)
+        except Exception:
+            outcome = "error"
+        self.outcomes[outcome] += 1
+        if outcome not in ("rate_limited", "queue_full", "rejected"):
+            self.latency.record(time.monotonic() - start, outcome == "ok")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    records = load_records(args.traces, args.limit)
+    if not records:
+        raise SystemExit("没有可回放的记录")
+
+    profile = profile_from_args(args)
+    if args.latency_from_trace:
+        # 用记录中的 API 耗时中位数作为模拟服务的延迟
+        api_ms = [r["api_ms"] for r in records if r.get("api_ms")]
+        if api_ms:
+            profile.latency_ms = statistics.median(api_ms)
+
+    server = MockProviderServer(profile)
+    await server.start()
+    workdir = Path(tempfile.mkdtemp(prefix="t2img-replay-"))
+    main_module = import_plugin_module("main")
+    config = {
+        "provider": args.provider,
+        "api_key": BENCH_API_KEYS,
+        "model": DEFAULT_MODELS[args.provider],
+        "base_url": server.base_urls[args.provider],
+        "http_warmup": False,
+        "metrics_snapshot_interval": 0,
+        **args.config,
+    }
+    plugin = main_module.MultiPlatformText2Image(None, config)
+    plugin._image_dir = workdir
+    replayer = Replayer(
+        plugin,
+        import_plugin_module("core.prompt"),
+        import_plugin_module("core.job_queue"),
+    )
+
+    offsets = schedule(records, args.speed, args.max_gap)
+    print(
+        f"回放 {len(records)} 条记录，预计 {offsets[-1]:.1f}s "
+        f"(speed={args.speed}, max_gap={args.max_gap or '-'})"
+    )
+    tasks = []
+    started = time.monotonic()
+    try:
+        with ResourceSampler() as sampler:
+            for record, offset in zip(records, offsets):
+                delay = started + offset - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(replayer.replay(record)))
+                replayer.sample_queue()
+            await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+        store = plugin._image_store
+        report = {
+            "records": len(records),
+            "elapsed_s": round(elapsed, 2),
+            "recorded_outcomes": dict(Counter(r.get("outcome") for r in records)),
+            "replay_outcomes": dict(replayer.outcomes),
+            "latency": replayer.latency.summary(),
+            "peak_pending": replayer.peak_pending,
+            "peak_running": replayer.peak_running,
+            "peak_rss_mb": sampler.max_rss_mb,
+            "rate_limiter": plugin.rate_limiter.stats(),
+            "cache": plugin.result_cache.stats() if plugin.result_cache else None,
+            "store": store.stats() if store is not None else None,
+        }
+    finally:
+        await plugin.close()
+        await server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_report(report: dict) -> None:
+    latency = report["latency"]
+    print(f"耗时: {report['elapsed_s']}s")
+    print(f"记录中的结果: {report['recorded_outcomes']}")
+    print(f"回放结果: {report['replay_outcomes']}")
+    print(
+        f"延迟: p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, "
+        f"p99 {latency['p99']:.2f}s"
+    )
+    print(
+        f"队列峰值: 排队 {report['peak_pending']}, 执行中 {report['peak_running']}; "
+        f"内存峰值 {report['peak_rss_mb']:.1f}MB"
+    )
+    print(f"限流: {report['rate_limiter']}")
+    print(f"结果缓存: {report['cache']}")
+    print(f"图片存储: {report['store']}")
+
+
+def parse_config_value(value: str):
+    """--set 的值按 JSON 解析，失败时作为字符串"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="流量记录回放")
+    parser.add_argument("traces", nargs="+", help="traffic.jsonl 文件，可指定多个")
+    parser.add_argument(
+        "--provider", choices=sorted(DEFAULT_MODELS), default="volcengine"
+    )
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速")
+    parser.add_argument(
+        "--max-gap",
+        type=float,
+        default=0.0,
+        help="压缩长于该秒数的空闲间隔（按原始时间计），0 表示不压缩",
+    )
+    parser.add_argument("--limit", type=int, default=0, help="最多回放的记录数")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="覆盖插件配置，可重复，如 --set max_concurrent_jobs=8",
+    )
+    parser.add_argument(
+        "--latency-from-trace",
+        action="store_true",
+        help="用记录中 API 耗时的中位数作为模拟服务的延迟",
+    )
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    args.config = {}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        args.config[key.strip()] = parse_config_value(value.strip())
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""插件核心组件模块"""
+
+from .cache_warmer import CacheWarmer, PopularityTracker
+from .image_store import ImageStore
+from .job_queue import FairJobQueue, QueueFullError
+from .metrics import MetricsRegistry
+from .near_duplicate import NearDuplicateIndex
+from .postprocess import ImagePostProcessor, PostProcessOptions
+from .quality_governor import QualityGovernor
+from .rate_limiter import RateLimiter, TokenBucketLimiter
+from .result_cache import ResultCache
+from .singleflight import SingleFlight
+
+__all__ = [
+    "CacheWarmer",
+    "FairJobQueue",
+    "ImageStore",
+    "ImagePostProcessor",
+    "MetricsRegistry",
+    "NearDuplicateIndex",
+    "PopularityTracker",
+    "PostProcessOptions",
+    "QualityGovernor",
+    "QueueFullError",
+    "RateLimiter",
+    "ResultCache",
+    "SingleFlight",
+    "TokenBucketLimiter",
+]
@@ -0,0 +1,53 @@
+"""日志和流量记录的脱敏
+
+慢请求日志和流量记录写入插件数据目录，默认不保存原始用户 ID、群 ID 和提示词：
+ID 加盐哈希，提示词只保留长度和规范化后的哈希。盐值持久化在数据目录中，
+重启后同一用户、同一提示词的哈希不变，两种记录之间也可以相互对照。
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any
+
+from .prompt import normalize_prompt
+
+# 盐值文件名，与记录文件放在同一目录
+SALT_FILENAME = "traffic_salt"
+
+
+class Anonymizer:
+    """加盐哈希 ID 和提示词"""
+
+    def __init__(self, salt: str):
+        """初始化
+
+        Args:
+            salt: 哈希时使用的盐值
+        """
+        self.salt = salt
+
+    @staticmethod
+    def load_salt(directory: Path) -> str:
+        """读取或生成持久化的盐值（阻塞操作）"""
+        path = directory / SALT_FILENAME
+        try:
+            return path.read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            salt = os.urandom(16).hex()
+            path.write_text(salt, encoding="utf-8")
+            return salt
+
+    def hash_id(self, value: str) -> str:
+        """加盐哈希，空值保持为空（如私聊没有群 ID）"""
+        if not value:
+            return ""
+        return hashlib.sha256(f"{self.salt}:{value}".encode()).hexdigest()[:12]
+
+    def prompt_fields(self, prompt: str) -> dict[str, Any]:
+        """提示词的长度和哈希"""
+        return {
+            "prompt_len": len(prompt),
+            # 规范化后哈希，回放时相同提示词仍相同，可复现缓存和请求合并
+            "prompt_hash": self.hash_id(normalize_prompt(prompt)),
+        }
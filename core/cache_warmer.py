@@ -0,0 +1,177 @@
+"""热门请求统计与空闲时的缓存预热
+
+- PopularityTracker: 按半衰期衰减的请求计数，近期常用的请求排名靠前
+- CacheWarmer: 队列空闲且 API Key 有余量时，为最热门、尚未缓存或即将被
+  图片存储淘汰的请求提前生成或刷新结果，每日重复的提示词（早安图、群吉祥物等）
+  在高峰时可直接命中缓存，不必排在新请求之后
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class PopularityTracker:
+    """指数衰减的请求频次统计"""
+
+    def __init__(
+        self,
+        half_life_seconds: float = 86400.0,
+        max_entries: int = 500,
+        clock: Callable[[], float] = time.time,
+    ):
+        """初始化
+
+        Args:
+            half_life_seconds: 计数衰减一半所需的秒数
+            max_entries: 最多保留的条目数，超出时淘汰衰减后计数最低的
+            clock: 时钟函数
+        """
+        self.half_life_seconds = half_life_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        # 键 -> [计数, 更新时间, 重新生成所需的参数]
+        self._entries: dict[Hashable, list] = {}
+
+    def _decayed(self, entry: list, now: float) -> float:
+        return entry[0] * math.exp2(-(now - entry[1]) / self.half_life_seconds)
+
+    def record(self, key: Hashable, payload: Any) -> None:
+        """记录一次请求，payload 为预热时重新生成所需的参数"""
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [1.0, now, payload]
+        else:
+            entry[0] = self._decayed(entry, now) + 1.0
+            entry[1] = now
+            entry[2] = payload
+        # 超出上限一定比例后批量裁剪，均摊每次记录的代价
+        if len(self._entries) > self.max_entries * 1.25:
+            self._prune(now, keep=key)
+
+    def _prune(self, now: float, keep: Hashable) -> None:
+        """淘汰计数最低的条目，刚记录的条目保留，避免新请求永远进不了统计"""
+        ranked = sorted(
+            (k for k in self._entries if k != keep),
+            key=lambda k: self._decayed(self._entries[k], now),
+        )
+        for k in ranked[: len(self._entries) - self.max_entries]:
+            del self._entries[k]
+
+    def top(self, k: int) -> list[tuple[Hashable, Any, float]]:
+        """返回衰减后计数最高的 k 个 (键, 参数, 计数)"""
+        now = self.clock()
+        ranked = sorted(
+            (
+                (key, entry[2], self._decayed(entry, now))
+                for key, entry in self._entries.items()
+            ),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+        return ranked[:k]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheWarmer:
+    """空闲时预热热门请求的结果缓存
+
+    是否空闲、条目是否需要预热以及如何预热都由调用方提供，本类只负责
+    挑选候选、控制频率和每小时的生成预算。
+    """
+
+    def __init__(
+        self,
+        tracker: PopularityTracker,
+        is_idle: Callable[[], bool],
+        needs_warm: Callable[[Hashable], bool],
+        warm: Callable[[Hashable, Any], Awaitable[bool]],
+        top_k: int = 10,
+        max_per_hour: int = 10,
+        min_count: float = 2.0,
+        interval_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """初始化
+
+        Args:
+            tracker: 请求频次统计
+            is_idle: 当前是否空闲且 API Key 有余量
+            needs_warm: 条目是否未缓存或即将被淘汰
+            warm: 预热一个条目，返回是否调用了生成 API
+            top_k: 每轮检查的热门条目数
+            max_per_hour: 每小时最多因预热调用生成 API 的次数
+            min_count: 衰减后计数低于该值的条目不预热
+            interval_seconds: 检查间隔
+            clock: 时钟函数
+        """
+        self.tracker = tracker
+        self.is_idle = is_idle
+        self.needs_warm = needs_warm
+        self.warm = warm
+        self.top_k = top_k
+        self.max_per_hour = max_per_hour
+        self.min_count = min_count
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+        # 最近一小时内调用生成 API 的时间
+        self._generated_at: deque[float] = deque()
+        self.generated = 0
+        self.refreshed = 0
+        self.failed = 0
+
+    def _budget_left(self) -> int:
+        cutoff = self.clock() - 3600
+        while self._generated_at and self._generated_at[0] <= cutoff:
+            self._generated_at.popleft()
+        return self.max_per_hour - len(self._generated_at)
+
+    async def run_once(self) -> int:
+        """执行一轮预热，返回本轮处理的条目数"""
+        handled = 0
+        for key, payload, count in self.tracker.top(self.top_k):
+            if count < self.min_count:
+                break
+            # 每个条目前都重新检查，用户请求到来时立即让出
+            if self._budget_left() <= 0 or not self.is_idle():
+                break
+            if not self.needs_warm(key):
+                continue
+            try:
+                generated = await self.warm(key, payload)
+            except Exception:
+                self.failed += 1
+                # 失败同样计入预算，避免持续报错时反复调用 API
+                self._generated_at.append(self.clock())
+                raise
+            handled += 1
+            if generated:
+                self.generated += 1
+                self._generated_at.append(self.clock())
+            else:
+                self.refreshed += 1
+        return handled
+
+    async def run(self, on_error: Optional[Callable[[Exception], None]] = None) -> None:
+        """后台循环，直到任务被取消"""
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.run_once()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "tracked": len(self.tracker),
+            "generated": self.generated,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "budget_left": max(0, self._budget_left()),
+        }
@@ -0,0 +1,162 @@
+"""按字节配额和存活时间管理的图片存储
+
+启动时扫描一次目录建立索引，之后每次写入增量更新。
+淘汰按最近访问时间排序，使用最小堆，每淘汰一个文件的代价为 O(log n)，
+与目录中的文件总数无关。
+"""
+
+import heapq
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+
+
+class ImageStore:
+    """图片文件索引与淘汰策略
+
+    索引只在事件循环中修改；目录扫描和文件删除由调用方放到线程池执行。
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int,
+        ttl_seconds: float = 0,
+        on_evict: Optional[Callable[[str], None]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """初始化存储
+
+        Args:
+            directory: 图片目录
+            max_bytes: 图片总字节数上限
+            ttl_seconds: 图片最长保留时间，0 表示不限
+            on_evict: 文件被移出索引时的回调
+            clock: 时钟函数，与文件修改时间同为 Unix 时间
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.clock = clock
+        # path -> (size, stamp)，stamp 为写入或最近访问时间
+        self._index: dict[str, tuple[int, float]] = {}
+        # (stamp, path) 最小堆，过期的堆项在弹出时跳过
+        self._heap: list[tuple[float, str]] = []
+        self._total_bytes = 0
+        self.evicted_count = 0
+
+    def scan(self) -> list[tuple[str, int, float]]:
+        """扫描目录，返回 (路径, 大小, 修改时间) 列表（阻塞操作）"""
+        entries: list[tuple[str, int, float]] = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.lower().endswith(IMAGE_SUFFIXES):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, st.st_size, st.st_mtime))
+        return entries
+
+    def load(self, entries: list[tuple[str, int, float]]) -> None:
+        """用扫描结果建立索引，已在索引中的路径保持不变"""
+        for path, size, mtime in entries:
+            if path not in self._index:
+                self._index[path] = (size, mtime)
+                self._total_bytes += size
+        self._heap = [(stamp, path) for path, (_, stamp) in self._index.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, path: str, size: int) -> None:
+        """登记新写入的文件"""
+        self.remove(path)
+        stamp = self.clock()
+        self._index[path] = (size, stamp)
+        self._total_bytes += size
+        heapq.heappush(self._heap, (stamp, path))
+
+    def touch(self, path: str) -> None:
+        """刷新文件的访问时间，推迟其淘汰"""
+        entry = self._index.get(path)
+        if entry is None:
+            return
+        stamp = self.clock()
+        self._index[path] = (entry[0], stamp)
+        heapq.heappush(self._heap, (stamp, path))
+        self._maybe_compact()
+
+    def remove(self, path: str) -> bool:
+        """从索引中移除文件（不删除磁盘文件）"""
+        entry = self._index.pop(path, None)
+        if entry is None:
+            return False
+        self._total_bytes -= entry[0]
+        return True
+
+    def collect_evictions(self, now: Optional[float] = None) -> list[str]:
+        """弹出超出配额或已过期的文件，返回需要删除的路径"""
+        if now is None:
+            now = self.clock()
+        expire_before = now - self.ttl_seconds if self.ttl_seconds > 0 else None
+
+        evicted: list[str] = []
+        while self._heap:
+            stamp, path = self._heap[0]
+            entry = self._index.get(path)
+            # 跳过已移除或已被 touch 刷新的堆项
+            if entry is None or entry[1] != stamp:
+                heapq.heappop(self._heap)
+                continue
+            over_quota = self._total_bytes > self.max_bytes
+            expired = expire_before is not None and stamp < expire_before
+            if not (over_quota or expired):
+                break
+            heapq.heappop(self._heap)
+            self.remove(path)
+            evicted.append(path)
+            if self.on_evict:
+                self.on_evict(path)
+
+        self.evicted_count += len(evicted)
+        return evicted
+
+    def size(self, path: str) -> Optional[int]:
+        """文件字节数，不在索引中时返回 None"""
+        entry = self._index.get(path)
+        return entry[0] if entry is not None else None
+
+    def age(self, path: str, now: Optional[float] = None) -> Optional[float]:
+        """距离写入或最近访问的秒数，不在索引中时返回 None"""
+        entry = self._index.get(path)
+        if entry is None:
+            return None
+        return (self.clock() if now is None else now) - entry[1]
+
+    def _maybe_compact(self) -> None:
+        """过期堆项过多时重建堆，保持内存与文件数同阶"""
+        if len(self._heap) > 2 * len(self._index) + 64:
+            self._heap = [(stamp, path) for path, (_, stamp) in self._index.items()]
+            heapq.heapify(self._heap)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def stats(self) -> dict[str, int]:
+        """返回存储统计信息"""
+        return {
+            "files": len(self._index),
+            "bytes": self._total_bytes,
+            "evicted": self.evicted_count,
+        }
@@ -0,0 +1,256 @@
+"""公平调度的全局生图任务队列
+
+- 全局并发上限，超出的任务排队等待
+- 按群轮询、群内按用户轮询出队，单个用户或群的突发请求不会占满队列
+- 队列满时可拒绝新任务或丢弃最早的排队任务
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Optional
+
+OVERFLOW_REJECT = "reject"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+
+
+class QueueFullError(Exception):
+    """队列已满或用户排队任务过多"""
+
+
+class _Job:
+    """排队中的任务"""
+
+    __slots__ = (
+        "group_id",
+        "user_id",
+        "func",
+        "future",
+        "enqueued_at",
+        "seq",
+        "started",
+    )
+
+    def __init__(
+        self,
+        group_id: str,
+        user_id: str,
+        func: Callable[[], Awaitable[Any]],
+        future: asyncio.Future,
+        seq: int,
+    ):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.func = func
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.seq = seq
+        self.started = False
+
+
+class FairJobQueue:
+    """群/用户两级轮询的有界任务队列"""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_pending: int = 50,
+        max_per_user: int = 2,
+        overflow: str = OVERFLOW_REJECT,
+    ):
+        """初始化队列
+
+        Args:
+            max_workers: 同时执行的任务数上限
+            max_pending: 排队任务数上限
+            max_per_user: 单个用户排队和执行中的任务数上限
+            overflow: 队列满时的行为，reject 拒绝新任务，drop_oldest 丢弃最早的排队任务
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self.max_per_user = max_per_user
+        self.overflow = overflow
+        # group_id -> user_id -> 排队任务，两层都按轮询顺序排列
+        self._groups: OrderedDict[str, OrderedDict[str, deque[_Job]]] = OrderedDict()
+        self._user_counts: dict[str, int] = {}
+        self._pending = 0
+        self._running = 0
+        self._seq = 0
+        self._tasks: set[asyncio.Task] = set()
+        self.dropped = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        """排队中的任务数"""
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        """执行中的任务数"""
+        return self._running
+
+    def user_jobs(self, user_id: str) -> int:
+        """用户排队和执行中的任务数"""
+        return self._user_counts.get(user_id, 0)
+
+    def submit(
+        self, user_id: str, group_id: str, func: Callable[[], Awaitable[Any]]
+    ) -> tuple[int, asyncio.Future]:
+        """提交任务
+
+        Args:
+            user_id: 用户 ID
+            group_id: 群 ID，私聊为空
+            func: 返回协程的任务函数
+
+        Returns:
+            tuple[int, asyncio.Future]: (排队位置，从 1 开始，0 表示已立即开始执行, 任务结果)
+
+        Raises:
+            QueueFullError: 用户任务过多或队列已满
+        """
+        if self.max_per_user > 0 and self.user_jobs(user_id) >= self.max_per_user:
+            self.rejected += 1
+            raise QueueFullError(
+                f"您已有 {self.user_jobs(user_id)} 个生图任务在进行，请稍候..."
+            )
+
+        if self._running >= self.max_workers and self._pending >= self.max_pending:
+            if self.overflow == OVERFLOW_DROP_OLDEST and self._pending > 0:
+                self._drop_oldest()
+            else:
+                self.rejected += 1
+                raise QueueFullError("生图队列已满，请稍后再试。")
+
+        # 私聊用户各自视为一个独立分组
+        group_key = group_id or f"private:{user_id}"
+        self._seq += 1
+        job = _Job(
+            group_key,
+            user_id,
+            func,
+            asyncio.get_running_loop().create_future(),
+            self._seq,
+        )
+        users = self._groups.setdefault(group_key, OrderedDict())
+        users.setdefault(user_id, deque()).append(job)
+        self._pending += 1
+        self._user_counts[user_id] = self._user_counts.get(user_id, 0) + 1
+
+        self._dispatch()
+        return (0 if job.started else self._position(job)), job.future
+
+    def _position(self, target: _Job) -> int:
+        """按轮询出队顺序模拟，计算目标任务的排队位置（从 1 开始）"""
+        groups = [
+            [list(jobs) for jobs in users.values()] for users in self._groups.values()
+        ]
+        position = 1
+        while groups:
+            next_groups = []
+            for users in groups:
+                jobs = users[0]
+                if jobs.pop(0) is target:
+                    return position
+                position += 1
+                users = users[1:] + ([jobs] if jobs else [])
+                if users:
+                    next_groups.append(users)
+            groups = next_groups
+        return position
+
+    def _pop_next(self) -> Optional[_Job]:
+        """按群、用户两级轮询取出下一个任务"""
+        if not self._groups:
+            return None
+        group_key, users = next(iter(self._groups.items()))
+        user_id, jobs = next(iter(users.items()))
+        job = jobs.popleft()
+
+        # 出队后将该用户和该群移到队尾
+        if jobs:
+            users.move_to_end(user_id)
+        else:
+            del users[user_id]
+        if users:
+            self._groups.move_to_end(group_key)
+        else:
+            del self._groups[group_key]
+        self._pending -= 1
+        return job
+
+    def _drop_oldest(self) -> None:
+        """丢弃最早提交的排队任务"""
+        oldest: Optional[_Job] = None
+        for users in self._groups.values():
+            for jobs in users.values():
+                if oldest is None or jobs[0].seq < oldest.seq:
+                    oldest = jobs[0]
+        if oldest is None:
+            return
+
+        users = self._groups[oldest.group_id]
+        jobs = users[oldest.user_id]
+        jobs.popleft()
+        if not jobs:
+            del users[oldest.user_id]
+        if not users:
+            del self._groups[oldest.group_id]
+        self._pending -= 1
+        self._finish_user(oldest.user_id)
+        self.dropped += 1
+        if not oldest.future.done():
+            oldest.future.set_exception(QueueFullError("生图队列已满，任务已被取消。"))
+            oldest.future.exception()
+
+    def _finish_user(self, user_id: str) -> None:
+        count = self._user_counts.get(user_id, 0) - 1
+        if count > 0:
+            self._user_counts[user_id] = count
+        else:
+            self._user_counts.pop(user_id, None)
+
+    def _dispatch(self) -> None:
+        """在并发上限内启动排队任务"""
+        while self._running < self.max_workers:
+            job = self._pop_next()
+            if job is None:
+                return
+            job.started = True
+            self._running += 1
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: _Job) -> None:
+        try:
+            result = await job.func()
+        except BaseException as e:
+            if not job.future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    job.future.cancel()
+                else:
+                    job.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running -= 1
+            self._finish_user(job.user_id)
+            self._dispatch()
+
+    async def close(self) -> None:
+        """取消排队和执行中的任务"""
+        for users in self._groups.values():
+            for jobs in users.values():
+                for job in jobs:
+                    job.future.cancel()
+        self._groups.clear()
+        self._pending = 0
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
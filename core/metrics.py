@@ -0,0 +1,242 @@
+"""内存中的延迟与吞吐指标
+
+按阶段（排队、API 调用、下载、写盘、发送）记录耗时直方图，
+标签包括 provider、模型、API Key 哈希和质量档位。
+可渲染为聊天可读的摘要，或 Prometheus 文本格式。
+"""
+
+import bisect
+import contextvars
+import time
+from typing import Optional
+
+from .tracing import record_span
+
+# 直方图桶上界（秒）
+DEFAULT_BUCKETS = (
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    20.0,
+    30.0,
+    60.0,
+    120.0,
+    float("inf"),
+)
+
+LabelSet = tuple[tuple[str, str], ...]
+
+# 当前请求的公共标签（如 quality），由请求入口设置，provider 回调时自动合并
+request_labels: contextvars.ContextVar[dict[str, str]] = contextvars.ContextVar(
+    "t2img_request_labels", default={}
+)
+
+
+class Histogram:
+    """固定桶直方图"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """按桶线性插值估算分位数"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for upper, bucket_count in zip(self.buckets, self.counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                if upper == float("inf"):
+                    return lower
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            if upper != float("inf"):
+                lower = upper
+        return lower
+
+
+class MetricsRegistry:
+    """计数器和直方图注册表"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._counters: dict[tuple[str, LabelSet], float] = {}
+        self._histograms: dict[tuple[str, LabelSet], Histogram] = {}
+
+    @staticmethod
+    def _labels(labels: dict[str, str]) -> LabelSet:
+        merged = {**request_labels.get(), **labels}
+        return tuple(sorted((k, str(v)) for k, v in merged.items() if v is not None))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """计数器累加"""
+        key = (name, self._labels(labels))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """记录一次观测值"""
+        key = (name, self._labels(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def observe_phase(self, phase: str, seconds: float, **labels: str) -> None:
+        """记录请求某个阶段的耗时，同时作为 span 记入当前请求的追踪"""
+        self.observe("t2img_phase_seconds", seconds, phase=phase, **labels)
+        record_span(phase, seconds, **labels)
+
+    def counter_total(self, name: str, **match: str) -> float:
+        """按标签过滤汇总计数器"""
+        return sum(
+            value
+            for (counter_name, labels), value in self._counters.items()
+            if counter_name == name and _matches(labels, match)
+        )
+
+    def merged_histogram(self, name: str, **match: str) -> Histogram:
+        """按标签过滤合并直方图"""
+        merged = Histogram()
+        for (hist_name, labels), histogram in self._histograms.items():
+            if hist_name != name or not _matches(labels, match):
+                continue
+            merged.count += histogram.count
+            merged.sum += histogram.sum
+            for i, c in enumerate(histogram.counts):
+                merged.counts[i] += c
+        return merged
+
+    def label_values(self, name: str, label: str) -> list[str]:
+        """列出直方图中某个标签出现过的取值"""
+        values: dict[str, None] = {}
+        for hist_name, labels in self._histograms:
+            if hist_name == name:
+                for k, v in labels:
+                    if k == label:
+                        values[v] = None
+        return sorted(values)
+
+    def render_summary(self) -> str:
+        """渲染聊天可读的摘要"""
+        lines = [f"运行时长: {int(time.time() - self.started_at)}s"]
+
+        requests = self.counter_total("t2img_requests_total")
+        if requests:
+            ok = self.counter_total("t2img_requests_total", outcome="ok")
+            hits = self.counter_total("t2img_requests_total", outcome="cache_hit")
+            lines.append(
+                f"请求: {int(requests)} (成功 {int(ok)}, 缓存命中 {int(hits)}, "
+                f"失败 {int(requests - ok - hits)})"
+            )
+
+        name = "t2img_phase_seconds"
+        for phase in self.label_values(name, "phase"):
+            histogram = self.merged_histogram(name, phase=phase)
+            lines.append(_format_histogram(phase, histogram))
+        for provider in self.label_values(name, "provider"):
+            histogram = self.merged_histogram(name, phase="api", provider=provider)
+            if histogram.count:
+                lines.append(_format_histogram(f"api[{provider}]", histogram))
+        for quality in self.label_values(name, "quality"):
+            histogram = self.merged_histogram(name, phase="api", quality=quality)
+            if histogram.count:
+                lines.append(_format_histogram(f"api[q={quality}]", histogram))
+        return "\n".join(lines)
+
+    def render_prometheus(self) -> str:
+        """渲染 Prometheus 文本格式"""
+        out: list[str] = []
+        seen_types: set[str] = set()
+
+        for (name, labels), value in sorted(self._counters.items()):
+            if name not in seen_types:
+                out.append(f"# TYPE {name} counter")
+                seen_types.add(name)
+            out.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            if name not in seen_types:
+                out.append(f"# TYPE {name} histogram")
+                seen_types.add(name)
+            cumulative = 0
+            for upper, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                le = "+Inf" if upper == float("inf") else f"{upper:g}"
+                bucket_labels = labels + (("le", le),)
+                out.append(
+                    f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+                )
+            out.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+            out.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        return "\n".join(out) + "\n"
+
+
+class PhaseTimer:
+    """记录一个阶段耗时的上下文管理器"""
+
+    def __init__(
+        self, metrics: Optional[MetricsRegistry], phase: str, **labels: str
+    ):
+        self.metrics = metrics
+        self.phase = phase
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "PhaseTimer":
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.metrics is not None:
+            outcome = "ok" if exc_type is None else "error"
+            self.metrics.observe_phase(
+                self.phase,
+                time.monotonic() - self.start,
+                outcome=outcome,
+                **self.labels,
+            )
+
+
+def _matches(labels: LabelSet, match: dict[str, str]) -> bool:
+    label_dict = dict(labels)
+    return all(label_dict.get(k) == v for k, v in match.items())
+
+
+def _format_labels(labels: LabelSet) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_histogram(title: str, histogram: Histogram) -> str:
+    if not histogram.count:
+        return f"{title}: 无数据"
+    avg = histogram.sum / histogram.count
+    return (
+        f"{title}: n={histogram.count} avg={avg:.2f}s "
+        f"p50={histogram.quantile(0.5):.2f}s p95={histogram.quantile(0.95):.2f}s "
+        f"p99={histogram.quantile(0.99):.2f}s"
+    )
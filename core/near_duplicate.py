@@ -0,0 +1,130 @@
+"""基于 MinHash/LSH 的近似重复提示词索引
+
+LLM 改写后的提示词很少与之前逐字相同，精确缓存键难以命中。
+本索引对规范化后的提示词取字符 n-gram，计算 MinHash 签名，
+按 LSH 分段分桶快速找出候选，再用签名估计的 Jaccard 相似度筛选。
+字符 n-gram 对中文等不以空格分词的文本同样有效。
+"""
+
+import random
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+# 梅森素数，作为 MinHash 哈希函数的模
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 64) - 1
+
+
+class NearDuplicateIndex:
+    """在相同上下文（provider、模型、尺寸等）内查找相似提示词"""
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+        max_entries: int = 1000,
+        seed: int = 1,
+    ):
+        """初始化索引
+
+        Args:
+            threshold: 判定为近似重复的最低相似度
+            num_perm: MinHash 签名长度，需能被 bands 整除
+            bands: LSH 分段数，段越多召回越高
+            shingle_size: 字符 n-gram 长度
+            max_entries: 最多保留的条目数，超出时淘汰最久未使用的
+            seed: 哈希参数的随机种子
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        self._params = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+            for _ in range(num_perm)
+        ]
+        # 值 -> (上下文, 签名)
+        self._entries: OrderedDict[Hashable, tuple[Hashable, tuple[int, ...]]] = (
+            OrderedDict()
+        )
+        # (上下文, 段号, 段内签名) -> 值集合
+        self._buckets: dict[tuple, set[Hashable]] = {}
+        self.hits = 0
+
+    def _shingles(self, text: str) -> set[str]:
+        if len(text) <= self.shingle_size:
+            return {text}
+        return {
+            text[i : i + self.shingle_size]
+            for i in range(len(text) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> tuple[int, ...]:
+        """计算文本的 MinHash 签名"""
+        hashes = [hash(shingle) & _MASK for shingle in self._shingles(text)]
+        return tuple(
+            min((a * h + b) % _PRIME for h in hashes) for a, b in self._params
+        )
+
+    def _band_keys(self, context: Hashable, signature: tuple[int, ...]) -> list[tuple]:
+        return [
+            (context, band, signature[band * self.rows : (band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+        """由签名估计 Jaccard 相似度"""
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+    def add(self, context: Hashable, text: str, value: Hashable) -> None:
+        """登记提示词，value 为查到时返回的值（如缓存键）"""
+        self.remove(value)
+        signature = self.signature(text)
+        self._entries[value] = (context, signature)
+        for key in self._band_keys(context, signature):
+            self._buckets.setdefault(key, set()).add(value)
+        while len(self._entries) > self.max_entries:
+            self.remove(next(iter(self._entries)))
+
+    def find(self, context: Hashable, text: str) -> Optional[Hashable]:
+        """返回同一上下文中与 text 最相似且达到阈值的值"""
+        signature = self.signature(text)
+        candidates: set[Hashable] = set()
+        for key in self._band_keys(context, signature):
+            candidates.update(self._buckets.get(key, ()))
+
+        best, best_score = None, self.threshold
+        for value in candidates:
+            score = self.similarity(signature, self._entries[value][1])
+            if score >= best_score:
+                best, best_score = value, score
+        if best is not None:
+            self._entries.move_to_end(best)
+            self.hits += 1
+        return best
+
+    def remove(self, value: Hashable) -> None:
+        """移除条目（如对应的缓存已失效）"""
+        entry = self._entries.pop(value, None)
+        if entry is None:
+            return
+        for key in self._band_keys(*entry):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(value)
+                if not bucket:
+                    del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits}
@@ -0,0 +1,252 @@
+"""图片后处理
+
+在 provider 返回图片之后、发送之前对图片进行处理：
+- 转码为 WebP 或渐进式 JPEG
+- 按平台限制缩小到最大边长和最大字节数
+- 去除 EXIF 等元数据
+
+图像编解码是 CPU 密集操作，在独立进程池中执行，不阻塞事件循环。
+Pillow 为可选依赖，只在进程池中实际处理图片时导入，未安装时后处理自动关闭。
+"""
+
+import asyncio
+import importlib.util
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from .singleflight import SingleFlight
+
+logger = logging.getLogger("astrbot")
+
+FORMAT_ORIGINAL = "original"
+FORMAT_WEBP = "webp"
+FORMAT_JPEG = "jpeg"
+
+# 超出字节数限制时依次尝试的编码质量
+_QUALITY_STEPS = (90, 80, 70, 60, 50)
+# 降低质量仍超限时每轮缩小的比例和最多缩小轮数
+_SHRINK_FACTOR = 0.8
+_MAX_SHRINK_ROUNDS = 6
+
+_EXTENSIONS = {FORMAT_WEBP: ".webp", FORMAT_JPEG: ".jpg"}
+
+
+@dataclass(frozen=True)
+class PostProcessOptions:
+    """后处理参数"""
+
+    format: str = FORMAT_ORIGINAL
+    max_edge: int = 0  # 最大边长 (像素)，0 表示不限
+    max_bytes: int = 0  # 最大字节数，0 表示不限
+    strip_metadata: bool = True
+
+    def is_noop(self) -> bool:
+        return (
+            self.format == FORMAT_ORIGINAL
+            and not self.max_edge
+            and not self.max_bytes
+            and not self.strip_metadata
+        )
+
+    def tag(self) -> str:
+        """用于区分不同参数输出文件的短标识"""
+        return (
+            f"{self.format}-{self.max_edge}-{self.max_bytes}"
+            f"-{int(self.strip_metadata)}"
+        )
+
+
+def _encode(image, fmt: str, quality: int, exif: Optional[bytes]) -> bytes:
+    """按格式编码图片"""
+    buffer = io.BytesIO()
+    kwargs = {}
+    if exif:
+        kwargs["exif"] = exif
+    if fmt == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=4, **kwargs)
+    elif fmt == "JPEG":
+        image.save(
+            buffer, "JPEG", quality=quality, progressive=True, optimize=True, **kwargs
+        )
+    else:
+        image.save(buffer, fmt, optimize=True, **kwargs)
+    return buffer.getvalue()
+
+
+def process_image(src_path: str, dst_path: str, options: PostProcessOptions) -> int:
+    """处理单张图片并写入 dst_path，返回输出文件字节数
+
+    在进程池中执行，必须是模块级函数以便序列化。
+    """
+    from PIL import Image as PILImage
+
+    with PILImage.open(src_path) as source:
+        source_format = source.format or "PNG"
+        exif = None if options.strip_metadata else source.info.get("exif")
+        image = source.copy()
+
+    if options.format == FORMAT_WEBP:
+        fmt = "WEBP"
+    elif options.format == FORMAT_JPEG:
+        fmt = "JPEG"
+    else:
+        fmt = source_format
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    if options.max_edge and max(image.size) > options.max_edge:
+        image.thumbnail((options.max_edge, options.max_edge), PILImage.LANCZOS)
+
+    lossy = fmt in ("WEBP", "JPEG")
+    data = _encode(image, fmt, _QUALITY_STEPS[0], exif)
+    if options.max_bytes:
+        # 先降低质量，仍超限时再逐步缩小尺寸
+        for quality in _QUALITY_STEPS[1:] if lossy else ():
+            if len(data) <= options.max_bytes:
+                break
+            data = _encode(image, fmt, quality, exif)
+        quality = _QUALITY_STEPS[-1] if lossy else _QUALITY_STEPS[0]
+        for _ in range(_MAX_SHRINK_ROUNDS):
+            if len(data) <= options.max_bytes:
+                break
+            width, height = image.size
+            image = image.resize(
+                (
+                    max(1, int(width * _SHRINK_FACTOR)),
+                    max(1, int(height * _SHRINK_FACTOR)),
+                ),
+                PILImage.LANCZOS,
+            )
+            data = _encode(image, fmt, quality, exif)
+
+    # 先写临时文件再替换，避免中途失败留下不完整的输出被当作已处理结果复用；
+    # 临时文件名唯一，同一输出的并发处理不会相互覆盖
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(dst_path) or None,
+        prefix=f"{os.path.basename(dst_path)}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(data)
+
+
+class ImagePostProcessor:
+    """在进程池中执行图片后处理，并按平台选择参数"""
+
+    def __init__(
+        self,
+        options: PostProcessOptions,
+        platform_limits: Optional[dict[str, tuple[int, int]]] = None,
+        max_workers: int = 2,
+    ):
+        """初始化后处理器
+
+        Args:
+            options: 默认后处理参数
+            platform_limits: 平台名 -> (最大边长, 最大字节数)，覆盖默认限制
+            max_workers: 进程池大小
+        """
+        self.options = options
+        self.platform_limits = platform_limits or {}
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 按输出路径合并进行中的处理，缓存命中或合并的请求共用同一原图
+        self._inflight = SingleFlight()
+        self.processed = 0
+        self.failures = 0
+
+    @staticmethod
+    def available() -> bool:
+        """Pillow 是否可用（不导入）"""
+        return importlib.util.find_spec("PIL") is not None
+
+    @staticmethod
+    def parse_platform_limits(entries) -> dict[str, tuple[int, int]]:
+        """解析平台限制配置，每项格式: 平台名:最大边长:最大KB"""
+        limits: dict[str, tuple[int, int]] = {}
+        for entry in entries or []:
+            fields = [f.strip() for f in str(entry).split(":")]
+            try:
+                if len(fields) != 3 or not fields[0]:
+                    raise ValueError(entry)
+                limits[fields[0].lower()] = (int(fields[1]), int(fields[2]) * 1024)
+            except ValueError:
+                logger.warning(f"忽略格式错误的平台后处理限制: {entry}")
+        return limits
+
+    def options_for(self, platform: str) -> PostProcessOptions:
+        """返回指定平台的后处理参数"""
+        limits = self.platform_limits.get((platform or "").lower())
+        if limits is None:
+            return self.options
+        return replace(self.options, max_edge=limits[0], max_bytes=limits[1])
+
+    def _output_path(self, path: str, options: PostProcessOptions) -> str:
+        """同一原图和参数的输出路径固定，便于缓存命中时复用"""
+        stem, extension = os.path.splitext(path)
+        extension = _EXTENSIONS.get(options.format, extension)
+        return f"{stem}.pp-{options.tag()}{extension}"
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def process(self, path: str, platform: str = "") -> tuple[str, int]:
+        """处理图片，返回 (输出路径, 新写入的字节数)
+
+        输出已存在时直接复用，处理失败时返回原图路径，两种情况字节数均为 0。
+        同一输出正在处理时等待其结果，字节数只计入实际处理的请求。
+        """
+        options = self.options_for(platform)
+        if options.is_noop():
+            return path, 0
+
+        output = self._output_path(path, options)
+        if os.path.exists(output):
+            return output, 0
+
+        leader = False
+
+        async def run() -> int:
+            nonlocal leader
+            leader = True
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), process_image, path, output, options
+            )
+
+        try:
+            size = await self._inflight.do(output, run)
+        except Exception as e:
+            if leader:
+                self.failures += 1
+                logger.warning(f"图片后处理失败，发送原图: {e!r}")
+            return path, 0
+        if not leader:
+            return output, 0
+        self.processed += 1
+        return output, size
+
+    def stats(self) -> dict[str, int]:
+        return {"processed": self.processed, "failures": self.failures}
+
+    def close(self) -> None:
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,78 @@
+"""提示词规范化和参数解析
+
+- normalize_prompt: 统一全角/半角、大小写、标点和空白，用作缓存键
+- parse_prompt_args: 从右向左提取 [比例] [质量] [xN] 参数，/t2img 等命令共用
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+
+# 数量参数，如 x4、×4
+COUNT_PATTERN = re.compile(r"^[xX×*](\d+)$")
+VALID_QUALITIES = ("s", "m", "h")
+
+
+def normalize_prompt(text: str) -> str:
+    """规范化提示词：NFKC 统一全角/半角，忽略大小写，标点视为空白并合并空白
+
+    只合并标点 (P*)，emoji 和 "+" 等符号 (S*) 有含义，保留原样。
+    规范化结果为空（如提示词全是标点）时返回 NFKC 后的原文，避免不同提示词共用空键。
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    normalized = " ".join(
+        "".join(
+            " " if unicodedata.category(ch).startswith("P") else ch for ch in text
+        ).split()
+    )
+    return normalized or text.strip()
+
+
+@dataclass
+class ParsedPrompt:
+    """解析后的命令参数"""
+
+    prompt: str
+    ratio: str
+    quality: str
+    count: int = 1
+
+
+def parse_prompt_args(
+    content: str,
+    supported_ratios,
+    default_ratio: str = "1:1",
+    default_quality: str = "s",
+) -> ParsedPrompt:
+    """从右向左依次提取数量、质量、比例参数，剩余部分为提示词
+
+    参数按 NFKC 规范化后匹配，全角的 "１６：９"、"Ｈ"、"×４" 同样有效；
+    提示词本身保持原样。至少保留一个词作为提示词。
+
+    Args:
+        content: 去掉命令前缀后的消息内容
+        supported_ratios: 支持的比例集合
+        default_ratio: 未指定比例时使用的比例
+        default_quality: 未指定质量时使用的质量
+    """
+    parts = content.split()
+    result = ParsedPrompt(content.strip(), default_ratio, default_quality)
+
+    def last_token() -> str:
+        return unicodedata.normalize("NFKC", parts[-1]).lower()
+
+    count_match = COUNT_PATTERN.match(last_token()) if len(parts) > 1 else None
+    if count_match:
+        result.count = int(count_match.group(1))
+        parts = parts[:-1]
+
+    if len(parts) > 1 and last_token() in VALID_QUALITIES:
+        result.quality = last_token()
+        parts = parts[:-1]
+
+    if len(parts) > 1 and last_token() in supported_ratios:
+        result.ratio = last_token()
+        parts = parts[:-1]
+
+    result.prompt = " ".join(parts)
+    return result
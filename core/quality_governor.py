@@ -0,0 +1,109 @@
+"""负载自适应的质量降级
+
+队列积压或生成延迟超过阈值时，按分辨率表降低请求的质量档位：
+- 1 级降级: h→m、m→s
+- 2 级降级: 一律使用该比例的最小尺寸 (s)
+负载回落到阈值的 recover_ratio 以下并保持 hold_seconds 后逐级恢复，
+避免在阈值附近反复切换。
+"""
+
+import time
+from typing import Callable, Optional
+
+from ..providers.resolutions import QUALITY_INDEX
+
+# 按分辨率表索引排列的质量档位
+QUALITY_TIERS = sorted(QUALITY_INDEX, key=QUALITY_INDEX.__getitem__)
+MAX_LEVEL = len(QUALITY_TIERS) - 1
+
+
+class QualityGovernor:
+    """根据队列深度和生成延迟决定降级级别"""
+
+    def __init__(
+        self,
+        queue_thresholds: tuple[int, int] = (10, 25),
+        latency_thresholds: tuple[float, float] = (60.0, 120.0),
+        recover_ratio: float = 0.7,
+        hold_seconds: float = 60.0,
+        latency_alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """初始化
+
+        Args:
+            queue_thresholds: 进入 1 级、2 级降级的排队任务数，0 表示不按队列降级
+            latency_thresholds: 进入 1 级、2 级降级的平均生成耗时 (秒)，0 表示不按延迟降级
+            recover_ratio: 负载低于阈值的该比例时才允许恢复
+            hold_seconds: 级别变化后至少保持的秒数才允许恢复
+            latency_alpha: 生成耗时指数移动平均的平滑系数
+            clock: 时钟函数
+        """
+        self.queue_thresholds = queue_thresholds
+        self.latency_thresholds = latency_thresholds
+        self.recover_ratio = recover_ratio
+        self.hold_seconds = hold_seconds
+        self.latency_alpha = latency_alpha
+        self.clock = clock
+        self.level = 0
+        self.latency_ewma: Optional[float] = None
+        self._changed_at = clock()
+        self.downgraded = 0
+
+    def observe_latency(self, seconds: float) -> None:
+        """记录一次生成耗时"""
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma += self.latency_alpha * (seconds - self.latency_ewma)
+
+    def _load_level(self, queue_depth: int, scale: float = 1.0) -> int:
+        """按当前负载计算应处的级别，scale 用于恢复时收紧阈值"""
+        level = 0
+        for index in range(MAX_LEVEL):
+            queue_limit = self.queue_thresholds[index]
+            latency_limit = self.latency_thresholds[index]
+            if (queue_limit and queue_depth >= queue_limit * scale) or (
+                latency_limit
+                and self.latency_ewma is not None
+                and self.latency_ewma >= latency_limit * scale
+            ):
+                level = index + 1
+        return level
+
+    def update(self, queue_depth: int) -> int:
+        """根据当前负载更新并返回降级级别"""
+        now = self.clock()
+        target = self._load_level(queue_depth)
+        if target > self.level:
+            # 负载升高时立即降级
+            self.level = target
+            self._changed_at = now
+        elif (
+            self.level > 0
+            and now - self._changed_at >= self.hold_seconds
+            and self._load_level(queue_depth, self.recover_ratio) < self.level
+        ):
+            # 负载明显回落并保持一段时间后逐级恢复
+            self.level -= 1
+            self._changed_at = now
+        return self.level
+
+    def apply(self, quality: str, queue_depth: int) -> str:
+        """返回当前负载下实际使用的质量档位"""
+        level = self.update(queue_depth)
+        if level == 0 or quality not in QUALITY_INDEX:
+            return quality
+        effective = QUALITY_TIERS[max(0, QUALITY_INDEX[quality] - level)]
+        if effective != quality:
+            self.downgraded += 1
+        return effective
+
+    def stats(self) -> dict:
+        return {
+            "level": self.level,
+            "latency_ewma": (
+                round(self.latency_ewma, 2) if self.latency_ewma is not None else None
+            ),
+            "downgraded": self.downgraded,
+        }
@@ -0,0 +1,164 @@
+"""令牌桶限流
+
+按用户、群和全局三个维度限流，每个维度可配置速率和突发量：
+- 每个桶只记录 (令牌数, 上次补充时间)，检查时按经过的时间惰性补充，O(1)
+- 桶补满后与新建的桶等价，可以直接删除；到期时间登记在时间轮上，
+  每次检查推进时间轮并清理到期的桶，均摊 O(1)，内存只与活跃的键数有关
+- 被拒绝时返回需要等待的秒数
+"""
+
+import math
+import time
+from typing import Callable, Optional
+
+SCOPE_USER = "user"
+SCOPE_GROUP = "group"
+SCOPE_GLOBAL = "global"
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "expire_tick")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.expire_tick = 0
+
+
+class TokenBucketLimiter:
+    """单个维度的令牌桶集合，按键分桶"""
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: int = 1,
+        wheel_slots: int = 64,
+        tick_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """初始化限流器
+
+        Args:
+            rate_per_minute: 每分钟补充的令牌数，0 表示不限流
+            burst: 桶容量，即允许的突发请求数
+            wheel_slots: 时间轮槽数
+            tick_seconds: 时间轮每格的秒数
+            clock: 时钟函数
+        """
+        self.rate = max(0.0, rate_per_minute) / 60
+        self.burst = max(1, burst)
+        self.tick_seconds = tick_seconds
+        self.clock = clock
+        self._buckets: dict[str, _Bucket] = {}
+        self._wheel: list[set[str]] = [set() for _ in range(max(1, wheel_slots))]
+        self._tick = int(clock() / tick_seconds)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _advance(self, now: float) -> None:
+        """推进时间轮，删除已补满的桶"""
+        target = int(now / self.tick_seconds)
+        # 间隔超过一整圈时每个槽只需处理一次
+        steps = min(target - self._tick, len(self._wheel))
+        for offset in range(steps):
+            index = (self._tick + 1 + offset) % len(self._wheel)
+            slot = self._wheel[index]
+            keep: set[str] = set()
+            for key in slot:
+                bucket = self._buckets.get(key)
+                # 桶已被重新登记到其他槽时，本槽中的旧登记项直接丢弃
+                if bucket is None or bucket.expire_tick % len(self._wheel) != index:
+                    continue
+                if bucket.expire_tick <= target:
+                    del self._buckets[key]
+                else:
+                    # 到期时间超出一圈，留待下一圈处理
+                    keep.add(key)
+            self._wheel[index] = keep
+        self._tick = max(self._tick, target)
+
+    def _refill(self, bucket: _Bucket, now: float) -> None:
+        bucket.tokens = min(
+            float(self.burst), bucket.tokens + (now - bucket.updated) * self.rate
+        )
+        bucket.updated = now
+
+    def wait_time(self, key: str, now: float) -> float:
+        """返回获得一个令牌需要等待的秒数，0 表示当前可用"""
+        if not self.enabled:
+            return 0.0
+        self._advance(now)
+        bucket = self._buckets.get(key)
+        # 没有记录的键等价于满桶
+        if bucket is None:
+            return 0.0
+        self._refill(bucket, now)
+        if bucket.tokens >= 1:
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    def consume(self, key: str, now: float) -> None:
+        """消耗一个令牌并登记桶补满的时间"""
+        if not self.enabled:
+            return
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(float(self.burst), now)
+        else:
+            self._refill(bucket, now)
+        bucket.tokens -= 1
+        full_at = now + (self.burst - bucket.tokens) / self.rate
+        expire_tick = math.ceil(full_at / self.tick_seconds)
+        if expire_tick != bucket.expire_tick:
+            bucket.expire_tick = expire_tick
+            self._wheel[expire_tick % len(self._wheel)].add(key)
+
+
+class RateLimiter:
+    """用户、群和全局三级限流，三个桶都有令牌时才放行"""
+
+    def __init__(
+        self,
+        user: TokenBucketLimiter,
+        group: Optional[TokenBucketLimiter] = None,
+        global_: Optional[TokenBucketLimiter] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        self._scopes: list[tuple[str, TokenBucketLimiter]] = [(SCOPE_USER, user)]
+        if group is not None:
+            self._scopes.append((SCOPE_GROUP, group))
+        if global_ is not None:
+            self._scopes.append((SCOPE_GLOBAL, global_))
+        self.rejected = 0
+
+    def check(self, user_id: str, group_id: str = "") -> float:
+        """检查并消耗令牌，放行返回 0，否则返回需要等待的秒数（不消耗令牌）"""
+        now = self.clock()
+        keys = {SCOPE_USER: user_id, SCOPE_GROUP: group_id, SCOPE_GLOBAL: ""}
+        active = [
+            (limiter, keys[scope])
+            for scope, limiter in self._scopes
+            # 私聊没有群，不计入群限流
+            if limiter.enabled and (scope != SCOPE_GROUP or group_id)
+        ]
+        retry_after = max(
+            (limiter.wait_time(key, now) for limiter, key in active), default=0.0
+        )
+        if retry_after > 0:
+            self.rejected += 1
+            return retry_after
+        for limiter, key in active:
+            limiter.consume(key, now)
+        return 0.0
+
+    def stats(self) -> dict[str, int]:
+        """返回各维度当前跟踪的桶数和拒绝次数"""
+        stats = {f"{scope}_buckets": len(limiter) for scope, limiter in self._scopes}
+        stats["rejected"] = self.rejected
+        return stats
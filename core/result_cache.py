@@ -0,0 +1,132 @@
+"""生图结果缓存
+
+按 (provider, model, prompt, negative_prompt, size, count) 内容寻址，
+命中时直接复用 images/ 中已生成的图片文件，不再调用 API。
+"""
+
+from collections import OrderedDict
+from typing import Callable, Optional
+
+CacheKey = tuple[str, str, str, str, str, int]
+
+
+class ResultCache:
+    """LRU 结果缓存，同时按条目数和字节数限制"""
+
+    def __init__(
+        self,
+        max_entries: int = 200,
+        max_bytes: int = 200 * 1024 * 1024,
+        is_alive: Optional[Callable[[str], bool]] = None,
+    ):
+        """初始化缓存
+
+        Args:
+            max_entries: 最大缓存条目数
+            max_bytes: 缓存文件总字节数上限
+            is_alive: 判断图片是否仍在存储索引中的函数，None 表示不检查
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.is_alive = is_alive
+        self._entries: OrderedDict[CacheKey, tuple[tuple[str, ...], int]] = OrderedDict()
+        self._path_keys: dict[str, CacheKey] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        provider_name: str,
+        model: str,
+        prompt: str,
+        negative_prompt: str,
+        target_size: str,
+        count: int = 1,
+    ) -> CacheKey:
+        """构造缓存键"""
+        return (provider_name, model, prompt, negative_prompt, target_size, count)
+
+    def get(self, key: CacheKey) -> Optional[list[str]]:
+        """查询缓存，命中返回图片路径列表"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        paths, _ = entry
+        # 查询内存中的存储索引，不在每次查询时访问磁盘
+        if self.is_alive is not None and not all(map(self.is_alive, paths)):
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(paths)
+
+    def peek(self, key: CacheKey) -> Optional[list[str]]:
+        """查询缓存但不更新 LRU 顺序和命中统计"""
+        entry = self._entries.get(key)
+        return list(entry[0]) if entry is not None else None
+
+    def put(self, key: CacheKey, paths: list[str], size: int) -> list[str]:
+        """写入缓存，返回因淘汰而不再被引用的图片路径
+
+        Args:
+            key: 缓存键
+            paths: 本次请求生成的所有图片路径
+            size: 所有图片的总字节数
+        """
+        # 单个条目超过总上限时不缓存
+        if size > self.max_bytes:
+            return []
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (tuple(paths), size)
+        for path in paths:
+            self._path_keys[path] = key
+        self._total_bytes += size
+
+        evicted: list[str] = []
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or self._total_bytes > self.max_bytes
+        ):
+            _, (old_paths, old_size) = self._entries.popitem(last=False)
+            for old_path in old_paths:
+                self._path_keys.pop(old_path, None)
+            self._total_bytes -= old_size
+            evicted.extend(old_paths)
+        return evicted
+
+    def discard_path(self, path: str) -> None:
+        """图片文件被删除时移除对应条目，同一条目的其余图片不再被引用"""
+        key = self._path_keys.get(path)
+        if key is not None:
+            self._remove(key)
+
+    def _remove(self, key: CacheKey) -> None:
+        """移除缓存条目"""
+        paths, size = self._entries.pop(key)
+        for path in paths:
+            self._path_keys.pop(path, None)
+        self._total_bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def stats(self) -> dict[str, int]:
+        """返回缓存统计信息"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,60 @@
+"""相同请求的单飞合并
+
+同一个键在生成过程中再次被请求时，后来者等待第一个调用的结果，
+不会重复调用 provider。
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """按键合并进行中的异步调用"""
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.shared = 0  # 被合并的请求数
+
+    def _on_done(self, key: Hashable, future: asyncio.Future) -> None:
+        """调用结束后移除记录，并消费异常避免未检索警告"""
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """执行 func，若相同 key 的调用正在进行则等待其结果
+
+        调用在独立任务中运行，单个等待者被取消不会影响其他等待者。
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._on_done(key, f))
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def join(self, key: Hashable) -> Optional[Awaitable]:
+        """相同 key 的调用正在进行时返回等待其结果的对象，否则返回 None
+
+        等待者被取消不会影响进行中的调用。
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            return None
+        self.shared += 1
+        return asyncio.shield(future)
+
+    async def close(self) -> None:
+        """取消所有进行中的调用并等待其结束，等待者收到 CancelledError"""
+        futures = list(self._inflight.values())
+        for future in futures:
+            future.cancel()
+        await asyncio.gather(*futures, return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
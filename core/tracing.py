@@ -0,0 +1,196 @@
+"""单次请求的追踪记录与慢请求日志
+
+聚合指标只能说明 p99 变差，无法说明是哪一次请求、慢在哪里。
+每次生图请求创建一个带关联 ID 的 Trace，通过 ContextVar 在
+命令解析、限流、Key 选择、API 调用、下载、写盘、发送等阶段记录 span；
+总耗时超过阈值的请求写入插件数据目录下按大小轮转的 JSONL 文件，
+默认对用户 ID、群 ID 和提示词脱敏。
+"""
+
+import contextvars
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from .anonymize import Anonymizer
+
+# 当前请求的追踪记录，由请求入口设置
+current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "t2img_current_trace", default=None
+)
+
+
+class Trace:
+    """一次请求的追踪记录"""
+
+    def __init__(self, name: str, **attrs: Any):
+        self.trace_id = os.urandom(6).hex()
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self.spans: list[dict[str, Any]] = []
+        self.duration: Optional[float] = None
+        self.outcome = "ok"
+        self.memory_peak: Optional[int] = None
+
+    def add_span(
+        self, name: str, seconds: float, outcome: str = "ok", **attrs: Any
+    ) -> None:
+        """记录一个已结束的阶段，起点由结束时间和耗时推算"""
+        end = time.monotonic() - self._start
+        self.spans.append(
+            {
+                "name": name,
+                "start_ms": round((end - seconds) * 1000, 1),
+                "duration_ms": round(seconds * 1000, 1),
+                "outcome": outcome,
+                **attrs,
+            }
+        )
+
+    def finish(self, outcome: str = "ok") -> float:
+        """结束追踪，返回总耗时 (秒)"""
+        if self.duration is None:
+            self.duration = time.monotonic() - self._start
+            self.outcome = outcome
+        return self.duration
+
+    def to_dict(self) -> dict[str, Any]:
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "time": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)
+            ),
+            "duration_ms": round((self.duration or 0.0) * 1000, 1),
+            "outcome": self.outcome,
+            **self.attrs,
+            "spans": self.spans,
+        }
+        if self.memory_peak is not None:
+            record["memory_peak_kb"] = self.memory_peak // 1024
+        return record
+
+
+def record_span(name: str, seconds: float, outcome: str = "ok", **attrs: Any) -> None:
+    """向当前请求的追踪记录添加 span，不在请求中时忽略"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span(name, seconds, outcome, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """记录代码块耗时的 span"""
+    start = time.monotonic()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        record_span(name, time.monotonic() - start, outcome, **attrs)
+
+
+class SlowRequestLog:
+    """将慢请求的追踪记录写入轮转的 JSONL 文件"""
+
+    def __init__(
+        self,
+        path: Path,
+        threshold_seconds: float,
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 3,
+        trace_memory: bool = False,
+        anonymizer: Optional[Anonymizer] = None,
+    ):
+        """初始化
+
+        Args:
+            path: 日志文件路径
+            threshold_seconds: 总耗时达到该值的请求才写入
+            max_bytes: 单个文件的最大字节数，超出后轮转
+            backup_count: 保留的历史文件数
+            trace_memory: 是否用 tracemalloc 采样请求期间的内存峰值（有明显开销）
+            anonymizer: 哈希用户 ID、群 ID 和提示词，None 表示记录原文
+        """
+        self.path = path
+        self.threshold_seconds = threshold_seconds
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.trace_memory = trace_memory
+        self.anonymizer = anonymizer
+        # delay=True: 首次写入时才打开文件
+        self._handler = RotatingFileHandler(
+            path,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self.written = 0
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self, trace: Trace) -> None:
+        """请求开始时调用，重置内存峰值"""
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def finish(self, trace: Trace) -> bool:
+        """请求结束时调用，返回是否需要写入（写入由调用方放到线程池执行）"""
+        if self.trace_memory and tracemalloc.is_tracing():
+            # 全进程的峰值，并发请求之间会相互影响
+            trace.memory_peak = tracemalloc.get_traced_memory()[1]
+        return (trace.duration or 0.0) >= self.threshold_seconds
+
+    def make_record(self, trace: Trace) -> dict[str, Any]:
+        """生成日志记录，设置了 anonymizer 时脱敏"""
+        record = trace.to_dict()
+        if self.anonymizer is None:
+            return record
+        redacted: dict[str, Any] = {}
+        for key, value in record.items():
+            if key in ("user", "group"):
+                redacted[key] = self.anonymizer.hash_id(str(value))
+            elif key == "prompt":
+                redacted.update(self.anonymizer.prompt_fields(value))
+            elif key == "items":
+                redacted[key] = [
+                    {
+                        **self.anonymizer.prompt_fields(prompt),
+                        "ratio": ratio,
+                        "quality": quality,
+                        "count": count,
+                    }
+                    for prompt, ratio, quality, count in value
+                ]
+            else:
+                redacted[key] = value
+        return redacted
+
+    def write(self, record: dict[str, Any]) -> None:
+        """追加一条记录（阻塞操作，可在多个线程中调用）"""
+        self._handler.handle(
+            logging.makeLogRecord(
+                {"msg": json.dumps(record, ensure_ascii=False, default=str)}
+            )
+        )
+        self.written += 1
+
+    def close(self) -> None:
+        self._handler.close()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stats(self) -> dict[str, Any]:
+        return {"threshold_s": self.threshold_seconds, "written": self.written}
@@ -0,0 +1,114 @@
+"""真实流量记录
+
+按请求记录紧凑的 JSONL：到达时间、哈希后的用户和群、提示词长度和哈希、
+比例、质量、数量、结果、总耗时、API 耗时和图片字节数。不记录提示词原文。
+记录文件可由 benchmarks/replay.py 按原速或加速回放到插件，
+用真实的群聊突发模式检验排队、限流和清理策略。
+"""
+
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Optional
+
+from .anonymize import Anonymizer
+from .tracing import Trace
+
+
+class TrafficRecorder:
+    """将请求追踪记录转换为可回放的流量记录"""
+
+    def __init__(
+        self,
+        path: Path,
+        anonymizer: Anonymizer,
+        max_bytes: int = 20 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        """初始化
+
+        Args:
+            path: 记录文件路径
+            anonymizer: 哈希用户 ID、群 ID 和提示词
+            max_bytes: 单个文件的最大字节数，超出后轮转
+            backup_count: 保留的历史文件数
+        """
+        self.path = path
+        self.anonymizer = anonymizer
+        self._handler = RotatingFileHandler(
+            path,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self.written = 0
+
+    def _prompt_fields(
+        self, prompt: str, ratio: str, quality: str, count: int
+    ) -> dict[str, Any]:
+        return {
+            **self.anonymizer.prompt_fields(prompt),
+            "ratio": ratio,
+            "quality": quality,
+            "count": count,
+        }
+
+    def make_record(self, trace: Trace) -> Optional[dict[str, Any]]:
+        """由请求追踪生成一条记录，缺少提示词信息（如参数错误）时返回 None"""
+        attrs = trace.attrs
+        record: dict[str, Any] = {
+            "t": round(trace.started_at, 3),
+            "kind": trace.name,
+            "user": self.anonymizer.hash_id(str(attrs.get("user", ""))),
+            "group": self.anonymizer.hash_id(str(attrs.get("group", ""))),
+        }
+        if "items" in attrs:
+            record["items"] = [
+                self._prompt_fields(prompt, ratio, quality, count)
+                for prompt, ratio, quality, count in attrs["items"]
+            ]
+        elif "prompt" in attrs:
+            record.update(
+                self._prompt_fields(
+                    attrs["prompt"],
+                    attrs.get("ratio", ""),
+                    attrs.get("quality", ""),
+                    attrs.get("count", 1),
+                )
+            )
+        else:
+            return None
+
+        def span_ms(name: str) -> float:
+            return round(
+                sum(s["duration_ms"] for s in trace.spans if s["name"] == name), 1
+            )
+
+        record.update(
+            {
+                "outcome": trace.outcome,
+                "latency_ms": round((trace.duration or 0.0) * 1000, 1),
+                "queue_ms": span_ms("queue_wait"),
+                "api_ms": span_ms("api"),
+                "bytes": attrs.get("bytes", 0),
+            }
+        )
+        return record
+
+    def write(self, record: dict[str, Any]) -> None:
+        """追加一条记录（阻塞操作，可在多个线程中调用）"""
+        self._handler.handle(
+            logging.makeLogRecord(
+                {"msg": json.dumps(record, ensure_ascii=False, separators=(",", ":"))}
+            )
+        )
+        self.written += 1
+
+    def close(self) -> None:
+        self._handler.close()
+
+    def stats(self) -> dict[str, Any]:
+        return {"written": self.written}
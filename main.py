@@ -5,19 +5,51 @@
 """
 
 import asyncio
+import math
 import os
 import time
 from pathlib import Path
-from typing import Optional
-
-import aiofiles
+from typing import AsyncIterator, Optional, Union
 
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent, filter
-from astrbot.api.message_components import Image
+from astrbot.api.message_components import Image, Plain
 from astrbot.api.star import Context, Star, StarTools, register
 
-from .providers import BaseProvider, GiteeProvider, AliyunProvider, VolcengineProvider
+from .core import (
+    CacheWarmer,
+    FairJobQueue,
+    ImagePostProcessor,
+    ImageStore,
+    NearDuplicateIndex,
+    PopularityTracker,
+    PostProcessOptions,
+    QualityGovernor,
+    QueueFullError,
+    RateLimiter,
+    ResultCache,
+    SingleFlight,
+    TokenBucketLimiter,
+)
+from .core.job_queue import OVERFLOW_REJECT
+from .core.postprocess import FORMAT_ORIGINAL
+from .core.metrics import MetricsRegistry, PhaseTimer, request_labels
+from .core.prompt import ParsedPrompt, normalize_prompt, parse_prompt_args
+from .core.anonymize import Anonymizer
+from .core.traffic_recorder import TrafficRecorder
+from .core.tracing import SlowRequestLog, Trace, current_trace, span
+from .providers import (
+    BaseProvider,
+    CircuitBreaker,
+    ImageResult,
+    PROVIDER_REGISTRY,
+    Deadline,
+    HttpTransport,
+    PoolMember,
+    ProviderPool,
+    RetryPolicy,
+)
+from .providers.resolutions import select_size
 
 # 配置常量
 DEFAULT_MODEL = "z-image-turbo"
@@ -28,18 +60,99 @@ DEFAULT_NEGATIVE_PROMPT = (
     "jpeg artifacts, signature, watermark, username, blurry"
 )
 
-# 防抖和清理配置
-DEBOUNCE_SECONDS = 10.0
-MAX_CACHED_IMAGES = 50
-OPERATION_CACHE_TTL = 300  # 5分钟清理一次过期操作记录
-CLEANUP_INTERVAL = 10  # 每 N 次生成执行一次清理
-
-# Provider 映射
-PROVIDER_MAP = {
-    "gitee": GiteeProvider,
-    "aliyun": AliyunProvider,
-    "volcengine": VolcengineProvider,
-}
+# 限流配置（每分钟令牌数, 突发量），速率为 0 表示不限流
+DEFAULT_RATE_USER_PER_MINUTE = 6
+DEFAULT_RATE_USER_BURST = 1
+DEFAULT_RATE_GROUP_PER_MINUTE = 0
+DEFAULT_RATE_GROUP_BURST = 5
+DEFAULT_RATE_GLOBAL_PER_MINUTE = 0
+DEFAULT_RATE_GLOBAL_BURST = 10
+
+# HTTP 连接池配置
+DEFAULT_HTTP_POOL_SIZE = 100
+DEFAULT_HTTP_KEEPALIVE_SECONDS = 120
+DEFAULT_HTTP_DNS_CACHE_SECONDS = 300
+DEFAULT_HTTP_TIMEOUT_SECONDS = 300
+
+# 响应体或 Base64 数据达到该大小 (KB) 时在线程池中解码
+DEFAULT_DECODE_OFFLOAD_KB = 256
+
+# 重试配置
+DEFAULT_RETRY_MAX_ATTEMPTS = 3
+DEFAULT_DOWNLOAD_RETRY_MAX_ATTEMPTS = 4
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_REQUEST_DEADLINE_SECONDS = 240
+
+# 指标快照配置
+DEFAULT_METRICS_SNAPSHOT_INTERVAL = 60
+METRICS_SNAPSHOT_FILENAME = "metrics.prom"
+
+# 慢请求日志配置
+DEFAULT_SLOW_REQUEST_SECONDS = 60
+DEFAULT_SLOW_LOG_MAX_MB = 5
+SLOW_REQUEST_LOG_FILENAME = "slow_requests.jsonl"
+
+# 流量记录文件，供 benchmarks/replay.py 回放
+TRAFFIC_LOG_FILENAME = "traffic.jsonl"
+
+# 任务队列配置
+DEFAULT_MAX_CONCURRENT_JOBS = 4
+DEFAULT_QUEUE_MAX_SIZE = 50
+DEFAULT_MAX_JOBS_PER_USER = 2
+
+# 图片存储配置
+DEFAULT_STORAGE_MAX_MB = 500
+DEFAULT_STORAGE_TTL_HOURS = 72
+
+# 结果缓存配置
+DEFAULT_CACHE_MAX_ENTRIES = 200
+DEFAULT_CACHE_MAX_MB = 200
+
+# 缓存预热配置
+DEFAULT_WARM_TOP_K = 10
+DEFAULT_WARM_IDLE_SECONDS = 300
+DEFAULT_WARM_MAX_PER_HOUR = 6
+DEFAULT_WARM_HALF_LIFE_HOURS = 24
+# 剩余存活时间低于 TTL 的该比例时刷新
+WARM_REFRESH_MARGIN = 0.25
+
+# 图片后处理配置
+DEFAULT_POSTPROCESS_MAX_EDGE = 2048
+DEFAULT_POSTPROCESS_MAX_KB = 0
+DEFAULT_POSTPROCESS_WORKERS = 2
+
+# 图片发送方式：file 写入 images/ 后发送；direct 直接发送 URL 或内存数据
+DELIVERY_FILE = "file"
+DELIVERY_DIRECT = "direct"
+
+# 质量降级配置：(1 级阈值, 2 级阈值)
+DEFAULT_GOVERNOR_QUEUE_THRESHOLDS = (10, 25)
+DEFAULT_GOVERNOR_LATENCY_THRESHOLDS = (60.0, 120.0)
+DEFAULT_GOVERNOR_HOLD_SECONDS = 60
+
+# 多图生成配置
+DEFAULT_MAX_IMAGES_PER_REQUEST = 4
+
+# 熔断配置
+DEFAULT_BREAKER_FAILURE_RATIO = 0.5
+DEFAULT_BREAKER_MIN_CALLS = 5
+DEFAULT_BREAKER_WINDOW_SECONDS = 60
+DEFAULT_BREAKER_OPEN_SECONDS = 30
+DEFAULT_BREAKER_SLOW_CALL_SECONDS = 120
+
+# 批量生成配置
+DEFAULT_BATCH_MAX_PROMPTS = 10
+DEFAULT_BATCH_CONCURRENCY = 2
+
+# 对冲请求配置
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+
+# 近似重复提示词的默认相似度阈值
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.85
+
+# Provider 映射，首次使用时才导入对应模块
+PROVIDER_MAP = PROVIDER_REGISTRY
 
 
 @register(
@@ -64,20 +177,322 @@ class MultiPlatformText2Image(Star):
         self.ratio = config.get("ratio", DEFAULT_RATIO)
         self.negative_prompt = config.get("negative_prompt", DEFAULT_NEGATIVE_PROMPT)
 
-        # 创建 provider 实例
-        self.provider = self._create_provider()
+        # 延迟与吞吐指标
+        self.metrics = MetricsRegistry()
+        self.metrics_snapshot_interval = float(
+            config.get("metrics_snapshot_interval", DEFAULT_METRICS_SNAPSHOT_INTERVAL)
+        )
 
-        # 并发控制
-        self.processing_users: set[str] = set()
-        self.last_operations: dict[str, float] = {}
+        # 所有 provider 共享的 HTTP 连接池
+        self.transport = HttpTransport(
+            pool_size=int(config.get("http_pool_size", DEFAULT_HTTP_POOL_SIZE)),
+            keepalive_seconds=float(
+                config.get("http_keepalive_seconds", DEFAULT_HTTP_KEEPALIVE_SECONDS)
+            ),
+            dns_cache_seconds=int(
+                config.get("http_dns_cache_seconds", DEFAULT_HTTP_DNS_CACHE_SECONDS)
+            ),
+            timeout_seconds=float(
+                config.get("http_timeout_seconds", DEFAULT_HTTP_TIMEOUT_SECONDS)
+            ),
+        )
 
-        # 图片目录
+        # 生成调用和图片下载的重试策略，以及单次请求的总时间预算
+        retry_base_delay = float(
+            config.get("retry_base_delay", DEFAULT_RETRY_BASE_DELAY)
+        )
+        self.generation_retry = RetryPolicy(
+            max_attempts=int(
+                config.get("retry_max_attempts", DEFAULT_RETRY_MAX_ATTEMPTS)
+            ),
+            base_delay=retry_base_delay,
+        )
+        self.download_retry = RetryPolicy(
+            max_attempts=int(
+                config.get(
+                    "download_retry_max_attempts", DEFAULT_DOWNLOAD_RETRY_MAX_ATTEMPTS
+                )
+            ),
+            base_delay=retry_base_delay / 2,
+        )
+        self.request_deadline_seconds = float(
+            config.get("request_deadline_seconds", DEFAULT_REQUEST_DEADLINE_SECONDS)
+        )
+        self.max_images_per_request = max(
+            1,
+            int(
+                config.get("max_images_per_request", DEFAULT_MAX_IMAGES_PER_REQUEST)
+            ),
+        )
+        self.batch_max_prompts = max(
+            1, int(config.get("batch_max_prompts", DEFAULT_BATCH_MAX_PROMPTS))
+        )
+        self.batch_concurrency = max(
+            1, int(config.get("batch_concurrency", DEFAULT_BATCH_CONCURRENCY))
+        )
+
+        # 创建主 provider 和包含备用 provider 的池
+        self.provider = self._create_provider(
+            self.provider_name,
+            self.api_keys,
+            self.model,
+            config.get("base_url", ""),
+        )
+        self.provider_pool = self._create_provider_pool()
+
+        # 用户、群和全局三级限流
+        self.rate_limiter = RateLimiter(
+            user=TokenBucketLimiter(
+                float(
+                    config.get("rate_user_per_minute", DEFAULT_RATE_USER_PER_MINUTE)
+                ),
+                int(config.get("rate_user_burst", DEFAULT_RATE_USER_BURST)),
+            ),
+            group=TokenBucketLimiter(
+                float(
+                    config.get("rate_group_per_minute", DEFAULT_RATE_GROUP_PER_MINUTE)
+                ),
+                int(config.get("rate_group_burst", DEFAULT_RATE_GROUP_BURST)),
+            ),
+            global_=TokenBucketLimiter(
+                float(
+                    config.get(
+                        "rate_global_per_minute", DEFAULT_RATE_GLOBAL_PER_MINUTE
+                    )
+                ),
+                int(config.get("rate_global_burst", DEFAULT_RATE_GLOBAL_BURST)),
+            ),
+        )
+
+        # 全局生图队列：限制并发并在用户和群之间公平调度
+        self.job_queue = FairJobQueue(
+            max_workers=int(
+                config.get("max_concurrent_jobs", DEFAULT_MAX_CONCURRENT_JOBS)
+            ),
+            max_pending=int(config.get("queue_max_size", DEFAULT_QUEUE_MAX_SIZE)),
+            max_per_user=int(
+                config.get("max_jobs_per_user", DEFAULT_MAX_JOBS_PER_USER)
+            ),
+            overflow=config.get("queue_overflow", OVERFLOW_REJECT),
+        )
+
+        # 发送方式：direct 模式不写入 images/，存储、缓存和后处理都不启用
+        self.delivery_mode = config.get("delivery_mode", DELIVERY_FILE)
+        self.direct_url_passthrough = bool(
+            config.get("direct_url_passthrough", True)
+        )
+        file_delivery = self.delivery_mode != DELIVERY_DIRECT
+
+        # 高负载时自动降低质量档位
+        self.quality_governor: Optional[QualityGovernor] = None
+        if config.get("quality_governor_enabled", True):
+            self.quality_governor = QualityGovernor(
+                queue_thresholds=(
+                    int(
+                        config.get(
+                            "governor_queue_soft", DEFAULT_GOVERNOR_QUEUE_THRESHOLDS[0]
+                        )
+                    ),
+                    int(
+                        config.get(
+                            "governor_queue_hard", DEFAULT_GOVERNOR_QUEUE_THRESHOLDS[1]
+                        )
+                    ),
+                ),
+                latency_thresholds=(
+                    float(
+                        config.get(
+                            "governor_latency_soft",
+                            DEFAULT_GOVERNOR_LATENCY_THRESHOLDS[0],
+                        )
+                    ),
+                    float(
+                        config.get(
+                            "governor_latency_hard",
+                            DEFAULT_GOVERNOR_LATENCY_THRESHOLDS[1],
+                        )
+                    ),
+                ),
+                hold_seconds=float(
+                    config.get("governor_hold_seconds", DEFAULT_GOVERNOR_HOLD_SECONDS)
+                ),
+            )
+
+        # 图片目录和存储索引
         self._image_dir: Optional[Path] = None
+        self._image_store: Optional[ImageStore] = None
+        self._image_store_lock = asyncio.Lock()
+        self.storage_max_bytes = (
+            int(config.get("storage_max_mb", DEFAULT_STORAGE_MAX_MB)) * 1024 * 1024
+        )
+        self.storage_ttl_seconds = (
+            float(config.get("storage_ttl_hours", DEFAULT_STORAGE_TTL_HOURS)) * 3600
+        )
 
-        # 清理计数器和后台任务引用
-        self._generation_count: int = 0
+        # 发送前的图片后处理，Pillow 不可用时关闭
+        self.postprocessor: Optional[ImagePostProcessor] = None
+        if config.get("postprocess_enabled", False) and file_delivery:
+            if ImagePostProcessor.available():
+                self.postprocessor = ImagePostProcessor(
+                    PostProcessOptions(
+                        format=config.get("postprocess_format", FORMAT_ORIGINAL),
+                        max_edge=int(
+                            config.get(
+                                "postprocess_max_edge", DEFAULT_POSTPROCESS_MAX_EDGE
+                            )
+                        ),
+                        max_bytes=int(
+                            config.get("postprocess_max_kb", DEFAULT_POSTPROCESS_MAX_KB)
+                        )
+                        * 1024,
+                        strip_metadata=bool(
+                            config.get("postprocess_strip_metadata", True)
+                        ),
+                    ),
+                    platform_limits=ImagePostProcessor.parse_platform_limits(
+                        config.get("postprocess_platform_limits", [])
+                    ),
+                    max_workers=int(
+                        config.get("postprocess_workers", DEFAULT_POSTPROCESS_WORKERS)
+                    ),
+                )
+            else:
+                logger.warning("未安装 Pillow，图片后处理已关闭")
+
+        # 慢请求追踪日志和流量记录，在 initialize 中创建
+        self.slow_log: Optional[SlowRequestLog] = None
+        self.traffic_recorder: Optional[TrafficRecorder] = None
+
+        # 后台任务引用
         self._background_tasks: set[asyncio.Task] = set()
 
+        # 合并相同的进行中请求
+        self._inflight = SingleFlight()
+        # 已提交到队列、尚未完成的请求，相同请求入队前直接等待其结果
+        self._queued_requests: dict[tuple, asyncio.Future] = {}
+
+        # 生图结果缓存
+        self.result_cache: Optional[ResultCache] = None
+        if config.get("cache_enabled", True) and file_delivery:
+            self.result_cache = ResultCache(
+                max_entries=int(
+                    config.get("cache_max_entries", DEFAULT_CACHE_MAX_ENTRIES)
+                ),
+                max_bytes=int(config.get("cache_max_mb", DEFAULT_CACHE_MAX_MB))
+                * 1024
+                * 1024,
+                is_alive=self._is_image_stored,
+            )
+
+        # 近似重复提示词索引，让 LLM 改写过的相似提示词复用缓存结果
+        self.prompt_index: Optional[NearDuplicateIndex] = None
+        near_duplicate_threshold = float(
+            config.get("near_duplicate_threshold", DEFAULT_NEAR_DUPLICATE_THRESHOLD)
+        )
+        if self.result_cache is not None and near_duplicate_threshold > 0:
+            self.prompt_index = NearDuplicateIndex(
+                threshold=near_duplicate_threshold,
+                max_entries=self.result_cache.max_entries,
+            )
+
+        # 热门请求统计与空闲时的缓存预热
+        self._last_request_at = time.monotonic()
+        self.warm_idle_seconds = float(
+            config.get("warm_idle_seconds", DEFAULT_WARM_IDLE_SECONDS)
+        )
+        self.popularity: Optional[PopularityTracker] = None
+        self.cache_warmer: Optional[CacheWarmer] = None
+        self._warm_task: Optional[asyncio.Task] = None
+        if config.get("warm_enabled", False) and self.result_cache is not None:
+            self.popularity = PopularityTracker(
+                half_life_seconds=float(
+                    config.get("warm_half_life_hours", DEFAULT_WARM_HALF_LIFE_HOURS)
+                )
+                * 3600,
+                max_entries=self.result_cache.max_entries,
+            )
+            self.cache_warmer = CacheWarmer(
+                self.popularity,
+                is_idle=self._is_idle_for_warm,
+                needs_warm=self._needs_warm,
+                warm=self._warm_entry,
+                top_k=int(config.get("warm_top_k", DEFAULT_WARM_TOP_K)),
+                max_per_hour=int(
+                    config.get("warm_max_per_hour", DEFAULT_WARM_MAX_PER_HOUR)
+                ),
+            )
+
+    async def initialize(self) -> None:
+        """插件加载后在后台建立图片索引并预热连接"""
+        if self.delivery_mode == DELIVERY_FILE:
+            self._spawn_background(self._get_image_store())
+        if self.config.get("http_warmup", True):
+            self._spawn_background(self.provider_pool.warmup())
+        if self.metrics_snapshot_interval > 0:
+            self._spawn_background(self._metrics_snapshot_loop())
+        slow_seconds = float(
+            self.config.get("slow_request_seconds", DEFAULT_SLOW_REQUEST_SECONDS)
+        )
+        slow_log_raw = bool(self.config.get("slow_log_include_prompt", False))
+        traffic_enabled = bool(self.config.get("traffic_record_enabled", False))
+        data_dir = StarTools.get_data_dir("astrbot_plugin_text2img")
+        anonymizer: Optional[Anonymizer] = None
+        if (slow_seconds > 0 and not slow_log_raw) or traffic_enabled:
+            try:
+                anonymizer = Anonymizer(
+                    await asyncio.to_thread(Anonymizer.load_salt, data_dir)
+                )
+            except OSError as e:
+                logger.warning(f"无法读取脱敏盐值，需要脱敏的日志不会写入: {e}")
+        if slow_seconds > 0 and (slow_log_raw or anonymizer is not None):
+            self.slow_log = SlowRequestLog(
+                data_dir / SLOW_REQUEST_LOG_FILENAME,
+                threshold_seconds=slow_seconds,
+                max_bytes=int(
+                    self.config.get("slow_log_max_mb", DEFAULT_SLOW_LOG_MAX_MB)
+                )
+                * 1024
+                * 1024,
+                trace_memory=bool(self.config.get("slow_log_trace_memory", False)),
+                anonymizer=None if slow_log_raw else anonymizer,
+            )
+        if traffic_enabled and anonymizer is not None:
+            self.traffic_recorder = TrafficRecorder(
+                data_dir / TRAFFIC_LOG_FILENAME, anonymizer
+            )
+        if self.cache_warmer is not None:
+            self._warm_task = asyncio.create_task(
+                self.cache_warmer.run(
+                    on_error=lambda e: logger.warning(f"缓存预热失败: {e}")
+                )
+            )
+
+    def _observe_provider_phase(
+        self, phase: str, seconds: float, labels: dict[str, str]
+    ) -> None:
+        """provider 阶段耗时回调"""
+        self.metrics.observe_phase(phase, seconds, **labels)
+
+    def _sync_write_metrics_snapshot(self, content: str) -> None:
+        """原子写入 Prometheus 指标快照（在线程池中执行）"""
+        base_dir = StarTools.get_data_dir("astrbot_plugin_text2img")
+        path = base_dir / METRICS_SNAPSHOT_FILENAME
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    async def _metrics_snapshot_loop(self) -> None:
+        """定期将指标快照写入插件数据目录"""
+        while True:
+            await asyncio.sleep(self.metrics_snapshot_interval)
+            try:
+                await asyncio.to_thread(
+                    self._sync_write_metrics_snapshot,
+                    self.metrics.render_prometheus(),
+                )
+            except OSError as e:
+                logger.warning(f"写入指标快照失败: {e}")
+
     @staticmethod
     def _parse_api_keys(api_keys) -> list[str]:
         """解析 API Keys 配置，支持字符串和列表格式"""
@@ -89,21 +504,113 @@ class MultiPlatformText2Image(Star):
             return [str(k).strip() for k in api_keys if str(k).strip()]
         return []
 
-    def _create_provider(self) -> BaseProvider:
+    def _create_provider(
+        self,
+        provider_name: str,
+        api_keys: list[str],
+        model: str,
+        base_url: str = "",
+    ) -> BaseProvider:
         """创建对应的 provider 实例"""
-        provider_class = PROVIDER_MAP.get(self.provider_name)
+        provider_class = PROVIDER_MAP.get(provider_name)
         if not provider_class:
-            raise ValueError(f"不支持的provider: {self.provider_name}")
+            raise ValueError(f"不支持的provider: {provider_name}")
 
-        # 获取 base_url，如果配置中没有，则使用 provider 的默认值
-        base_url = self.config.get("base_url") or provider_class.get_default_base_url()
+        # 如果没有配置 base_url，则使用 provider 的默认值
+        base_url = base_url or provider_class.get_default_base_url()
 
         # 创建 provider 实例
         return provider_class(
-            api_keys=self.api_keys,
+            api_keys=api_keys,
             base_url=base_url,
-            model=self.model,
+            model=model,
             negative_prompt=self.negative_prompt,
+            key_max_concurrency=self.config.get("key_max_concurrency", 0),
+            key_cooldown_seconds=self.config.get("key_cooldown_seconds", 30),
+            transport=self.transport,
+            generation_retry=self.generation_retry,
+            download_retry=self.download_retry,
+            phase_observer=self._observe_provider_phase,
+            async_mode=self.config.get("aliyun_async_mode", False),
+            decode_offload_bytes=int(
+                self.config.get("decode_offload_kb", DEFAULT_DECODE_OFFLOAD_KB)
+            )
+            * 1024,
+        )
+
+    def _create_provider_pool(self) -> ProviderPool:
+        """创建 provider 池：主 provider 在前，备用 provider 按配置顺序在后
+
+        备用 provider 格式: provider|model|key1,key2|base_url（base_url 可省略）
+        """
+        members = [
+            PoolMember(
+                self.provider_name,
+                self.provider,
+                breaker=self._create_breaker(self.provider_name),
+            )
+        ]
+        for entry in self.config.get("fallback_providers", []) or []:
+            fields = [f.strip() for f in str(entry).split("|")]
+            if len(fields) < 3 or not fields[0]:
+                logger.warning(f"忽略格式错误的备用 provider 配置: {entry}")
+                continue
+            name = fields[0].lower()
+            model = fields[1] or self.model
+            base_url = fields[3] if len(fields) > 3 else ""
+            try:
+                provider = self._create_provider(
+                    name, self._parse_api_keys(fields[2]), model, base_url
+                )
+            except ValueError as e:
+                logger.warning(f"忽略备用 provider {name}: {e}")
+                continue
+            member_name = f"{name}/{model}"
+            members.append(
+                PoolMember(
+                    member_name, provider, breaker=self._create_breaker(member_name)
+                )
+            )
+
+        return ProviderPool(
+            members,
+            default_ratio=self.ratio,
+            hedge_enabled=bool(self.config.get("hedge_enabled", False)),
+            hedge_percentile=float(
+                self.config.get("hedge_percentile", DEFAULT_HEDGE_PERCENTILE)
+            ),
+            hedge_min_samples=int(
+                self.config.get("hedge_min_samples", DEFAULT_HEDGE_MIN_SAMPLES)
+            ),
+        )
+
+    def _create_breaker(self, name: str) -> Optional[CircuitBreaker]:
+        """按配置为池中的 provider 创建熔断器，未启用时返回 None"""
+        if not self.config.get("breaker_enabled", True):
+            return None
+        return CircuitBreaker(
+            name,
+            failure_ratio=float(
+                self.config.get(
+                    "breaker_failure_ratio", DEFAULT_BREAKER_FAILURE_RATIO
+                )
+            ),
+            min_calls=int(
+                self.config.get("breaker_min_calls", DEFAULT_BREAKER_MIN_CALLS)
+            ),
+            window_seconds=float(
+                self.config.get(
+                    "breaker_window_seconds", DEFAULT_BREAKER_WINDOW_SECONDS
+                )
+            ),
+            open_seconds=float(
+                self.config.get("breaker_open_seconds", DEFAULT_BREAKER_OPEN_SECONDS)
+            ),
+            slow_call_seconds=float(
+                self.config.get(
+                    "breaker_slow_call_seconds", DEFAULT_BREAKER_SLOW_CALL_SECONDS
+                )
+            ),
         )
 
     def _get_image_dir(self) -> Path:
@@ -120,142 +627,682 @@ class MultiPlatformText2Image(Star):
         filename = f"{int(time.time())}_{os.urandom(4).hex()}{extension}"
         return str(image_dir / filename)
 
-    def _sync_cleanup_old_images(self) -> None:
-        """同步清理旧图片（在线程池中执行）"""
-        try:
-            image_dir = self._get_image_dir()
-            # 收集所有支持的图片格式
-            images: list[Path] = []
-            for ext in ("*.jpg", "*.png", "*.webp"):
-                images.extend(image_dir.glob(ext))
-
-            # 按修改时间排序
-            images.sort(key=lambda p: p.stat().st_mtime)
-
-            if len(images) > MAX_CACHED_IMAGES:
-                to_delete = images[: len(images) - MAX_CACHED_IMAGES]
-                for img_path in to_delete:
-                    try:
-                        img_path.unlink()
-                    except OSError:
-                        pass
-        except Exception as e:
-            logger.warning(f"清理旧图片时出错: {e}")
-
-    async def _cleanup_old_images(self) -> None:
-        """异步清理旧图片，使用线程池执行阻塞操作"""
-        await asyncio.to_thread(self._sync_cleanup_old_images)
-
-    def _cleanup_expired_operations(self) -> None:
-        """清理过期的操作记录，防止内存泄漏"""
-        current_time = time.time()
-        expired_keys = [
-            key
-            for key, timestamp in self.last_operations.items()
-            if current_time - timestamp > OPERATION_CACHE_TTL
-        ]
-        for key in expired_keys:
-            del self.last_operations[key]
-
-    def _check_debounce(self, request_id: str) -> bool:
-        """检查防抖，返回 True 表示需要拒绝请求"""
-        current_time = time.time()
+    async def _get_image_store(self) -> ImageStore:
+        """获取图片存储索引（首次使用时在线程池中扫描目录建立）"""
+        if self._image_store is not None:
+            return self._image_store
+        async with self._image_store_lock:
+            if self._image_store is None:
+                store = ImageStore(
+                    self._get_image_dir(),
+                    max_bytes=self.storage_max_bytes,
+                    ttl_seconds=self.storage_ttl_seconds,
+                    on_evict=self._on_image_evicted,
+                )
+                try:
+                    store.load(await asyncio.to_thread(store.scan))
+                except OSError as e:
+                    logger.warning(f"扫描图片目录时出错: {e}")
+                self._image_store = store
+                self._evict_images(store)
+        return self._image_store
+
+    def _is_image_stored(self, path: str) -> bool:
+        """缓存命中时检查图片是否仍在存储索引中（索引建立前不检查）"""
+        return self._image_store is None or path in self._image_store
+
+    def _on_image_evicted(self, path: str) -> None:
+        """图片被存储淘汰时同步移除缓存引用"""
+        if self.result_cache is not None:
+            self.result_cache.discard_path(path)
+
+    def _evict_images(self, store: ImageStore) -> None:
+        """淘汰超出配额或过期的图片，删除操作在后台线程执行"""
+        evicted = store.collect_evictions()
+        if evicted:
+            self._spawn_background(asyncio.to_thread(self._sync_remove_files, evicted))
 
-        # 定期清理过期记录
-        if len(self.last_operations) > 100:
-            self._cleanup_expired_operations()
+    @staticmethod
+    def _sync_remove_files(paths: list[str]) -> None:
+        """同步删除文件（在线程池中执行）"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _spawn_background(self, coro) -> None:
+        """启动后台任务并保持引用"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _is_idle_for_warm(self) -> bool:
+        """队列空闲足够久且主 provider 的 API Key 有余量"""
+        return (
+            self.job_queue.pending == 0
+            and self.job_queue.running == 0
+            and time.monotonic() - self._last_request_at >= self.warm_idle_seconds
+            and self.provider.key_scheduler.has_spare_capacity()
+        )
 
-        if request_id in self.last_operations:
-            if current_time - self.last_operations[request_id] < DEBOUNCE_SECONDS:
+    def _needs_warm(self, cache_key: tuple) -> bool:
+        """热门条目未缓存，或其图片即将因存活时间到期被淘汰"""
+        paths = self.result_cache.peek(cache_key)
+        if not paths:
+            return True
+        if self._image_store is None or self.storage_ttl_seconds <= 0:
+            return False
+        refresh_after = self.storage_ttl_seconds * (1 - WARM_REFRESH_MARGIN)
+        for path in paths:
+            age = self._image_store.age(path)
+            if age is None or age >= refresh_after:
                 return True
-
-        self.last_operations[request_id] = current_time
         return False
 
+    async def _warm_entry(self, cache_key: tuple, payload: tuple) -> bool:
+        """预热一个热门条目，返回是否调用了生成 API"""
+        prompt, ratio, quality, n = payload
+        store = await self._get_image_store()
+        paths = self.result_cache.peek(cache_key)
+        if paths and all(path in store for path in paths):
+            # 图片仍在，刷新访问时间即可推迟淘汰，不消耗 API 额度
+            for path in paths:
+                store.touch(path)
+            return False
+        request_labels.set({"quality": quality})
+        await self._inflight.do(
+            cache_key,
+            lambda: self._generate_and_store(cache_key, prompt, ratio, quality, n),
+        )
+        logger.info(f"已预热热门提示词: {prompt} ({ratio}, {quality}, x{n})")
+        return True
+
+    def _start_trace(self, event: AstrMessageEvent, name: str) -> Trace:
+        """为一次请求创建追踪记录并设为当前上下文的追踪"""
+        trace = Trace(
+            name,
+            user=event.get_sender_id(),
+            group=event.get_group_id() or "",
+            platform=event.get_platform_name(),
+        )
+        current_trace.set(trace)
+        if self.slow_log is not None:
+            self.slow_log.start(trace)
+        return trace
+
+    def _finish_trace(self, trace: Trace, outcome: str) -> None:
+        """结束追踪，超过阈值的慢请求在后台写入日志，启用流量记录时写入记录"""
+        duration = trace.finish(outcome)
+        if self.traffic_recorder is not None:
+            record = self.traffic_recorder.make_record(trace)
+            if record is not None:
+                self._spawn_background(
+                    asyncio.to_thread(self.traffic_recorder.write, record)
+                )
+        if self.slow_log is None or not self.slow_log.finish(trace):
+            return
+        logger.info(f"[{trace.trace_id}] 慢请求: 耗时 {duration:.1f}s ({outcome})")
+        self._spawn_background(
+            asyncio.to_thread(self.slow_log.write, self.slow_log.make_record(trace))
+        )
+
+    def _check_rate_limit(self, event: AstrMessageEvent) -> Optional[str]:
+        """检查限流，被限流时返回提示语，否则返回 None"""
+        retry_after = self.rate_limiter.check(
+            event.get_sender_id(), event.get_group_id() or ""
+        )
+        if retry_after <= 0:
+            return None
+        return f"操作太快了，请 {math.ceil(retry_after)} 秒后再试。"
+
+    async def _generate_and_store(
+        self, cache_key: tuple, prompt: str, ratio: str, quality: str, n: int
+    ) -> list[str]:
+        """调用 provider 池生成图片并保存到本地，返回文件路径列表"""
+        # 调用 provider 生成图片，直接流式写入本地文件
+        store = await self._get_image_store()
+        saved = await self.provider_pool.generate_images_to_file(
+            prompt,
+            ratio,
+            quality,
+            self._get_save_path,
+            n,
+            Deadline(self.request_deadline_seconds),
+        )
+        for filepath, file_size in saved:
+            store.add(filepath, file_size)
+        filepaths = [filepath for filepath, _ in saved]
+
+        # 写入结果缓存，缓存淘汰的文件一并删除
+        if self.result_cache is not None:
+            cache_evicted = self.result_cache.put(
+                cache_key, filepaths, sum(size for _, size in saved)
+            )
+            for path in cache_evicted:
+                store.remove(path)
+            if self.prompt_index is not None:
+                context, normalized = self._split_request_key(cache_key)
+                self.prompt_index.add(context, normalized, cache_key)
+            if cache_evicted:
+                self._spawn_background(
+                    asyncio.to_thread(self._sync_remove_files, cache_evicted)
+                )
+
+        self._evict_images(store)
+        return filepaths
+
     async def _generate_image(
         self, prompt: str, ratio: str = "1:1", quality: str = "m"
     ) -> str:
-        """调用文生图 API 生成图片，返回本地文件路径
+        """调用文生图 API 生成一张图片，返回本地文件路径"""
+        return (await self._generate_images(prompt, ratio, quality, 1))[0]
+
+    def _request_key(self, prompt: str, ratio: str, quality: str, n: int) -> tuple:
+        """结果缓存和请求合并使用的键"""
+        # 使用主 provider 的尺寸，各 provider 的实际尺寸由池按各自的分辨率表选择
+        target_size = select_size(
+            self.provider.get_supported_ratios(), ratio, quality, self.ratio
+        )
+        return ResultCache.make_key(
+            self.provider_name,
+            self.model,
+            normalize_prompt(prompt),
+            self.negative_prompt,
+            target_size,
+            n,
+        )
+
+    @staticmethod
+    def _split_request_key(cache_key: tuple) -> tuple[tuple, str]:
+        """拆分为 (除提示词外的上下文, 规范化提示词)，供近似重复索引使用"""
+        return cache_key[:2] + cache_key[3:], cache_key[2]
+
+    def _find_similar(self, cache_key: tuple) -> Optional[list[str]]:
+        """在近似重复索引中查找相似提示词的缓存结果"""
+        if self.prompt_index is None or self.result_cache is None:
+            return None
+        context, normalized = self._split_request_key(cache_key)
+        similar_key = self.prompt_index.find(context, normalized)
+        if similar_key is None or similar_key == cache_key:
+            return None
+        cached_paths = self.result_cache.get(similar_key)
+        if not cached_paths:
+            # 对应的缓存已被淘汰
+            self.prompt_index.remove(similar_key)
+            return None
+        logger.debug(f"命中近似提示词缓存: {similar_key[2]!r} -> {normalized!r}")
+        return cached_paths
+
+    def _cached_images(
+        self, cache_key: tuple, fuzzy: bool, recheck: bool = False
+    ) -> Optional[list[str]]:
+        """查询结果缓存（精确未命中时按 fuzzy 查找相似提示词），未命中返回 None
+
+        recheck 表示入队前已查询过一次，此时未命中不再计入缓存统计。
+        """
+        if self.result_cache is None:
+            return None
+        if recheck and self.result_cache.peek(cache_key) is None:
+            cached_paths = None
+        else:
+            cached_paths = self.result_cache.get(cache_key)
+        if not cached_paths and fuzzy:
+            cached_paths = self._find_similar(cache_key)
+        if not cached_paths:
+            return None
+        if self._image_store is not None:
+            for path in cached_paths:
+                self._image_store.touch(path)
+        logger.debug(f"命中生图缓存: {cached_paths} ({self.result_cache.stats()})")
+        self.metrics.inc("t2img_requests_total", outcome="cache_hit")
+        return cached_paths
+
+    async def _generate_direct(
+        self, prompt: str, ratio: str = "1:1", quality: str = "m", n: int = 1
+    ) -> list[ImageResult]:
+        """调用文生图 API 生成图片，不写入磁盘，返回图片 URL 或内存数据"""
+        request_labels.set({"quality": quality})
+        try:
+            # 相同请求正在生成时共享结果，避免重复调用 API
+            results = await self._inflight.do(
+                self._request_key(prompt, ratio, quality, n),
+                lambda: self.provider_pool.generate_images(
+                    prompt,
+                    ratio,
+                    quality,
+                    n,
+                    Deadline(self.request_deadline_seconds),
+                    download=not self.direct_url_passthrough,
+                ),
+            )
+            self.metrics.inc("t2img_requests_total", outcome="ok")
+            return results
+        except Exception as e:
+            self.metrics.inc("t2img_requests_total", outcome="error")
+            raise Exception(f"生成图片失败: {str(e)}") from e
+
+    async def _generate_images(
+        self,
+        prompt: str,
+        ratio: str = "1:1",
+        quality: str = "m",
+        n: int = 1,
+        fuzzy: bool = False,
+    ) -> list[str]:
+        """调用文生图 API 生成图片，返回本地文件路径列表
 
         Args:
             prompt: 提示词
             ratio: 图片比例 (1:1, 16:9 等)
             quality: 图片质量 (s=低, m=中, h=高)
+            n: 图片数量
+            fuzzy: 精确缓存未命中时是否复用相似提示词的结果
         """
+        # 本请求内上报的指标都带上质量档位
+        request_labels.set({"quality": quality})
         try:
-            # 获取支持的比例
-            supported_ratios = self.provider.get_supported_ratios()
-            if ratio not in supported_ratios:
-                ratio = self.ratio  # 使用默认比例
-
-            # 根据 quality 选择尺寸 (s=0, m=1, h=2)
-            quality_map = {"s": 0, "m": 1, "h": 2}
-            quality_index = quality_map.get(quality, 1)  # 默认中等
-
-            size_list = supported_ratios[ratio]
-            # 确保索引不越界
-            size_index = min(quality_index, len(size_list) - 1)
-            target_size = size_list[size_index]
-
-            # 调用 provider 生成图片
-            image_data, extension = await self.provider.generate_image(
-                prompt, target_size
+            # 排队期间其他请求可能已生成相同结果，执行前再查一次缓存
+            cache_key = self._request_key(prompt, ratio, quality, n)
+            cached_paths = self._cached_images(cache_key, fuzzy, recheck=True)
+            if cached_paths:
+                return cached_paths
+
+            # 相同请求正在生成时等待其结果，避免重复调用 API
+            filepaths = await self._inflight.do(
+                cache_key,
+                lambda: self._generate_and_store(
+                    cache_key, prompt, ratio, quality, n
+                ),
             )
+            self.metrics.inc("t2img_requests_total", outcome="ok")
+            return filepaths
+        except Exception as e:
+            self.metrics.inc("t2img_requests_total", outcome="error")
+            raise Exception(f"生成图片失败: {str(e)}") from e
 
-            # 保存到本地
-            filepath = self._get_save_path(extension)
-            async with aiofiles.open(filepath, "wb") as f:
-                await f.write(image_data)
+    def _submit_generation(
+        self,
+        event: AstrMessageEvent,
+        prompt: str,
+        ratio: str,
+        quality: str,
+        n: int = 1,
+        fuzzy: bool = False,
+    ) -> tuple[int, asyncio.Future]:
+        """将生图任务提交到公平队列，返回 (排队位置, 生成结果 Future)
+
+        结果在 file 模式下为文件路径列表，direct 模式下为 ImageResult 列表，
+        由 _image_components 转换为消息组件。file 模式下先查询结果缓存，
+        命中时不进入队列，直接返回已完成的 Future（排队位置为 0）；
+        相同请求正在生成时同样不进入队列，直接等待其结果，不占用队列的并发名额。
+
+        Raises:
+            QueueFullError: 用户任务过多或队列已满
+        """
+        submitted_at = self._last_request_at = time.monotonic()
+        # 任务在队列的工作任务中执行，需显式传递追踪记录
+        trace = current_trace.get()
+
+        def record_bytes(size: int) -> None:
+            if trace is not None:
+                trace.attrs["bytes"] = trace.attrs.get("bytes", 0) + size
+
+        def result_size(results: list) -> int:
+            if self.delivery_mode == DELIVERY_DIRECT:
+                return sum(len(result.data or b"") for result in results)
+            if self._image_store is None:
+                return 0
+            return sum(self._image_store.size(path) or 0 for path in results)
+
+        cache_key = self._request_key(prompt, ratio, quality, n)
+        if self.delivery_mode != DELIVERY_DIRECT:
+            if self.popularity is not None:
+                self.popularity.record(cache_key, (prompt, ratio, quality, n))
+            # 缓存命中（含预热的结果）不必排在生成任务之后
+            cached_paths = self._cached_images(cache_key, fuzzy)
+            if cached_paths:
+                record_bytes(result_size(cached_paths))
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(cached_paths)
+                return 0, future
+
+        # 相同请求正在排队或生成时直接等待其结果，跟随者不占用队列的工作名额
+        shared = self._inflight.join(cache_key)
+        queued = self._queued_requests.get(cache_key)
+        if shared is None and queued is not None:
+            self._inflight.shared += 1
+            shared = asyncio.shield(queued)
+        if shared is not None:
+
+            async def follow() -> list:
+                request_labels.set({"quality": quality})
+                try:
+                    results = await shared
+                except asyncio.CancelledError:
+                    if queued is None or not queued.cancelled():
+                        raise
+                    # 先提交的请求被取消（如用户的处理被中断），不影响跟随者
+                    raise Exception("生成图片失败: 相同的生成任务已被取消") from None
+                except Exception as e:
+                    self.metrics.inc("t2img_requests_total", outcome="error")
+                    raise Exception(f"生成图片失败: {str(e)}") from e
+                self.metrics.inc("t2img_requests_total", outcome="ok")
+                record_bytes(result_size(results))
+                return results
+
+            return 0, asyncio.ensure_future(follow())
+
+        async def run() -> list:
+            current_trace.set(trace)
+            started_at = time.monotonic()
+            self.metrics.observe_phase(
+                "queue_wait", started_at - submitted_at, quality=quality
+            )
+            try:
+                if self.delivery_mode == DELIVERY_DIRECT:
+                    results = await self._generate_direct(prompt, ratio, quality, n)
+                else:
+                    results = await self._generate_images(
+                        prompt, ratio, quality, n, fuzzy
+                    )
+                record_bytes(result_size(results))
+                return results
+            finally:
+                if self.quality_governor is not None:
+                    self.quality_governor.observe_latency(
+                        time.monotonic() - started_at
+                    )
+
+        position, future = self.job_queue.submit(
+            event.get_sender_id(), event.get_group_id() or "", run
+        )
+        self._queued_requests[cache_key] = future
+
+        def unregister(done: asyncio.Future) -> None:
+            if self._queued_requests.get(cache_key) is done:
+                del self._queued_requests[cache_key]
+
+        future.add_done_callback(unregister)
+        return position, future
+
+    async def _postprocess_images(
+        self, paths: list[str], platform: str, quality: str
+    ) -> list[str]:
+        """发送前在进程池中处理图片，返回实际发送的文件路径"""
+        if self.postprocessor is None:
+            return paths
+        with PhaseTimer(self.metrics, "postprocess", quality=quality):
+            outputs = await asyncio.gather(
+                *(self.postprocessor.process(path, platform) for path in paths)
+            )
+        store = await self._get_image_store()
+        for output, size in outputs:
+            if size:
+                store.add(output, size)
+            else:
+                store.touch(output)
+        self._evict_images(store)
+        return [output for output, _ in outputs]
+
+    async def _image_components(
+        self, results: list, platform: str, quality: str
+    ) -> list[Image]:
+        """将生成结果转换为图片消息组件"""
+        if self.delivery_mode == DELIVERY_DIRECT:
+            # URL 交给平台适配器自行拉取，内联数据直接以字节发送
+            return [
+                Image.fromBytes(result.data)
+                if result.data is not None
+                else Image.fromURL(result.url)
+                for result in results
+            ]
+        paths = await self._postprocess_images(results, platform, quality)
+        return [Image.fromFileSystem(path) for path in paths]
+
+    def _clamp_count(self, n: int) -> int:
+        """将图片数量限制在 1 到 max_images_per_request 之间"""
+        return max(1, min(n, self.max_images_per_request))
+
+    def _govern_quality(self, quality: str) -> tuple[str, Optional[str]]:
+        """按当前负载决定实际质量，返回 (质量, 降级提示)"""
+        if self.quality_governor is None:
+            return quality, None
+        effective = self.quality_governor.apply(quality, self.job_queue.pending)
+        if effective == quality:
+            return quality, None
+        logger.info(
+            f"负载较高，质量 {quality} 降级为 {effective} "
+            f"({self.quality_governor.stats()})"
+        )
+        return effective, (
+            f"当前生图负载较高，本次质量已从 {quality} 临时调整为 {effective}，"
+            "负载回落后自动恢复。"
+        )
 
-            # 每 N 次生成执行一次清理
-            self._generation_count += 1
-            if self._generation_count >= CLEANUP_INTERVAL:
-                self._generation_count = 0
-                task = asyncio.create_task(self._cleanup_old_images())
-                self._background_tasks.add(task)
-                task.add_done_callback(self._background_tasks.discard)
+    def _pending_notice(
+        self, position: int, downgrade: Optional[str]
+    ) -> Optional[str]:
+        """生成开始前发给用户的提示（降级和排队），没有时返回 None"""
+        notices = [downgrade] if downgrade else []
+        if position > 0:
+            notices.append(self._queue_message(position))
+        return "\n".join(notices) or None
 
-            return filepath
-        except Exception as e:
-            raise Exception(f"生成图片失败: {str(e)}") from e
+    @staticmethod
+    def _queue_message(position: int) -> str:
+        """排队提示"""
+        return f"已加入生图队列，当前排在第 {position} 位，请稍候..."
+
+    def _parse_batch(
+        self, content: str, default_quality: str = "s"
+    ) -> tuple[list[ParsedPrompt], Optional[str]]:
+        """按行解析批量提示词，返回 (参数列表, 降级提示)
+
+        每行的 [比例] [质量] [xN] 与 /t2img 使用相同的解析规则。
+        """
+        ratios = self.provider.get_supported_ratios()
+        items: list[ParsedPrompt] = []
+        downgrade = None
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            parsed = parse_prompt_args(line, ratios, default_quality=default_quality)
+            parsed.count = self._clamp_count(parsed.count)
+            parsed.quality, notice = self._govern_quality(parsed.quality)
+            downgrade = downgrade or notice
+            items.append(parsed)
+        return items, downgrade
+
+    @staticmethod
+    def _trace_batch_items(trace: Trace, items: list[ParsedPrompt]) -> None:
+        """将批量任务的各组参数记入追踪"""
+        trace.attrs["items"] = [
+            (item.prompt, item.ratio, item.quality, item.count) for item in items
+        ]
+
+    def _admit_batch(
+        self, event: AstrMessageEvent, count: int
+    ) -> tuple[int, Optional[str]]:
+        """检查批量任务的数量、限流和用户任务数
+
+        Returns:
+            (并发数, 提示语)，不可执行时并发数为 0 并返回提示语
+        """
+        if count == 0:
+            return 0, "请提供提示词，每行一个！"
+        if count > self.batch_max_prompts:
+            return (
+                0,
+                f"一次最多批量生成 {self.batch_max_prompts} 个提示词，当前 {count} 个。",
+            )
+        # 整个批量任务只消耗一次限流额度
+        with span("rate_limit"):
+            rejection = self._check_rate_limit(event)
+        if rejection:
+            return 0, rejection
+        workers = self._batch_workers(event, count)
+        if workers <= 0:
+            user_jobs = self.job_queue.user_jobs(event.get_sender_id())
+            return 0, f"您已有 {user_jobs} 个生图任务在进行，请稍候..."
+        return workers, None
+
+    def _batch_workers(self, event: AstrMessageEvent, count: int) -> int:
+        """批量任务的并发数，不超过用户在队列中剩余的任务名额"""
+        workers = min(self.batch_concurrency, count)
+        if self.job_queue.max_per_user > 0:
+            workers = min(
+                workers,
+                self.job_queue.max_per_user
+                - self.job_queue.user_jobs(event.get_sender_id()),
+            )
+        return workers
+
+    async def _run_batch(
+        self,
+        event: AstrMessageEvent,
+        items: list[ParsedPrompt],
+        workers: int,
+        fuzzy: bool = False,
+    ) -> AsyncIterator[tuple[int, ParsedPrompt, Union[list[Image], Exception]]]:
+        """以有限并发执行批量任务，按完成顺序产出 (序号, 参数, 图片组件或异常)
+
+        每个并发槽依次将下一个提示词提交到公平队列，批量任务不会占满队列。
+        并发数由 _admit_batch 在接受任务时确定，之后用户名额变化时
+        超出的提示词由队列以 QueueFullError 逐个拒绝。
+        """
+        finished: asyncio.Queue = asyncio.Queue()
+        remaining = iter(enumerate(items, 1))
+        platform = event.get_platform_name()
+
+        async def worker() -> None:
+            for index, item in remaining:
+                try:
+                    _, future = self._submit_generation(
+                        event, item.prompt, item.ratio, item.quality, item.count, fuzzy
+                    )
+                    components = await self._image_components(
+                        await future, platform, item.quality
+                    )
+                    await finished.put((index, item, components))
+                except Exception as e:
+                    await finished.put((index, item, e))
+
+        tasks = [asyncio.create_task(worker()) for _ in range(max(1, workers))]
+        try:
+            for _ in items:
+                yield await finished.get()
+        finally:
+            for task in tasks:
+                task.cancel()
 
     @filter.llm_tool(name="draw_image")  # type: ignore
-    async def draw(self, event: AstrMessageEvent, prompt: str):
+    async def draw(self, event: AstrMessageEvent, prompt: str, n: int = 1):
         """根据提示词生成图片。
 
         Args:
             prompt(string): 图片提示词，需要包含主体、场景、风格等描述
+            n(number): 生成图片数量，默认 1 张
         """
-        user_id = event.get_sender_id()
-        request_id = user_id
-
-        # 防抖检查
-        if self._check_debounce(request_id):
-            return "操作太快了，请稍后再试。"
-
-        if request_id in self.processing_users:
-            return "您有正在进行的生图任务，请稍候..."
+        trace = self._start_trace(event, "draw_image")
+        try:
+            # LLM 可能传入非数字或空值，按 1 张处理
+            count = self._clamp_count(int(n))
+        except (TypeError, ValueError):
+            count = 1
+        trace.attrs.update(prompt=prompt, ratio=self.ratio, quality="m", count=count)
+
+        # 限流检查
+        with span("rate_limit"):
+            rejection = self._check_rate_limit(event)
+        if rejection:
+            self._finish_trace(trace, "rate_limited")
+            return rejection
+
+        quality, downgrade = self._govern_quality("m")
+        if downgrade:
+            trace.attrs["downgraded_to"] = quality
+        try:
+            # LLM 改写的提示词很少逐字重复，允许复用相似提示词的结果
+            position, future = self._submit_generation(
+                event, prompt, self.ratio, quality, count, fuzzy=True
+            )
+        except QueueFullError as e:
+            self._finish_trace(trace, "rejected")
+            return str(e)
 
-        self.processing_users.add(request_id)
+        outcome = "error"
         try:
-            image_path = await self._generate_image(prompt, self.ratio, "m")
-            await event.send(event.chain_result([Image.fromFileSystem(image_path)]))  # type: ignore
+            notice = self._pending_notice(position, downgrade)
+            if notice:
+                await event.send(event.plain_result(notice))
+            components = await self._image_components(
+                await future, event.get_platform_name(), quality
+            )
+            with PhaseTimer(self.metrics, "send", quality=quality):
+                await event.send(event.chain_result(components))  # type: ignore
+            outcome = "ok"
             return f"图片已生成并发送。Prompt: {prompt}"
 
         except Exception as e:
-            logger.error(f"生图失败: {e}")
+            logger.error(f"[{trace.trace_id}] 生图失败: {e}")
             return f"生成图片时遇到问题: {str(e)}"
         finally:
-            self.processing_users.discard(request_id)
+            self._finish_trace(trace, outcome)
+
+    @filter.llm_tool(name="draw_image_batch")  # type: ignore
+    async def draw_batch(self, event: AstrMessageEvent, prompts: str):
+        """根据多个提示词批量生成图片（如分镜、表情包套图），每生成完一组立即发送。
+
+        Args:
+            prompts(string): 多个图片提示词，每行一个，需要包含主体、场景、风格等描述；行末可附加比例（如 16:9）和质量（s/m/h）
+        """
+        trace = self._start_trace(event, "draw_image_batch")
+        items, downgrade = self._parse_batch(prompts, default_quality="m")
+        self._trace_batch_items(trace, items)
+        workers, rejection = self._admit_batch(event, len(items))
+        if rejection:
+            self._finish_trace(trace, "rejected")
+            return rejection
+
+        total = len(items)
+        trace.attrs.update(prompts=total)
+        failures: list[str] = []
+        outcome = "error"
+        try:
+            if downgrade:
+                await event.send(event.plain_result(downgrade))
+            async for index, item, result in self._run_batch(
+                event, items, workers, fuzzy=True
+            ):
+                if isinstance(result, Exception):
+                    logger.error(f"[{trace.trace_id}] 批量生图失败: {result}")
+                    failures.append(f"{item.prompt}: {result}")
+                    continue
+                with PhaseTimer(self.metrics, "send", quality=item.quality):
+                    await event.send(
+                        event.chain_result(
+                            [Plain(f"[{index}/{total}] {item.prompt}"), *result]
+                        )  # type: ignore
+                    )
+            outcome = "ok" if not failures else "partial"
+        finally:
+            self._finish_trace(trace, outcome)
+
+        summary = f"已批量生成并发送 {total - len(failures)}/{total} 组图片。"
+        if failures:
+            summary += " 以下提示词生成失败: " + "; ".join(failures)
+        return summary
 
     @filter.command("t2img")
     async def generate_image_command(self, event: AstrMessageEvent):
         """生成图片指令
 
-        用法: /t2img <提示词> [比例] [质量]
-        示例: /t2img 一个女孩 9:16 h
+        用法: /t2img <提示词> [比例] [质量] [xN]
+        示例: /t2img 一个女孩 9:16 h x4
         支持比例: 1:1, 4:3, 3:4, 3:2, 2:3, 16:9, 9:16
         质量参数: s (低质量), m (中等), h (高质量)
+        数量参数: xN 一次生成 N 张图片
         """
         message_str = event.message_str  # 获取消息的纯文本内容
 
@@ -265,71 +1312,183 @@ class MultiPlatformText2Image(Star):
             content = content[5:].strip()  # 移除 "t2img "
 
         if not content:
-            yield event.plain_result("请提供提示词！使用方法：/t2img <提示词> [比例] [质量]")
+            yield event.plain_result("请提供提示词！使用方法：/t2img <提示词> [比例] [质量] [xN]")
             return
         
         logger.debug(f"收到 /t2img 命令，内容: {content}")
+        trace = self._start_trace(event, "t2img")
 
         # 解析参数：从右向左提取可选参数
-        parts = content.split()
-        prompt = content
-        ratio = "1:1"
-        quality = "s"
-
-        logger.debug(f"解析参数，初始 parts: {parts}")
-
-        # 支持的比例和质量选项
-        supported_ratios = self.provider.get_supported_ratios()
-        valid_qualities = {"s", "m", "h"}
-
-        # 尝试提取最后一个参数作为 quality
-        if len(parts) > 1 and parts[-1] in valid_qualities:
-            quality = parts[-1]
-            parts = parts[:-1]
-            prompt = " ".join(parts)
-            logger.debug(f"提取质量参数: {quality}, 剩余 parts: {parts}, prompt: {prompt}")
-
-        # 尝试提取最后一个参数作为 ratio
-        if len(parts) > 1 and parts[-1] in supported_ratios:
-            ratio = parts[-1]
-            parts = parts[:-1]
-            prompt = " ".join(parts)
-            logger.debug(f"提取比例参数: {ratio}, 剩余 parts: {parts}, prompt: {prompt}")
+        with span("parse"):
+            parsed = parse_prompt_args(content, self.provider.get_supported_ratios())
+        prompt, ratio, quality = parsed.prompt, parsed.ratio, parsed.quality
+        count = self._clamp_count(parsed.count)
+        logger.debug(f"解析参数: {parsed}")
 
         # 如果 prompt 为空
         if not prompt.strip():
-            yield event.plain_result("请提供提示词！使用方法：/t2img <提示词> [比例] [质量]")
+            yield event.plain_result("请提供提示词！使用方法：/t2img <提示词> [比例] [质量] [xN]")
             return
 
         user_id = event.get_sender_id()
-        request_id = user_id
-
-        # 防抖检查（统一机制）
-        if self._check_debounce(request_id):
-            yield event.plain_result("操作太快了，请稍后再试。")
-            return
-
-        if request_id in self.processing_users:
-            yield event.plain_result("您有正在进行的生图任务，请稍候...")
+        trace.attrs.update(prompt=prompt, ratio=ratio, quality=quality, count=count)
+
+        # 限流检查（统一机制）
+        with span("rate_limit"):
+            rejection = self._check_rate_limit(event)
+        if rejection:
+            self._finish_trace(trace, "rate_limited")
+            yield event.plain_result(rejection)
             return
 
-        self.processing_users.add(request_id)
+        quality, downgrade = self._govern_quality(quality)
+        if downgrade:
+            trace.attrs["downgraded_to"] = quality
+        logger.info(
+            f"[{trace.trace_id}] 用户 {user_id} 请求生成图片，Prompt: {prompt}, "
+            f"比例: {ratio}, 质量: {quality}, 数量: {count}"
+        )
 
-        logger.debug(f"用户 {user_id} 请求生成图片，Prompt: {prompt}, 比例: {ratio}, 质量: {quality}")
+        try:
+            position, future = self._submit_generation(
+                event, prompt, ratio, quality, count
+            )
+        except QueueFullError as e:
+            self._finish_trace(trace, "rejected")
+            yield event.plain_result(str(e))
+            return
 
+        outcome = "error"
         try:
-            logger.info(
-                f"用户 {user_id} 请求生成图片，Prompt: {prompt}, 比例: {ratio}, 质量: {quality}"
+            notice = self._pending_notice(position, downgrade)
+            if notice:
+                yield event.plain_result(notice)
+            components = await self._image_components(
+                await future, event.get_platform_name(), quality
             )
-            image_path = await self._generate_image(prompt, ratio, quality)
-            yield event.chain_result([Image.fromFileSystem(image_path)])  # type: ignore
+            # 生成器在框架发送完消息后才会恢复，以此计量发送耗时
+            with PhaseTimer(self.metrics, "send", quality=quality):
+                yield event.chain_result(components)  # type: ignore
+            outcome = "ok"
 
         except Exception as e:
-            logger.error(f"生图失败: {e}")
+            logger.error(f"[{trace.trace_id}] 生图失败: {e}")
             yield event.plain_result(f"生成图片失败: {str(e)}")
         finally:
-            self.processing_users.discard(request_id)
+            self._finish_trace(trace, outcome)
+
+    @filter.command("t2img_batch")
+    async def batch_command(self, event: AstrMessageEvent):
+        """批量生成图片指令
+
+        用法: /t2img_batch 后每行一个提示词，每行可带 [比例] [质量] [xN]
+        示例:
+        /t2img_batch
+        一只猫在睡觉 1:1 h
+        一只狗在奔跑 16:9
+        每组图片生成后立即发送，不按提交顺序。
+        """
+        content = event.message_str.strip()
+        if content.startswith("t2img_batch"):
+            content = content[len("t2img_batch") :]
+
+        trace = self._start_trace(event, "t2img_batch")
+        with span("parse"):
+            items, downgrade = self._parse_batch(content)
+        self._trace_batch_items(trace, items)
+        workers, rejection = self._admit_batch(event, len(items))
+        if rejection:
+            self._finish_trace(trace, "rejected")
+            yield event.plain_result(rejection)
+            return
+
+        total = len(items)
+        trace.attrs.update(prompts=total)
+        logger.info(
+            f"[{trace.trace_id}] 用户 {event.get_sender_id()} 请求批量生成 {total} 组图片"
+        )
+        notices = [downgrade] if downgrade else []
+        notices.append(f"开始批量生成 {total} 组图片，每完成一组立即发送...")
+        yield event.plain_result("\n".join(notices))
+
+        failed = 0
+        outcome = "error"
+        try:
+            async for index, item, result in self._run_batch(event, items, workers):
+                if isinstance(result, Exception):
+                    failed += 1
+                    logger.error(f"[{trace.trace_id}] 批量生图失败: {result}")
+                    yield event.plain_result(
+                        f"[{index}/{total}] {item.prompt} 生成失败: {result}"
+                    )
+                    continue
+                with PhaseTimer(self.metrics, "send", quality=item.quality):
+                    yield event.chain_result(
+                        [Plain(f"[{index}/{total}] {item.prompt}"), *result]
+                    )  # type: ignore
+            outcome = "ok" if failed == 0 else "partial"
+        finally:
+            self._finish_trace(trace, outcome)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("t2img_stats")
+    async def stats_command(self, event: AstrMessageEvent):
+        """查看生图延迟、吞吐和缓存统计（管理员）"""
+        lines = ["[文生图统计]", self.metrics.render_summary()]
+        lines.append(
+            f"队列: 执行中 {self.job_queue.running}, 排队 {self.job_queue.pending}, "
+            f"丢弃 {self.job_queue.dropped}, 拒绝 {self.job_queue.rejected}"
+        )
+        lines.append(
+            f"请求合并: 进行中 {len(self._inflight)}, 已合并 {self._inflight.shared}"
+        )
+        lines.append(f"限流: {self.rate_limiter.stats()}")
+        if self.quality_governor is not None:
+            lines.append(f"质量降级: {self.quality_governor.stats()}")
+        if self.result_cache is not None:
+            lines.append(f"结果缓存: {self.result_cache.stats()}")
+        if self.cache_warmer is not None:
+            lines.append(f"缓存预热: {self.cache_warmer.stats()}")
+        if self._image_store is not None:
+            lines.append(f"图片存储: {self._image_store.stats()}")
+        if self.postprocessor is not None:
+            lines.append(f"图片后处理: {self.postprocessor.stats()}")
+        if self.slow_log is not None:
+            lines.append(f"慢请求日志: {self.slow_log.stats()}")
+        if self.traffic_recorder is not None:
+            lines.append(f"流量记录: {self.traffic_recorder.stats()}")
+        lines.append(f"Provider 池: {self.provider_pool.stats()}")
+        for member in self.provider_pool.members:
+            if member.breaker is not None:
+                lines.append(f"熔断 {member.name}: {member.breaker.snapshot()}")
+            for key_state in member.provider.key_scheduler.snapshot():
+                latency = key_state["latency_ewma"]
+                lines.append(
+                    f"Key {member.name} {key_state['key']}: "
+                    f"进行中 {key_state['in_flight']}, "
+                    f"延迟 {f'{latency:.2f}s' if latency is not None else '-'}, "
+                    f"冷却 {key_state['cooldown']:.0f}s"
+                    f"{', 已禁用' if key_state['disabled'] else ''}"
+                )
+        yield event.plain_result("\n".join(lines))
 
     async def close(self) -> None:
         """清理资源"""
-        await self.provider.close()
+        # 插件卸载或重载时停止所有后台任务（含指标快照循环），再关闭连接和日志文件
+        tasks = list(self._background_tasks)
+        if self._warm_task is not None:
+            tasks.append(self._warm_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.job_queue.close()
+        # 合并中的生成任务不属于队列，需单独取消，避免卸载后仍在下载写盘
+        await self._inflight.close()
+        await self.provider_pool.close()
+        await self.transport.close()
+        if self.postprocessor is not None:
+            self.postprocessor.close()
+        if self.slow_log is not None:
+            self.slow_log.close()
+        if self.traffic_recorder is not None:
+            self.traffic_recorder.close()
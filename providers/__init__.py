@@ -1,8 +1,60 @@
-"""文生图服务提供商模块"""
+"""文生图服务提供商模块
 
-from .base import BaseProvider
-from .gitee import GiteeProvider
-from .aliyun import AliyunProvider
-from .volcengine import VolcengineProvider
+各 provider 类通过 PROVIDER_REGISTRY 延迟导入，访问 GiteeProvider 等名称时才加载对应模块。
+"""
 
-__all__ = ["BaseProvider", "GiteeProvider", "AliyunProvider", "VolcengineProvider"]
+from .base import BaseProvider, ImageResult
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .errors import (
+    AuthError,
+    DeadlineExceededError,
+    DownloadError,
+    InvalidPromptError,
+    ProviderError,
+    RateLimitedError,
+    RetryableError,
+    TaskFailedError,
+)
+from .key_scheduler import KeyScheduler
+from .pool import PoolMember, ProviderPool
+from .retry import Deadline, RetryPolicy
+from .task_poller import TaskPoller
+from .transport import HttpTransport
+from .registry import PROVIDER_MODULES, PROVIDER_REGISTRY, ProviderRegistry
+
+__all__ = [
+    "BaseProvider",
+    "ImageResult",
+    "HttpTransport",
+    "KeyScheduler",
+    "PoolMember",
+    "ProviderPool",
+    "ProviderError",
+    "RetryableError",
+    "RateLimitedError",
+    "DownloadError",
+    "AuthError",
+    "InvalidPromptError",
+    "DeadlineExceededError",
+    "TaskFailedError",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "Deadline",
+    "RetryPolicy",
+    "TaskPoller",
+    "PROVIDER_MODULES",
+    "PROVIDER_REGISTRY",
+    "ProviderRegistry",
+    "GiteeProvider",
+    "AliyunProvider",
+    "VolcengineProvider",
+]
+
+
+def __getattr__(name: str):
+    """延迟导入 provider 类（PEP 562）"""
+    try:
+        provider_name = PROVIDER_REGISTRY.class_name_to_provider(name)
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return PROVIDER_REGISTRY[provider_name]
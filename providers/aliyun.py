@@ -1,15 +1,66 @@
 """阿里云百炼文生图服务提供商"""
 
-from .base import BaseProvider
+from typing import Optional
+
+from .base import BaseProvider, ImageResult
+from .errors import (
+    InvalidPromptError,
+    ProviderError,
+    RateLimitedError,
+    RetryableError,
+    TaskFailedError,
+)
 from .resolutions import get_aliyun_resolutions
+from .task_poller import TaskPoller
+
+# 异步任务接口路径，相对于 API 根地址 (.../api/v1)
+ASYNC_SUBMIT_PATH = "/services/aigc/text2image/image-synthesis"
+TASKS_PATH = "/tasks"
+
+# 任务状态
+TASK_SUCCEEDED = "SUCCEEDED"
+TASK_RUNNING_STATES = ("PENDING", "RUNNING")
 
 
 class AliyunProvider(BaseProvider):
     """阿里云百炼文生图服务提供商"""
 
-    async def generate_image(self, prompt: str, size: str = "") -> tuple[bytes, str]:
-        """生成图片"""
-        api_key = self.get_next_api_key()
+    def __init__(
+        self,
+        api_keys: list[str],
+        base_url: str,
+        model: str,
+        negative_prompt: str = "",
+        **kwargs,
+    ):
+        """额外参数:
+        async_mode: 使用异步任务接口提交任务并由后台轮询结果，不为整个生成过程占用连接
+        """
+        super().__init__(api_keys, base_url, model, negative_prompt, **kwargs)
+        self.async_mode = bool(kwargs.get("async_mode", False))
+        self._task_poller: Optional[TaskPoller] = None
+
+    @property
+    def api_root(self) -> str:
+        """API 根地址，如 https://dashscope.aliyuncs.com/api/v1"""
+        return self.base_url.split("/services/", 1)[0]
+
+    @property
+    def task_poller(self) -> TaskPoller:
+        if self._task_poller is None:
+            self._task_poller = TaskPoller(self._fetch_task)
+        return self._task_poller
+
+    def get_max_images_per_call(self) -> int:
+        """wan 系列支持单次生成 1~4 张，其他模型只支持 1 张"""
+        return 4 if "wan" in self.model.lower() else 1
+
+    async def _request_images(
+        self, prompt: str, size: str = "", n: int = 1
+    ) -> list[ImageResult]:
+        """调用 API 生成图片"""
+        if self.async_mode:
+            return await self._request_images_async(prompt, size, n)
 
         # 构建请求体
         payload = {
@@ -23,38 +74,96 @@ class AliyunProvider(BaseProvider):
         if size:
             payload["parameters"]["size"] = size
         if "wan" in self.model.lower():
-            payload["parameters"]["n"] = 1  # wan系列默认n=4，改为1以节省资源
-
-        session = await self.get_http_session()
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
+            # wan系列默认n=4，按实际需要的数量生成以节省资源
+            payload["parameters"]["n"] = n
 
         url = f"{self.base_url}/generation"
 
+        async with self.api_key_lease() as api_key:
+            result = await self._post_json(url, payload, api_key)
+
+        # 解析响应，收集所有 choice 中的图片
         try:
-            async with session.post(url, json=payload, headers=headers) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    raise Exception(f"API调用失败 (HTTP {resp.status}): {error_text}")
+            return [
+                ImageResult(extension=".png", url=item["image"])
+                for choice in result["output"]["choices"]
+                for item in choice["message"]["content"]
+                if item.get("image")
+            ]
+        except (KeyError, TypeError) as e:
+            raise ProviderError(f"解析阿里百炼API响应失败: {str(e)}") from e
 
-                result = await resp.json()
-        except Exception as e:
-            raise Exception(f"阿里百炼API调用失败: {str(e)}")
+    async def _request_images_async(
+        self, prompt: str, size: str, n: int
+    ) -> list[ImageResult]:
+        """提交异步任务并等待轮询器返回结果
 
-        # 解析响应，下载图片
-        try:
-            image_url = result["output"]["choices"][0]["message"]["content"][0]["image"]
-            async with session.get(image_url) as resp:
-                if resp.status != 200:
-                    raise Exception(f"下载图片失败: HTTP {resp.status}")
-                data = await resp.read()
-            return data, ".png"
-        except (KeyError, IndexError) as e:
-            raise Exception(f"解析阿里百炼API响应失败: {str(e)}") from e
-        except Exception as e:
-            raise Exception(f"阿里百炼API调用失败: {str(e)}") from e
+        Key 在任务完成前保持占用，使 Key 的并发和延迟统计与同步模式一致，
+        但等待期间不占用 HTTP 连接。
+        """
+        payload = {
+            "model": self.model,
+            "input": {"prompt": prompt},
+            "parameters": {"n": n},
+        }
+        if self.negative_prompt:
+            payload["input"]["negative_prompt"] = self.negative_prompt
+        if size:
+            payload["parameters"]["size"] = size
+
+        async with self.api_key_lease() as api_key:
+            result = await self._post_json(
+                f"{self.api_root}{ASYNC_SUBMIT_PATH}",
+                payload,
+                api_key,
+                extra_headers={"X-DashScope-Async": "enable"},
+            )
+            try:
+                task_id = result["output"]["task_id"]
+            except (KeyError, TypeError) as e:
+                raise ProviderError(f"解析阿里百炼任务提交响应失败: {str(e)}") from e
+            return await self.task_poller.wait(task_id, api_key)
+
+    async def _fetch_task(
+        self, task_id: str, api_key: str
+    ) -> Optional[list[ImageResult]]:
+        """查询任务状态，进行中返回 None，成功返回图片，任务失败抛出 TaskFailedError"""
+        result = await self._get_json(f"{self.api_root}{TASKS_PATH}/{task_id}", api_key)
+        output = result.get("output") or {}
+        status = output.get("task_status")
+        if status in TASK_RUNNING_STATES:
+            return None
+        if status == TASK_SUCCEEDED:
+            return [
+                ImageResult(extension=".png", url=item["url"])
+                for item in output.get("results", [])
+                if item.get("url")
+            ]
+        # FAILED、CANCELED、UNKNOWN 等终止状态
+        raise TaskFailedError(self._task_error(task_id, status, output))
+
+    @staticmethod
+    def _task_error(task_id: str, status: str, output: dict) -> ProviderError:
+        """按任务失败原因构造异常"""
+        code = str(output.get("code", ""))
+        message = (
+            f"阿里百炼任务 {task_id} 失败 ({status}): "
+            f"{code} {output.get('message', '')}".rstrip()
+        )
+        if code.startswith("Throttling"):
+            return RateLimitedError(message)
+        if code in ("DataInspectionFailed", "InvalidParameter"):
+            return InvalidPromptError(message)
+        if code.startswith("InternalError"):
+            return RetryableError(message)
+        return ProviderError(message)
+
+    async def close(self):
+        """停止任务轮询并关闭连接"""
+        if self._task_poller is not None:
+            await self._task_poller.close()
+            self._task_poller = None
+        await super().close()
 
     @staticmethod
     def get_default_base_url() -> str:
@@ -1,9 +1,45 @@
 """文生图服务提供商基类"""
 
+import asyncio
+import hashlib
+import os
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+
+import aiofiles
 import aiohttp
 
+from .decoding import DEFAULT_OFFLOAD_BYTES, loads_json
+from .errors import (
+    DownloadError,
+    ProviderError,
+    RateLimitedError,
+    RetryableError,
+    error_for_status,
+    parse_retry_after,
+)
+from .key_scheduler import KeyScheduler
+from .retry import Deadline, RetryPolicy, call_with_retry
+from .transport import HttpTransport
+
+# 阶段耗时回调: (阶段名, 秒数, 标签)
+PhaseObserver = Callable[[str, float, dict[str, str]], None]
+
+# 流式下载每次读取的块大小
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class ImageResult:
+    """provider 返回的单张图片，url 和 data 二选一"""
+
+    extension: str
+    url: Optional[str] = None
+    data: Optional[bytes] = None
+
 
 class BaseProvider(ABC):
     """文生图服务提供商基类"""
@@ -24,46 +60,414 @@ class BaseProvider(ABC):
             model: 模型名称
             negative_prompt: 负面提示词
             **kwargs: 其他平台特定参数
+                key_max_concurrency: 单个 Key 的最大并发数，0 表示不限
+                key_cooldown_seconds: Key 被限流后的冷却时间
+                transport: 共享的 HttpTransport，未提供时创建独占的实例
+                generation_retry: 生成调用的 RetryPolicy
+                download_retry: 图片下载的 RetryPolicy
+                phase_observer: 阶段耗时回调 (阶段名, 秒数, 标签)
+                decode_offload_bytes: 响应体或 Base64 数据达到该字节数时在线程池中解码，0 表示不使用线程池
         """
         self.api_keys = api_keys
         self.base_url = base_url
         self.model = model
         self.negative_prompt = negative_prompt
-        self.current_key_index = 0
-        self._http_session: Optional[aiohttp.ClientSession] = None
+        self.key_scheduler = KeyScheduler(
+            api_keys,
+            max_concurrency=int(kwargs.get("key_max_concurrency", 0)),
+            cooldown_seconds=float(kwargs.get("key_cooldown_seconds", 30.0)),
+        )
+        self._owns_transport = kwargs.get("transport") is None
+        self.transport: HttpTransport = kwargs.get("transport") or HttpTransport()
+        self.generation_retry: RetryPolicy = kwargs.get(
+            "generation_retry"
+        ) or RetryPolicy(max_attempts=3)
+        self.download_retry: RetryPolicy = kwargs.get("download_retry") or RetryPolicy(
+            max_attempts=4, base_delay=0.5
+        )
+        self.phase_observer: Optional[PhaseObserver] = kwargs.get("phase_observer")
+        self.decode_offload_bytes = int(
+            kwargs.get("decode_offload_bytes", DEFAULT_OFFLOAD_BYTES)
+        )
+        self.name = type(self).__name__.removesuffix("Provider").lower()
+
+    def _observe(self, phase: str, seconds: float, outcome: str, **labels: str) -> None:
+        """上报阶段耗时"""
+        if self.phase_observer is not None:
+            self.phase_observer(
+                phase,
+                seconds,
+                {
+                    "provider": self.name,
+                    "model": self.model,
+                    "outcome": outcome,
+                    **labels,
+                },
+            )
 
     def get_next_api_key(self) -> str:
-        """轮询获取下一个 API Key"""
-        if not self.api_keys:
-            raise ValueError("请先配置 API Key")
+        """获取当前最健康的 API Key（不计入进行中请求）"""
+        return self.key_scheduler.pick_key()
 
-        api_key = self.api_keys[self.current_key_index]
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        return api_key
+    @asynccontextmanager
+    async def api_key_lease(self) -> AsyncIterator[str]:
+        """占用一个 API Key 完成一次调用，结束后按结果更新 Key 的健康状态"""
+        wait_start = time.monotonic()
+        api_key = await self.key_scheduler.acquire()
+        start = time.monotonic()
+        self._observe("key_wait", start - wait_start, "ok", key=hash_key(api_key))
+        try:
+            yield api_key
+        except BaseException as e:
+            self.key_scheduler.release(api_key, error=e)
+            self._observe(
+                "api", time.monotonic() - start, "error", key=hash_key(api_key)
+            )
+            raise
+        latency = time.monotonic() - start
+        self.key_scheduler.release(api_key, latency=latency)
+        self._observe("api", latency, "ok", key=hash_key(api_key))
 
     async def get_http_session(self) -> aiohttp.ClientSession:
-        """获取复用的 HTTP Session"""
-        if self._http_session is None or self._http_session.closed:
-            self._http_session = aiohttp.ClientSession()
-        return self._http_session
+        """获取共享连接池的 HTTP Session"""
+        return await self.transport.get_session()
+
+    async def warmup(self) -> None:
+        """预热到 API 主机的连接"""
+        await self.transport.warmup([self.base_url])
+
+    @staticmethod
+    async def _check_response(resp: aiohttp.ClientResponse) -> None:
+        """检查 API 响应状态，非 200 时按状态码抛出对应类型的异常"""
+        if resp.status == 200:
+            return
+        error_text = await resp.text()
+        if resp.status == 429:
+            raise RateLimitedError(
+                f"API 调用次数超限或并发过高 (HTTP 429): {error_text}",
+                retry_after=parse_retry_after(resp.headers.get("Retry-After")),
+            )
+        raise error_for_status(
+            resp.status, f"API调用失败 (HTTP {resp.status}): {error_text}"
+        )
+
+    async def _post_json(
+        self,
+        url: str,
+        payload: dict,
+        api_key: str,
+        extra_headers: Optional[dict[str, str]] = None,
+    ) -> dict:
+        """POST JSON 请求并解析响应，网络错误转换为可重试异常"""
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            **(extra_headers or {}),
+        }
+        return await self._request_json("POST", url, headers, payload)
+
+    async def _get_json(self, url: str, api_key: str) -> dict:
+        """GET 请求并解析 JSON 响应，网络错误转换为可重试异常"""
+        headers = {"Authorization": f"Bearer {api_key}"}
+        return await self._request_json("GET", url, headers)
+
+    async def _request_json(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        payload: Optional[dict] = None,
+    ) -> dict:
+        """发送请求并解析 JSON 响应"""
+        session = await self.get_http_session()
+        try:
+            async with session.request(
+                method, url, json=payload, headers=headers
+            ) as resp:
+                await self._check_response(resp)
+                # 响应体异步读取，较大时在线程池中解析，避免阻塞事件循环
+                return await loads_json(await resp.read(), self.decode_offload_bytes)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            raise RetryableError(f"网络连接失败: {e!r}") from e
+        except ValueError as e:
+            raise ProviderError(f"解析API响应失败: {e}") from e
+
+    def get_max_images_per_call(self) -> int:
+        """单次 API 调用最多能生成的图片数，不支持批量生成的平台返回 1"""
+        return 1
 
     @abstractmethod
-    async def generate_image(self, prompt: str, size: str = "") -> tuple[bytes, str]:
-        """生成图片
+    async def _request_images(
+        self, prompt: str, size: str = "", n: int = 1
+    ) -> list[ImageResult]:
+        """调用平台 API 生成图片
 
         Args:
             prompt: 提示词
             size: 图片尺寸，为空则使用默认尺寸
+            n: 本次调用生成的图片数，不超过 get_max_images_per_call()
 
         Returns:
-            tuple[bytes, str]: (图片数据, 文件扩展名如 ".jpg")
+            list[ImageResult]: 图片 URL 或 Base64 解码后的数据，数量可能少于 n
         """
         pass
 
+    async def _request_with_retry(
+        self, prompt: str, size: str, n: int, deadline: Optional[Deadline]
+    ) -> list[ImageResult]:
+        """按生成重试策略调用 API"""
+        results = await call_with_retry(
+            lambda: self._request_images(prompt, size, n),
+            self.generation_retry,
+            deadline,
+        )
+        if not results:
+            raise ProviderError("生成图片失败：未返回数据")
+        return results
+
+    async def _request_batches(
+        self,
+        prompt: str,
+        size: str,
+        n: int,
+        per_call: int,
+        deadline: Optional[Deadline],
+    ) -> list[ImageResult]:
+        """按每次 per_call 张拆分 n 张图片并发调用，任一调用失败时取消其余调用"""
+        tasks = [
+            asyncio.ensure_future(
+                self._request_with_retry(prompt, size, min(per_call, n - i), deadline)
+            )
+            for i in range(0, n, per_call)
+        ]
+        try:
+            groups = await asyncio.gather(*tasks)
+        except Exception:
+            # 其余调用的结果已无用，不再为其付费等待
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return [result for group in groups for result in group]
+
+    async def _collect_results(
+        self, prompt: str, size: str, n: int, deadline: Optional[Deadline]
+    ) -> list[ImageResult]:
+        """生成 n 张图片：优先使用平台原生批量生成，超出单次上限的部分并发调用
+
+        平台可能少返回图片（如火山组图模式），缺少的部分按每次一张并发补齐，
+        每轮至少得到一张图片，最多 n 轮。
+        """
+        per_call = max(1, self.get_max_images_per_call())
+        results: list[ImageResult] = []
+        for _ in range(n):
+            missing = n - len(results)
+            if missing <= 0:
+                break
+            results.extend(
+                (
+                    await self._request_batches(
+                        prompt, size, missing, per_call, deadline
+                    )
+                )[:missing]
+            )
+            # 批量调用已少返回过，补齐时不再依赖批量
+            per_call = 1
+        return results
+
+    async def generate_image(
+        self, prompt: str, size: str = "", deadline: Optional[Deadline] = None
+    ) -> tuple[bytes, str]:
+        """生成图片并读入内存
+
+        Args:
+            prompt: 提示词
+            size: 图片尺寸，为空则使用默认尺寸
+            deadline: 本次请求的总时间预算
+
+        Returns:
+            tuple[bytes, str]: (图片数据, 文件扩展名如 ".jpg")
+        """
+        result = (await self.generate_images(prompt, size, 1, deadline, True))[0]
+        return result.data, result.extension  # type: ignore[return-value]
+
+    async def generate_images(
+        self,
+        prompt: str,
+        size: str = "",
+        n: int = 1,
+        deadline: Optional[Deadline] = None,
+        download: bool = False,
+    ) -> list[ImageResult]:
+        """生成 n 张图片，不写入磁盘
+
+        Args:
+            prompt: 提示词
+            size: 图片尺寸，为空则使用默认尺寸
+            n: 图片数量
+            deadline: 本次请求的总时间预算
+            download: 是否将 URL 响应下载到内存，为 False 时原样返回 URL
+
+        Returns:
+            list[ImageResult]: 图片 URL 或数据
+        """
+        results = await self._collect_results(prompt, size, max(1, n), deadline)
+        if not download:
+            return results
+        return list(
+            await asyncio.gather(
+                *(self._load_result(result, deadline) for result in results)
+            )
+        )
+
+    async def _load_result(
+        self, result: ImageResult, deadline: Optional[Deadline]
+    ) -> ImageResult:
+        """将 URL 响应下载到内存"""
+        if result.data is not None:
+            return result
+        if not result.url:
+            raise ProviderError("生成图片失败：未返回 URL 或 Base64 数据")
+        url = result.url
+        start = time.monotonic()
+        try:
+            data = await call_with_retry(
+                lambda: self._download_bytes(url), self.download_retry, deadline
+            )
+        except BaseException:
+            self._observe("download", time.monotonic() - start, "error")
+            raise
+        self._observe("download", time.monotonic() - start, "ok")
+        return ImageResult(extension=result.extension, url=url, data=data)
+
+    async def generate_images_to_file(
+        self,
+        prompt: str,
+        size: str,
+        path_factory: Callable[[str], str],
+        n: int = 1,
+        deadline: Optional[Deadline] = None,
+    ) -> list[tuple[str, int]]:
+        """生成 n 张图片并直接写入磁盘，URL 响应分块流式下载，不在内存中缓冲整张图片
+
+        生成调用和图片下载分别重试，下载失败时只重新下载同一个 URL，不会重新生成。
+
+        Args:
+            prompt: 提示词
+            size: 图片尺寸，为空则使用默认尺寸
+            path_factory: 根据扩展名生成保存路径的函数
+            n: 图片数量
+            deadline: 本次请求的总时间预算
+
+        Returns:
+            list[tuple[str, int]]: [(文件路径, 文件字节数), ...]
+        """
+        results = await self._collect_results(prompt, size, max(1, n), deadline)
+        tasks = [
+            asyncio.ensure_future(self._save_result(result, path_factory, deadline))
+            for result in results
+        ]
+        try:
+            saved = await asyncio.gather(*tasks, return_exceptions=True)
+        except BaseException:
+            # 被取消（如对冲落败）时清理已经写完的文件
+            for task in tasks:
+                task.cancel()
+            await _remove_in_thread(
+                *(
+                    task.result()[0]
+                    for task in tasks
+                    if task.done() and not task.cancelled() and task.exception() is None
+                )
+            )
+            raise
+        errors = [item for item in saved if isinstance(item, BaseException)]
+        if errors:
+            # 任意一张保存失败时清理其余已保存的文件
+            await _remove_in_thread(
+                *(item[0] for item in saved if not isinstance(item, BaseException))
+            )
+            raise errors[0]
+        return saved  # type: ignore[return-value]
+
+    async def _save_result(
+        self,
+        result: ImageResult,
+        path_factory: Callable[[str], str],
+        deadline: Optional[Deadline],
+    ) -> tuple[str, int]:
+        """将单张图片写入磁盘"""
+        filepath = path_factory(result.extension)
+
+        if result.data is not None:
+            start = time.monotonic()
+            try:
+                async with aiofiles.open(filepath, "wb") as f:
+                    await f.write(result.data)
+            except BaseException:
+                await _remove_in_thread(filepath)
+                raise
+            self._observe("disk_write", time.monotonic() - start, "ok")
+            return filepath, len(result.data)
+        if result.url:
+            url = result.url
+            start = time.monotonic()
+            try:
+                written = await call_with_retry(
+                    lambda: self._download_to_file(url, filepath),
+                    self.download_retry,
+                    deadline,
+                )
+            except BaseException:
+                self._observe("download", time.monotonic() - start, "error")
+                raise
+            self._observe("download", time.monotonic() - start, "ok")
+            return filepath, written
+        raise ProviderError("生成图片失败：未返回 URL 或 Base64 数据")
+
+    @staticmethod
+    def _download_error(status: int) -> ProviderError:
+        """下载失败的异常，5xx 和 408/429 可重试"""
+        message = f"下载图片失败: HTTP {status}"
+        if status >= 500 or status in (408, 429):
+            return DownloadError(message)
+        return ProviderError(message)
+
+    async def _download_bytes(self, url: str) -> bytes:
+        """下载图片到内存"""
+        session = await self.get_http_session()
+        try:
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    raise self._download_error(resp.status)
+                return await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise DownloadError(f"下载图片失败: {e!r}") from e
+
+    async def _download_to_file(self, url: str, filepath: str) -> int:
+        """分块下载图片到文件，返回写入的字节数，失败时删除不完整的文件"""
+        session = await self.get_http_session()
+        written = 0
+        try:
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    raise self._download_error(resp.status)
+                async with aiofiles.open(filepath, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        await f.write(chunk)
+                        written += len(chunk)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            await _remove_in_thread(filepath)
+            raise DownloadError(f"下载图片失败: {e!r}") from e
+        except BaseException:
+            await _remove_in_thread(filepath)
+            raise
+        return written
+
     async def close(self):
-        """关闭连接"""
-        if self._http_session and not self._http_session.closed:
-            await self._http_session.close()
+        """关闭连接，共享的传输层由其创建者负责关闭"""
+        if self._owns_transport:
+            await self.transport.close()
 
     @staticmethod
     @abstractmethod
@@ -80,3 +484,23 @@ class BaseProvider(ABC):
             dict[str, list[str]]: 比例到尺寸列表的映射
         """
         pass
+
+
+def _remove_quietly(*paths: str) -> None:
+    """删除文件，忽略不存在等错误"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def _remove_in_thread(*paths: str) -> None:
+    """在线程池中删除文件，避免失败清理阻塞事件循环"""
+    if paths:
+        await asyncio.to_thread(_remove_quietly, *paths)
+
+
+def hash_key(api_key: str) -> str:
+    """API Key 的短哈希，用于指标标签，避免泄露 Key"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:8]
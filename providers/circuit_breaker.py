@@ -0,0 +1,189 @@
+"""provider 熔断器
+
+上游持续超时或返回 5xx 时，排队中的每个请求都要等一次完整的失败调用。
+熔断器按滚动时间窗口统计调用的失败率（含超过阈值的慢调用）：
+- closed: 正常调用，窗口内失败率达到阈值后打开
+- open: 直接以 CircuitOpenError 快速失败，不占用连接和 API Key
+- half_open: 打开一段时间后放行少量探测请求，探测成功则关闭，失败则重新打开
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from .errors import (
+    DeadlineExceededError,
+    ProviderError,
+    RateLimitedError,
+    RetryableError,
+)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ProviderError):
+    """熔断器打开，请求未发出即失败"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """单个 provider 实例的熔断器"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_ratio: float = 0.5,
+        min_calls: int = 5,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+        slow_call_seconds: float = 0.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """初始化
+
+        Args:
+            name: provider 名称，用于错误提示
+            failure_ratio: 打开熔断的失败率（失败和慢调用合计）
+            min_calls: 窗口内至少有多少次调用才判断失败率
+            window_seconds: 滚动窗口长度
+            open_seconds: 打开后多久进入半开状态
+            slow_call_seconds: 耗时超过该值的调用（无论成功或出错）也计为失败，
+                0 表示不按耗时判断
+            half_open_probes: 半开状态下同时放行的探测请求数，全部成功后关闭
+            clock: 时钟函数
+        """
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+        self._state = STATE_CLOSED
+        self._opened_until = 0.0
+        # (时间, 是否失败)
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._failures = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @staticmethod
+    def is_failure(error: BaseException) -> bool:
+        """是否说明上游不健康：临时错误和超时计入，限流、鉴权、参数错误不计入
+
+        上游挂起时重试引擎在时间预算耗尽后抛出 DeadlineExceededError，同样计入。
+        """
+        if isinstance(error, RateLimitedError):
+            return False
+        return isinstance(
+            error, (RetryableError, DeadlineExceededError, asyncio.TimeoutError)
+        )
+
+    @property
+    def state(self) -> str:
+        if self._state == STATE_OPEN and self.clock() >= self._opened_until:
+            self._state = STATE_HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            _, failed = self._calls.popleft()
+            self._failures -= failed
+
+    def _open(self, now: float) -> None:
+        self._state = STATE_OPEN
+        self._opened_until = now + self.open_seconds
+        self._calls.clear()
+        self._failures = 0
+        self.opened += 1
+
+    def acquire(self) -> bool:
+        """调用前检查，返回本次调用是否为半开探测
+
+        Raises:
+            CircuitOpenError: 熔断器打开，或半开状态下探测名额已满
+        """
+        state = self.state
+        if state == STATE_CLOSED:
+            return False
+        if state == STATE_HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+        self.rejected += 1
+        retry_after = max(self._opened_until - self.clock(), 1.0)
+        raise CircuitOpenError(
+            f"{self.name} 近期连续出错，已暂停调用，约 {math.ceil(retry_after)} 秒后重试",
+            retry_after,
+        )
+
+    def release(self, probe: bool) -> None:
+        """调用被取消，不计入统计"""
+        if probe:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(
+        self,
+        probe: bool,
+        error: Optional[BaseException] = None,
+        latency: Optional[float] = None,
+    ) -> None:
+        """记录调用结果，latency 为调用耗时（出错的调用也应传入）"""
+        failed = (error is not None and self.is_failure(error)) or (
+            self.slow_call_seconds > 0
+            and latency is not None
+            and latency >= self.slow_call_seconds
+        )
+        now = self.clock()
+
+        if probe:
+            self.release(probe)
+            if self._state != STATE_HALF_OPEN:
+                return
+            if failed:
+                self._open(now)
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = STATE_CLOSED
+            return
+
+        if self._state != STATE_CLOSED:
+            return
+        self._calls.append((now, failed))
+        self._failures += failed
+        self._prune(now)
+        if (
+            len(self._calls) >= self.min_calls
+            and self._failures / len(self._calls) >= self.failure_ratio
+        ):
+            self._open(now)
+
+    def snapshot(self) -> dict:
+        state = self.state
+        now = self.clock()
+        self._prune(now)
+        calls = len(self._calls)
+        return {
+            "state": state,
+            "failure_rate": round(self._failures / calls, 2) if calls else 0.0,
+            "calls": calls,
+            "retry_after": (
+                round(self._opened_until - now, 1) if state == STATE_OPEN else 0.0
+            ),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,37 @@
+"""按大小决定是否放到线程池执行的响应解码
+
+返回 Base64 图片的响应体可达数 MB，在事件循环中 json.loads 和 b64decode
+会阻塞同一 AstrBot 进程中的其他处理器。超过阈值的数据交给工作线程解码，
+小响应仍直接解码，避免线程切换的开销。
+"""
+
+import asyncio
+import base64
+import json
+from typing import Any, Callable, TypeVar, Union
+
+# 默认的线程解码阈值 (字节)
+DEFAULT_OFFLOAD_BYTES = 256 * 1024
+
+T = TypeVar("T")
+
+
+async def _run_sized(func: Callable[[Any], T], data: Any, threshold: int) -> T:
+    """数据长度达到阈值时在线程池中执行 func，threshold 为 0 表示总在当前线程执行"""
+    if threshold > 0 and len(data) >= threshold:
+        return await asyncio.to_thread(func, data)
+    return func(data)
+
+
+async def loads_json(
+    raw: Union[bytes, str], threshold: int = DEFAULT_OFFLOAD_BYTES
+) -> Any:
+    """解析 JSON 响应体"""
+    return await _run_sized(json.loads, raw, threshold)
+
+
+async def b64decode(
+    data: Union[bytes, str], threshold: int = DEFAULT_OFFLOAD_BYTES
+) -> bytes:
+    """解码 Base64 图片数据"""
+    return await _run_sized(base64.b64decode, data, threshold)
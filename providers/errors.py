@@ -0,0 +1,79 @@
+"""文生图服务提供商异常类型
+
+异常分为可重试和不可重试两类，重试引擎据此决定是否重试：
+- RetryableError: 5xx、连接中断、超时等临时错误
+- RateLimitedError: 限流 (HTTP 429)，可换 Key 或等待后重试
+- DownloadError: 图片下载失败，只需重新下载而不必重新生成
+- AuthError: API Key 无效或无权限，不重试
+- InvalidPromptError: 提示词或参数被拒绝（含内容审核），不重试
+- TaskFailedError: 异步任务已终止失败，包装实际原因，仅在任务轮询中使用
+"""
+
+from typing import Optional
+
+
+class ProviderError(Exception):
+    """provider 异常基类"""
+
+
+class RetryableError(ProviderError):
+    """可重试的临时错误"""
+
+
+class RateLimitedError(RetryableError):
+    """调用频率或并发超限 (HTTP 429)"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DownloadError(RetryableError):
+    """图片下载失败"""
+
+
+class AuthError(ProviderError):
+    """API Key 无效、过期或无权限 (HTTP 401/403)"""
+
+
+class InvalidPromptError(ProviderError):
+    """提示词或请求参数被拒绝 (HTTP 400/422)"""
+
+
+class DeadlineExceededError(ProviderError):
+    """超出单次请求的总时间预算"""
+
+
+class TaskFailedError(ProviderError):
+    """异步任务已处于终止的失败状态（如 FAILED、CANCELED）
+
+    与查询状态时的临时错误区分：轮询器不再查询该任务，
+    而是把 error 交给等待者，由重试引擎按 error 的类型决定是否重新提交。
+    """
+
+    def __init__(self, error: ProviderError):
+        super().__init__(str(error))
+        self.error = error
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（仅支持秒数格式）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def error_for_status(status: int, message: str) -> ProviderError:
+    """根据 HTTP 状态码构造对应类型的异常"""
+    if status == 429:
+        return RateLimitedError(message)
+    if status in (401, 403):
+        return AuthError(message)
+    if status in (400, 422):
+        return InvalidPromptError(message)
+    if status == 408 or status >= 500:
+        return RetryableError(message)
+    return ProviderError(message)
@@ -1,9 +1,24 @@
 """Gitee AI 文生图服务提供商"""
 
-import base64
 from typing import Optional
-from openai import AsyncOpenAI, AuthenticationError, RateLimitError, APIError
-from .base import BaseProvider
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APIError,
+    APIStatusError,
+    AuthenticationError,
+    RateLimitError,
+)
+from .base import BaseProvider, ImageResult
+from .decoding import b64decode, loads_json
+from .errors import (
+    AuthError,
+    ProviderError,
+    RateLimitedError,
+    RetryableError,
+    error_for_status,
+    parse_retry_after,
+)
 from .resolutions import get_gitee_resolutions
 
 
@@ -19,24 +34,33 @@ class GiteeProvider(BaseProvider):
         **kwargs,
     ):
         super().__init__(api_keys, base_url, model, negative_prompt, **kwargs)
+        self._base_client: Optional[AsyncOpenAI] = None
         self._openai_clients: dict[str, AsyncOpenAI] = {}
 
-    def _get_client(self) -> AsyncOpenAI:
-        """获取复用的 AsyncOpenAI 客户端"""
-        api_key = self.get_next_api_key()
-
+    def _get_client(self, api_key: str) -> AsyncOpenAI:
+        """获取指定 Key 的 AsyncOpenAI 客户端，所有 Key 共用传输层的 httpx 连接池"""
         if api_key not in self._openai_clients:
-            self._openai_clients[api_key] = AsyncOpenAI(
-                base_url=self.base_url,
-                api_key=api_key,
+            if self._base_client is None:
+                self._base_client = AsyncOpenAI(
+                    base_url=self.base_url,
+                    api_key=api_key,
+                    http_client=self.transport.get_httpx_client(),
+                    max_retries=0,  # 重试由 BaseProvider 的重试引擎统一处理
+                )
+            self._openai_clients[api_key] = self._base_client.with_options(
+                api_key=api_key
             )
 
         return self._openai_clients[api_key]
 
-    async def generate_image(self, prompt: str, size: str = "") -> tuple[bytes, str]:
-        """生成图片"""
-        client = self._get_client()
+    async def warmup(self) -> None:
+        """预热到 API 主机的 httpx 连接"""
+        await self.transport.warmup([self.base_url], use_httpx=True)
 
+    async def _request_images(
+        self, prompt: str, size: str = "", n: int = 1
+    ) -> list[ImageResult]:
+        """调用 API 生成图片（不支持批量，多张图片由基类并发调用）"""
         # 构建请求参数
         kwargs = {
             "prompt": prompt,
@@ -47,44 +71,56 @@ class GiteeProvider(BaseProvider):
         if self.negative_prompt:
             kwargs["extra_body"] = {"negative_prompt": self.negative_prompt}
 
-        try:
-            response = await client.images.generate(**kwargs)  # type: ignore
-        except AuthenticationError as e:
-            raise Exception("API Key 无效或已过期，请检查配置。") from e
-        except RateLimitError as e:
-            raise Exception("API 调用次数超限或并发过高，请稍后再试。") from e
-        except APIError as e:
-            if e.status_code and e.status_code >= 500:
-                raise Exception("Gitee AI 服务器内部错误，请稍后再试。") from e
-            raise Exception(f"API调用失败: {str(e)}") from e
-        except Exception as e:
-            raise Exception(f"API调用失败: {str(e)}") from e
-
-        if not response.data:  # type: ignore
-            raise Exception("生成图片失败：未返回数据")
-
-        image_data = response.data[0]  # type: ignore
+        async with self.api_key_lease() as api_key:
+            client = self._get_client(api_key)
+            try:
+                # 取原始响应体自行解析，跳过 SDK 在事件循环中的完整模型解析
+                response = await client.images.with_raw_response.generate(**kwargs)  # type: ignore
+            except AuthenticationError as e:
+                raise AuthError("API Key 无效或已过期，请检查配置。") from e
+            except RateLimitError as e:
+                raise RateLimitedError(
+                    "API 调用次数超限或并发过高，请稍后再试。",
+                    retry_after=parse_retry_after(
+                        e.response.headers.get("retry-after")
+                    ),
+                ) from e
+            except APIConnectionError as e:
+                # 包含 APITimeoutError
+                raise RetryableError(f"Gitee AI 网络连接失败: {str(e)}") from e
+            except APIStatusError as e:
+                if e.status_code >= 500:
+                    raise RetryableError("Gitee AI 服务器内部错误，请稍后再试。") from e
+                raise error_for_status(e.status_code, f"API调用失败: {str(e)}") from e
+            except APIError as e:
+                raise ProviderError(f"API调用失败: {str(e)}") from e
 
-        # 下载图片数据
-        if image_data.url:
-            session = await self.get_http_session()
-            async with session.get(image_data.url) as resp:
-                if resp.status != 200:
-                    raise Exception(f"下载图片失败: HTTP {resp.status}")
-                data = await resp.read()
-            return data, ".jpg"
-        elif image_data.b64_json:
-            data = base64.b64decode(image_data.b64_json)
-            return data, ".jpg"
-        else:
-            raise Exception("生成图片失败：未返回 URL 或 Base64 数据")
+        try:
+            result = await loads_json(response.content, self.decode_offload_bytes)
+            items = result.get("data")
+        except (ValueError, AttributeError) as e:
+            raise ProviderError(f"解析API响应失败: {e}") from e
+        if not items:
+            raise ProviderError("生成图片失败：未返回数据")
+
+        images: list[ImageResult] = []
+        for image_data in items:
+            if image_data.get("url"):
+                images.append(ImageResult(extension=".jpg", url=image_data["url"]))
+            elif image_data.get("b64_json"):
+                data = await b64decode(
+                    image_data["b64_json"], self.decode_offload_bytes
+                )
+                images.append(ImageResult(extension=".jpg", data=data))
+        if not images:
+            raise ProviderError("生成图片失败：未返回 URL 或 Base64 数据")
+        return images
 
     async def close(self):
-        """关闭连接"""
-        await super().close()
-        for client in self._openai_clients.values():
-            await client.close()
+        """关闭连接，httpx 连接池属于传输层，不单独关闭各客户端"""
         self._openai_clients.clear()
+        self._base_client = None
+        await super().close()
 
     @staticmethod
     def get_default_base_url() -> str:
@@ -0,0 +1,182 @@
+"""API Key 调度器
+
+按每个 Key 的健康状态挑选最合适的 Key：
+- 记录进行中的请求数，支持单 Key 并发上限
+- 记录延迟的指数移动平均
+- 触发限流 (429) 后进入冷却
+- 鉴权失败后暂时禁用
+"""
+
+import asyncio
+import time
+from typing import Callable, Optional
+
+from .errors import AuthError, RateLimitedError
+
+
+class _KeyState:
+    """单个 API Key 的运行状态"""
+
+    __slots__ = (
+        "key",
+        "in_flight",
+        "latency_ewma",
+        "cooldown_until",
+        "disabled_until",
+        "last_picked",
+    )
+
+    def __init__(self, key: str):
+        self.key = key
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.cooldown_until = 0.0
+        self.disabled_until = 0.0
+        self.last_picked = 0.0
+
+
+class KeyScheduler:
+    """基于健康状态的 API Key 调度器"""
+
+    def __init__(
+        self,
+        api_keys: list[str],
+        max_concurrency: int = 0,
+        cooldown_seconds: float = 30.0,
+        auth_disable_seconds: float = 1800.0,
+        latency_alpha: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """初始化调度器
+
+        Args:
+            api_keys: API Key 列表
+            max_concurrency: 单个 Key 的最大并发数，0 表示不限
+            cooldown_seconds: 限流后的默认冷却时间
+            auth_disable_seconds: 鉴权失败后的禁用时间
+            latency_alpha: 延迟移动平均的平滑系数
+            clock: 时钟函数
+        """
+        self._states = {key: _KeyState(key) for key in dict.fromkeys(api_keys)}
+        self.max_concurrency = max_concurrency
+        self.cooldown_seconds = cooldown_seconds
+        self.auth_disable_seconds = auth_disable_seconds
+        self.latency_alpha = latency_alpha
+        self.clock = clock
+        self._changed: Optional[asyncio.Event] = None
+
+    def _is_available(self, state: _KeyState, now: float) -> bool:
+        if state.disabled_until > now or state.cooldown_until > now:
+            return False
+        return self.max_concurrency <= 0 or state.in_flight < self.max_concurrency
+
+    def _pick(self, now: float) -> Optional[_KeyState]:
+        """选出预计完成最快的可用 Key，延迟未知的 Key 优先试用"""
+        best: Optional[_KeyState] = None
+        best_score: tuple = ()
+        for state in self._states.values():
+            if not self._is_available(state, now):
+                continue
+            latency = state.latency_ewma or 0.0
+            score = ((state.in_flight + 1) * latency, state.in_flight, state.last_picked)
+            if best is None or score < best_score:
+                best, best_score = state, score
+        return best
+
+    def has_spare_capacity(self) -> bool:
+        """是否有未冷却、未禁用且没有占满并发的 Key（用于判断能否执行后台任务）"""
+        now = self.clock()
+        return any(
+            self._is_available(state, now)
+            and (self.max_concurrency > 0 or state.in_flight == 0)
+            for state in self._states.values()
+        )
+
+    def pick_key(self) -> str:
+        """挑选一个 Key 但不计入进行中请求（兼容轮询接口）"""
+        if not self._states:
+            raise ValueError("请先配置 API Key")
+        now = self.clock()
+        state = self._pick(now)
+        if state is None:
+            # 全部不可用时退回到冷却最早结束的 Key
+            state = min(
+                self._states.values(),
+                key=lambda s: max(s.disabled_until, s.cooldown_until),
+            )
+        state.last_picked = now
+        return state.key
+
+    async def acquire(self) -> str:
+        """获取一个可用 Key 并计入进行中请求，全部繁忙或冷却时等待"""
+        if not self._states:
+            raise ValueError("请先配置 API Key")
+
+        while True:
+            now = self.clock()
+            state = self._pick(now)
+            if state is not None:
+                state.in_flight += 1
+                state.last_picked = now
+                return state.key
+
+            if all(s.disabled_until > now for s in self._states.values()):
+                raise AuthError("所有 API Key 均无效或已过期，请检查配置。")
+
+            # 等待有请求结束，或最早的冷却结束
+            wake_times = [
+                s.cooldown_until
+                for s in self._states.values()
+                if s.disabled_until <= now and s.cooldown_until > now
+            ]
+            timeout = min(wake_times) - now if wake_times else None
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(
+        self,
+        key: str,
+        latency: Optional[float] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """归还 Key，并根据调用结果更新其健康状态"""
+        state = self._states.get(key)
+        if state is None:
+            return
+        state.in_flight = max(0, state.in_flight - 1)
+        now = self.clock()
+
+        if isinstance(error, RateLimitedError):
+            cooldown = error.retry_after or self.cooldown_seconds
+            state.cooldown_until = max(state.cooldown_until, now + cooldown)
+        elif isinstance(error, AuthError):
+            state.disabled_until = now + self.auth_disable_seconds
+        elif error is None and latency is not None:
+            if state.latency_ewma is None:
+                state.latency_ewma = latency
+            else:
+                state.latency_ewma += self.latency_alpha * (
+                    latency - state.latency_ewma
+                )
+
+        if self._changed is not None:
+            self._changed.set()
+
+    def snapshot(self) -> list[dict]:
+        """返回各 Key 的状态（Key 仅保留末 4 位）"""
+        now = self.clock()
+        return [
+            {
+                "key": f"***{s.key[-4:]}",
+                "in_flight": s.in_flight,
+                "latency_ewma": s.latency_ewma,
+                "cooldown": max(0.0, s.cooldown_until - now),
+                "disabled": s.disabled_until > now,
+            }
+            for s in self._states.values()
+        ]
@@ -0,0 +1,275 @@
+"""多 provider 池
+
+按配置顺序调用多个 provider：
+- 前一个 provider 出错时自动切换到下一个
+- 可选对冲请求：主请求耗时超过其历史延迟分位数时，向下一个 provider
+  并发发起第二个请求，先完成者胜出，较慢的请求被取消
+- 可选熔断：熔断器打开的 provider 直接跳过，全部打开时快速失败
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from .base import BaseProvider, ImageResult, _remove_quietly
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .errors import DeadlineExceededError
+from .resolutions import select_size
+from .retry import Deadline
+
+logger = logging.getLogger("astrbot")
+
+T = TypeVar("T")
+
+
+class PoolMember:
+    """池中的单个 provider 及其延迟统计"""
+
+    def __init__(
+        self,
+        name: str,
+        provider: BaseProvider,
+        window: int = 100,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.provider = provider
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.breaker = breaker
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """返回最近成功请求延迟的分位数，样本不足时返回 None"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+
+class ProviderPool:
+    """带故障切换和对冲请求的 provider 池"""
+
+    def __init__(
+        self,
+        members: list[PoolMember],
+        default_ratio: str = "1:1",
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 95,
+        hedge_min_samples: int = 20,
+    ):
+        """初始化 provider 池
+
+        Args:
+            members: 按优先级排序的 provider 列表
+            default_ratio: 比例不受支持时使用的默认比例
+            hedge_enabled: 是否启用对冲请求
+            hedge_percentile: 触发对冲的延迟分位数
+            hedge_min_samples: 触发对冲前需要的最少延迟样本数
+        """
+        if not members:
+            raise ValueError("provider 池不能为空")
+        self.members = members
+        self.default_ratio = default_ratio
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.failovers = 0
+        self.hedges = 0
+        self.circuit_skips = 0
+
+    def _hedge_delay(self, member: PoolMember) -> Optional[float]:
+        """返回对 member 发起对冲前等待的秒数，不对冲时返回 None"""
+        if not self.hedge_enabled or len(member.latencies) < self.hedge_min_samples:
+            return None
+        return member.latency_percentile(self.hedge_percentile)
+
+    async def _attempt(
+        self,
+        member: PoolMember,
+        ratio: str,
+        quality: str,
+        call: Callable[[BaseProvider, str], Awaitable[T]],
+        probe: bool = False,
+    ) -> T:
+        """使用单个 provider 生成图片，尺寸按该 provider 自己的分辨率表选择
+
+        probe 表示本次调用是熔断器半开状态下的探测请求。
+        """
+        size = select_size(
+            member.provider.get_supported_ratios(), ratio, quality, self.default_ratio
+        )
+        breaker = member.breaker
+        start = time.monotonic()
+        try:
+            result = await call(member.provider, size)
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release(probe)
+            raise
+        except Exception as e:
+            if breaker is not None:
+                breaker.record(probe, error=e, latency=time.monotonic() - start)
+            raise
+        latency = time.monotonic() - start
+        member.latencies.append(latency)
+        if breaker is not None:
+            breaker.record(probe, latency=latency)
+        return result
+
+    async def generate_images_to_file(
+        self,
+        prompt: str,
+        ratio: str,
+        quality: str,
+        path_factory: Callable[[str], str],
+        n: int = 1,
+        deadline: Optional[Deadline] = None,
+    ) -> list[tuple[str, int]]:
+        """按优先级生成 n 张图片并写入磁盘，返回 [(文件路径, 文件字节数), ...]"""
+
+        def discard(saved: list[tuple[str, int]]) -> None:
+            for path, _ in saved:
+                _remove_quietly(path)
+
+        return await self._run(
+            ratio,
+            quality,
+            lambda provider, size: provider.generate_images_to_file(
+                prompt, size, path_factory, n, deadline
+            ),
+            discard,
+        )
+
+    async def generate_images(
+        self,
+        prompt: str,
+        ratio: str,
+        quality: str,
+        n: int = 1,
+        deadline: Optional[Deadline] = None,
+        download: bool = False,
+    ) -> list[ImageResult]:
+        """按优先级生成 n 张图片，不写入磁盘，返回图片 URL 或数据"""
+        return await self._run(
+            ratio,
+            quality,
+            lambda provider, size: provider.generate_images(
+                prompt, size, n, deadline, download
+            ),
+        )
+
+    async def _run(
+        self,
+        ratio: str,
+        quality: str,
+        call: Callable[[BaseProvider, str], Awaitable[T]],
+        discard: Optional[Callable[[T], None]] = None,
+    ) -> T:
+        """按优先级调用 provider，出错时切换，过慢时对冲
+
+        同一请求的所有图片由同一个 provider 生成。
+        所有 provider 共用同一个时间预算，超出预算后不再切换。
+
+        Args:
+            ratio: 图片比例
+            quality: 图片质量
+            call: 使用指定 provider 和尺寸发起调用的函数
+            discard: 丢弃多余结果（如对冲时同时完成的请求）的函数
+        """
+        pending: dict[asyncio.Task, PoolMember] = {}
+        next_index = 0
+        last_error: Optional[BaseException] = None
+
+        def launch() -> Optional[PoolMember]:
+            """启动下一个熔断器未打开的 provider，没有可用的 provider 时返回 None"""
+            nonlocal next_index, last_error
+            while next_index < len(self.members):
+                member = self.members[next_index]
+                next_index += 1
+                probe = False
+                if member.breaker is not None:
+                    try:
+                        probe = member.breaker.acquire()
+                    except CircuitOpenError as e:
+                        self.circuit_skips += 1
+                        if last_error is None:
+                            last_error = e
+                        continue
+                task = asyncio.create_task(
+                    self._attempt(member, ratio, quality, call, probe)
+                )
+                pending[task] = member
+                return member
+            return None
+
+        latest = launch()
+        try:
+            while pending:
+                timeout = None
+                if len(pending) == 1 and next_index < len(self.members):
+                    timeout = self._hedge_delay(latest)
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # 主请求过慢，向下一个 provider 发起对冲请求
+                    slow_name = latest.name
+                    hedge = launch()
+                    if hedge is not None:
+                        self.hedges += 1
+                        logger.info(f"{slow_name} 响应过慢，对冲请求 {hedge.name}")
+                        latest = hedge
+                    continue
+
+                has_winner = False
+                winner = None
+                for task in done:
+                    member = pending.pop(task)
+                    if task.exception() is None:
+                        if not has_winner:
+                            has_winner = True
+                            winner = task.result()
+                        elif discard is not None:
+                            # 同时完成的多余结果直接丢弃
+                            discard(task.result())
+                    else:
+                        last_error = task.exception()
+                        logger.warning(f"{member.name} 生成图片失败: {last_error}")
+                if has_winner:
+                    return winner  # type: ignore[return-value]
+
+                if isinstance(last_error, DeadlineExceededError):
+                    break
+                if not pending and next_index < len(self.members):
+                    self.failovers += 1
+                    latest = launch() or latest
+        finally:
+            for task in pending:
+                task.cancel()
+
+        assert last_error is not None
+        raise last_error
+
+    async def warmup(self) -> None:
+        """预热所有 provider 的连接"""
+        await asyncio.gather(
+            *(member.provider.warmup() for member in self.members),
+            return_exceptions=True,
+        )
+
+    def stats(self) -> dict[str, int]:
+        """返回故障转移、对冲和熔断跳过次数"""
+        return {
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "circuit_skips": self.circuit_skips,
+        }
+
+    async def close(self) -> None:
+        """关闭所有 provider"""
+        for member in self.members:
+            await member.provider.close()
+
@@ -0,0 +1,53 @@
+"""provider 的延迟加载注册表
+
+各 provider 模块只在第一次被用到时导入。例如只配置了 aliyun 或 volcengine 时，
+不会导入 Gitee 所需的 openai SDK 和 httpx，插件加载更快、内存占用更小。
+"""
+
+import importlib
+from typing import Iterator, Mapping
+
+from .base import BaseProvider
+
+# provider 名称 -> (模块名, 类名)
+PROVIDER_MODULES: dict[str, tuple[str, str]] = {
+    "gitee": ("gitee", "GiteeProvider"),
+    "aliyun": ("aliyun", "AliyunProvider"),
+    "volcengine": ("volcengine", "VolcengineProvider"),
+}
+
+
+class ProviderRegistry(Mapping[str, type[BaseProvider]]):
+    """按名称查找 provider 类，首次访问时才导入对应模块"""
+
+    def __init__(self, modules: dict[str, tuple[str, str]]):
+        self._modules = modules
+        self._classes: dict[str, type[BaseProvider]] = {}
+
+    def __getitem__(self, name: str) -> type[BaseProvider]:
+        provider_class = self._classes.get(name)
+        if provider_class is None:
+            module_name, class_name = self._modules[name]
+            module = importlib.import_module(f".{module_name}", __package__)
+            provider_class = self._classes[name] = getattr(module, class_name)
+        return provider_class
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._modules)
+
+    def __len__(self) -> int:
+        return len(self._modules)
+
+    def class_name_to_provider(self, class_name: str) -> str:
+        """由类名反查 provider 名称，找不到时抛出 KeyError"""
+        for name, (_, cls_name) in self._modules.items():
+            if cls_name == class_name:
+                return name
+        raise KeyError(class_name)
+
+    def loaded(self) -> list[str]:
+        """已导入的 provider 名称"""
+        return list(self._classes)
+
+
+PROVIDER_REGISTRY = ProviderRegistry(PROVIDER_MODULES)
@@ -136,3 +136,27 @@ def get_volcengine_resolutions(model: str) -> dict[str, list[str]]:
     else:
         # 默认使用 4.5 配置
         return VOLCENGINE_SEEDREAM_45_RESOLUTIONS
+
+
+# 质量参数到尺寸列表索引的映射 (s=0, m=1, h=2)
+QUALITY_INDEX = {"s": 0, "m": 1, "h": 2}
+
+
+def select_size(
+    supported_ratios: dict[str, list[str]],
+    ratio: str,
+    quality: str,
+    default_ratio: str = "1:1",
+) -> str:
+    """根据比例和质量从分辨率表中选出尺寸
+
+    比例不受支持时依次回退到默认比例和表中第一个比例，
+    质量索引超出尺寸列表时取最大的尺寸。
+    """
+    if ratio not in supported_ratios:
+        ratio = default_ratio if default_ratio in supported_ratios else next(
+            iter(supported_ratios)
+        )
+    size_list = supported_ratios[ratio]
+    quality_index = QUALITY_INDEX.get(quality, 1)  # 默认中等
+    return size_list[min(quality_index, len(size_list) - 1)]
@@ -0,0 +1,102 @@
+"""重试引擎
+
+指数退避 + 随机抖动，并受单次请求总时间预算约束。
+生成调用和图片下载使用各自的重试策略，下载失败时只重新下载同一个 URL。
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from .errors import DeadlineExceededError, RetryableError
+
+T = TypeVar("T")
+
+
+class RetryPolicy:
+    """重试策略"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+        multiplier: float = 2.0,
+    ):
+        """初始化重试策略
+
+        Args:
+            max_attempts: 最大尝试次数（含首次）
+            base_delay: 首次重试的退避上限
+            max_delay: 单次退避的最大值
+            multiplier: 退避增长倍数
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间（全抖动）"""
+        cap = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(0, cap)
+
+
+class Deadline:
+    """单次请求的总时间预算"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        """初始化时间预算
+
+        Args:
+            seconds: 总时长，None 或非正数表示不限
+        """
+        self.expires_at = (
+            time.monotonic() + seconds if seconds and seconds > 0 else None
+        )
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，不限时返回 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+async def call_with_retry(
+    func: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    deadline: Optional[Deadline] = None,
+) -> T:
+    """按策略调用 func，仅对 RetryableError 重试
+
+    Raises:
+        DeadlineExceededError: 超出总时间预算
+    """
+    if deadline is None:
+        deadline = Deadline()
+
+    attempt = 0
+    while True:
+        attempt += 1
+        if deadline.expired():
+            raise DeadlineExceededError("请求超时，请稍后再试。")
+        try:
+            return await asyncio.wait_for(func(), deadline.remaining())
+        except RetryableError:
+            if attempt >= policy.max_attempts:
+                raise
+            # 限流的 Key 已由 KeyScheduler 冷却，重试时会换用其他 Key 或等待冷却结束
+            delay = policy.backoff(attempt)
+            remaining = deadline.remaining()
+            if remaining is not None and delay >= remaining:
+                raise
+            await asyncio.sleep(delay)
+        except asyncio.TimeoutError as e:
+            if deadline.expired():
+                raise DeadlineExceededError("请求超时，请稍后再试。") from e
+            raise
@@ -0,0 +1,147 @@
+"""异步任务轮询器
+
+异步任务模式下，provider 提交生成任务后立即拿到任务 ID，不再为整个生成过程
+占用一条长连接。所有进行中的任务由同一个后台循环轮询：
+- 每个任务的轮询间隔从 initial_interval 开始按 backoff 倍数增长，直到 max_interval
+- 每轮把到期的任务一起查询，并发数受 max_concurrency 限制
+- 任务完成或失败时设置等待者的 Future，等待者取消时任务随之移除
+- 查询请求本身的临时错误下轮重试；任务已终止失败时 fetch 抛出 TaskFailedError，
+  立即把实际原因交给等待者
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from .errors import RetryableError, TaskFailedError
+
+logger = logging.getLogger("astrbot")
+
+# 查询任务状态：返回 None 表示任务仍在进行，返回结果表示完成，
+# 任务失败时抛出 TaskFailedError，其他异常视为查询请求本身的错误
+TaskFetcher = Callable[[str, str], Awaitable[Optional[Any]]]
+
+
+@dataclass
+class _PendingTask:
+    task_id: str
+    api_key: str
+    future: asyncio.Future
+    interval: float
+    due: float = field(default=0.0)
+
+
+class TaskPoller:
+    """用一个后台循环轮询所有进行中的异步任务"""
+
+    def __init__(
+        self,
+        fetch: TaskFetcher,
+        initial_interval: float = 1.0,
+        max_interval: float = 10.0,
+        backoff: float = 1.5,
+        max_concurrency: int = 8,
+    ):
+        """初始化轮询器
+
+        Args:
+            fetch: 查询单个任务状态的协程函数 (任务 ID, API Key)
+            initial_interval: 首次查询前等待的秒数
+            max_interval: 查询间隔上限
+            backoff: 每次查询后间隔的增长倍数
+            max_concurrency: 每轮同时查询的任务数上限
+        """
+        self.fetch = fetch
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_concurrency = max(1, max_concurrency)
+        self._tasks: dict[str, _PendingTask] = {}
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self.polls = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def wait(self, task_id: str, api_key: str) -> Any:
+        """登记任务并等待其完成，返回 fetch 给出的结果"""
+        future = asyncio.get_running_loop().create_future()
+        self._tasks[task_id] = _PendingTask(
+            task_id,
+            api_key,
+            future,
+            self.initial_interval,
+            time.monotonic() + self.initial_interval,
+        )
+        self._wakeup.set()
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+        try:
+            return await future
+        finally:
+            # 等待者被取消（如超出时间预算）时不再轮询该任务
+            self._tasks.pop(task_id, None)
+
+    async def _run(self) -> None:
+        """轮询循环，没有进行中的任务时退出"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        while self._tasks:
+            now = time.monotonic()
+            due = [task for task in self._tasks.values() if task.due <= now]
+            if due:
+                await asyncio.gather(*(self._poll(task, semaphore) for task in due))
+                continue
+
+            # 睡到最早到期的任务，有新任务登记时提前醒来
+            self._wakeup.clear()
+            next_due = min(task.due for task in self._tasks.values())
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=max(0.0, next_due - now)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, task: _PendingTask, semaphore: asyncio.Semaphore) -> None:
+        """查询单个任务并按结果设置 Future 或推迟下次查询"""
+        if task.future.done():
+            return
+        async with semaphore:
+            self.polls += 1
+            try:
+                result = await self.fetch(task.task_id, task.api_key)
+            except TaskFailedError as e:
+                if not task.future.done():
+                    task.future.set_exception(e.error)
+                return
+            except RetryableError as e:
+                # 查询本身的临时错误不影响任务，下轮继续查询
+                logger.debug(f"查询任务 {task.task_id} 状态失败: {e}")
+                result = None
+            except Exception as e:
+                if not task.future.done():
+                    task.future.set_exception(e)
+                return
+
+        if result is not None:
+            if not task.future.done():
+                task.future.set_result(result)
+            return
+        task.interval = min(self.max_interval, task.interval * self.backoff)
+        task.due = time.monotonic() + task.interval
+
+    async def close(self) -> None:
+        """停止轮询并取消所有等待者"""
+        for task in self._tasks.values():
+            task.future.cancel()
+        self._tasks.clear()
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
@@ -0,0 +1,135 @@
+"""共享 HTTP 传输层
+
+所有 provider 和所有 API Key 共用同一组连接池：
+- aiohttp 连接池用于原生 HTTP 调用和图片下载
+- httpx 连接池供 OpenAI SDK 使用（按需创建）
+支持连接池大小、keep-alive、DNS 缓存和超时配置，以及启动时预热 TLS/DNS。
+"""
+
+import asyncio
+from typing import TYPE_CHECKING, Iterable, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class HttpTransport:
+    """共享的 HTTP 连接池"""
+
+    def __init__(
+        self,
+        pool_size: int = 100,
+        pool_size_per_host: int = 20,
+        keepalive_seconds: float = 120.0,
+        dns_cache_seconds: int = 300,
+        timeout_seconds: float = 300.0,
+        connect_timeout_seconds: float = 10.0,
+    ):
+        """初始化传输层
+
+        Args:
+            pool_size: 连接池总连接数上限
+            pool_size_per_host: 单个主机的连接数上限
+            keepalive_seconds: 空闲连接保持时间
+            dns_cache_seconds: DNS 解析结果缓存时间
+            timeout_seconds: 单次请求总超时
+            connect_timeout_seconds: 建立连接超时
+        """
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.keepalive_seconds = keepalive_seconds
+        self.dns_cache_seconds = dns_cache_seconds
+        self.timeout_seconds = timeout_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._httpx_client: Optional["httpx.AsyncClient"] = None
+        self._closed = False
+
+    def _check_open(self) -> None:
+        # 关闭后不再创建新的连接池，避免卸载后残留的任务打开无人关闭的连接
+        if self._closed:
+            raise RuntimeError("HTTP 传输层已关闭")
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """获取共享的 aiohttp Session
+
+        Raises:
+            RuntimeError: 传输层已关闭
+        """
+        self._check_open()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size_per_host,
+                keepalive_timeout=self.keepalive_seconds,
+                ttl_dns_cache=self.dns_cache_seconds,
+                use_dns_cache=True,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.timeout_seconds,
+                sock_connect=self.connect_timeout_seconds,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    def get_httpx_client(self) -> "httpx.AsyncClient":
+        """获取共享的 httpx 客户端（供 OpenAI SDK 使用）
+
+        Raises:
+            RuntimeError: 传输层已关闭
+        """
+        self._check_open()
+        if self._httpx_client is None or self._httpx_client.is_closed:
+            import httpx
+
+            self._httpx_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size_per_host,
+                    keepalive_expiry=self.keepalive_seconds,
+                ),
+                timeout=httpx.Timeout(
+                    self.timeout_seconds, connect=self.connect_timeout_seconds
+                ),
+            )
+        return self._httpx_client
+
+    @staticmethod
+    def _origins(urls: Iterable[str]) -> list[str]:
+        """提取去重后的 scheme://host 列表"""
+        origins: dict[str, None] = {}
+        for url in urls:
+            parts = urlsplit(url)
+            if parts.scheme and parts.netloc:
+                origins[f"{parts.scheme}://{parts.netloc}"] = None
+        return list(origins)
+
+    async def warmup(self, urls: Iterable[str], use_httpx: bool = False) -> None:
+        """预先完成 DNS 解析和 TLS 握手，使连接进入连接池
+
+        只关心连接是否建立，响应状态码和请求失败都被忽略。
+        """
+
+        async def _warm(origin: str) -> None:
+            try:
+                if use_httpx:
+                    await self.get_httpx_client().head(origin)
+                else:
+                    session = await self.get_session()
+                    async with session.head(origin, allow_redirects=False):
+                        pass
+            except Exception:
+                pass
+
+        await asyncio.gather(*(_warm(origin) for origin in self._origins(urls)))
+
+    async def close(self) -> None:
+        """关闭所有连接，之后不能再获取 Session 或客户端"""
+        self._closed = True
+        if self._session and not self._session.closed:
+            await self._session.close()
+        if self._httpx_client is not None and not self._httpx_client.is_closed:
+            await self._httpx_client.aclose()
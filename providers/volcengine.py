@@ -1,17 +1,26 @@
 """字节火山引擎文生图服务提供商"""
 
-import base64
-from .base import BaseProvider
+from .base import BaseProvider, ImageResult
+from .decoding import b64decode
+from .errors import ProviderError
 from .resolutions import get_volcengine_resolutions
 
 
 class VolcengineProvider(BaseProvider):
     """字节火山引擎文生图服务提供商"""
 
-    async def generate_image(self, prompt: str, size: str = "") -> tuple[bytes, str]:
-        """生成图片"""
-        api_key = self.get_next_api_key()
+    def _supports_group_generation(self) -> bool:
+        """SeeDream 4.x 支持组图生成（单次调用返回多张图片）"""
+        model_lower = self.model.lower()
+        return not ("3-0" in model_lower or "3.0" in model_lower)
 
+    def get_max_images_per_call(self) -> int:
+        return 15 if self._supports_group_generation() else 1
+
+    async def _request_images(
+        self, prompt: str, size: str = "", n: int = 1
+    ) -> list[ImageResult]:
+        """调用 API 生成图片"""
         # 构建请求体
         payload = {
             "model": self.model,
@@ -19,49 +28,36 @@ class VolcengineProvider(BaseProvider):
             "size": size,
             "watermark": False,
         }
-
-        session = await self.get_http_session()
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
+        if n > 1:
+            # 组图模式下模型返回的图片数不超过 max_images，可能少于请求的数量
+            payload["sequential_image_generation"] = "auto"
+            payload["sequential_image_generation_options"] = {"max_images": n}
 
         url = f"{self.base_url}/images/generations"
 
-        try:
-            async with session.post(url, json=payload, headers=headers) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    raise Exception(f"API调用失败 (HTTP {resp.status}): {error_text}")
-
-                result = await resp.json()
-        except Exception as e:
-            raise Exception(f"字节火山API调用失败: {str(e)}")
+        async with self.api_key_lease() as api_key:
+            result = await self._post_json(url, payload, api_key)
 
         # 解析响应
         try:
-            if "data" in result and len(result["data"]) > 0:
-                data_item = result["data"][0]
-                if "url" in data_item:
-                    # 下载图片
-                    async with session.get(data_item["url"]) as resp:
-                        if resp.status != 200:
-                            raise Exception(f"下载图片失败: HTTP {resp.status}")
-                        data = await resp.read()
-                    return data, ".jpg"
-                elif "b64_json" in data_item:
-                    data = base64.b64decode(data_item["b64_json"])
-                    return data, ".jpg"
-                else:
-                    raise Exception("响应中未找到图片URL或Base64数据")
-            else:
-                raise Exception("响应中未找到图片数据")
-        except (KeyError, IndexError) as e:
-            raise Exception(f"解析字节火山API响应失败: {str(e)}") from e
-        except Exception as e:
-            if "API调用失败" not in str(e):
-                raise Exception(f"字节火山API调用失败: {str(e)}") from e
-            raise
+            items = result["data"]
+        except (KeyError, TypeError) as e:
+            raise ProviderError(f"解析字节火山API响应失败: {str(e)}") from e
+        if not items:
+            raise ProviderError("响应中未找到图片数据")
+
+        images: list[ImageResult] = []
+        for data_item in items:
+            if "url" in data_item:
+                images.append(ImageResult(extension=".jpg", url=data_item["url"]))
+            elif "b64_json" in data_item:
+                data = await b64decode(
+                    data_item["b64_json"], self.decode_offload_bytes
+                )
+                images.append(ImageResult(extension=".jpg", data=data))
+        if not images:
+            raise ProviderError("响应中未找到图片URL或Base64数据")
+        return images
 
     @staticmethod
     def get_default_base_url() -> str:
@@ -0,0 +1,18 @@
+"""测试配置
+
+插件代码使用相对导入（core 引用 ..providers），需要以包的形式导入。
+将插件根目录注册为 astrbot_plugin_text2img 包（与 AstrBot 安装后的目录名一致），
+不导入 main.py，测试不依赖 AstrBot。
+"""
+
+import sys
+import types
+from pathlib import Path
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "astrbot_plugin_text2img"
+
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(PLUGIN_ROOT)]
+    sys.modules[PACKAGE] = package
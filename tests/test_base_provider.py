@@ -0,0 +1,95 @@
+"""provider 基类的批量生成测试"""
+
+import asyncio
+
+import pytest
+
+from astrbot_plugin_text2img.providers.base import BaseProvider, ImageResult
+from astrbot_plugin_text2img.providers.errors import InvalidPromptError
+from astrbot_plugin_text2img.providers.retry import RetryPolicy
+
+
+class FakeProvider(BaseProvider):
+    """按脚本返回图片的 provider，记录调用和并发数"""
+
+    def __init__(self, per_call: int, returned: int, delay: float = 0.05):
+        super().__init__(
+            ["key"], "http://localhost", "model", generation_retry=RetryPolicy(1)
+        )
+        self.per_call = per_call
+        self.returned = returned
+        self.delay = delay
+        self.calls: list[int] = []
+        self.running = 0
+        self.peak = 0
+        self.cancelled = 0
+        self.fail_on_call = -1
+
+    def get_max_images_per_call(self) -> int:
+        return self.per_call
+
+    async def _request_images(self, prompt, size="", n=1):
+        index = len(self.calls)
+        self.calls.append(n)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            if index == self.fail_on_call:
+                raise InvalidPromptError("rejected")
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.running -= 1
+        return [
+            ImageResult(".png", url=f"u{index}-{i}")
+            for i in range(min(n, self.returned))
+        ]
+
+    @staticmethod
+    def get_default_base_url() -> str:
+        return "http://localhost"
+
+    @staticmethod
+    def get_supported_ratios() -> dict[str, list[str]]:
+        return {"1:1": ["512x512", "1024x1024", "2048x2048"]}
+
+
+def test_shortfall_is_requested_concurrently():
+    # 批量调用只返回 1 张，缺少的 3 张在一轮内按每次一张并发补齐
+    provider = FakeProvider(per_call=4, returned=1)
+    results = asyncio.run(provider._collect_results("p", "", 4, None))
+    assert len(results) == 4
+    assert provider.calls == [4, 1, 1, 1]
+    assert provider.peak == 3
+
+
+def test_failed_batch_cancels_siblings():
+    provider = FakeProvider(per_call=1, returned=1, delay=1.0)
+    provider.fail_on_call = 0
+
+    async def run() -> None:
+        with pytest.raises(InvalidPromptError):
+            await provider._collect_results("p", "", 3, None)
+        # 失败时其余调用已被取消，而不是在后台继续运行
+        assert provider.cancelled == 2
+        assert provider.running == 0
+
+    asyncio.run(run())
+
+
+def test_failed_save_removes_saved_files(tmp_path):
+    class DataProvider(FakeProvider):
+        async def _request_images(self, prompt, size="", n=1):
+            return [ImageResult(".png", data=b"image") for _ in range(n)]
+
+    provider = DataProvider(per_call=2, returned=2)
+    paths = iter([str(tmp_path / "a.png"), str(tmp_path / "missing" / "b.png")])
+
+    with pytest.raises(OSError):
+        asyncio.run(
+            provider.generate_images_to_file("p", "", lambda ext: next(paths), 2)
+        )
+    # 第二张写入失败时，已写完的第一张也被删除
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,83 @@
+"""熔断器测试"""
+
+import asyncio
+
+import pytest
+
+from astrbot_plugin_text2img.providers.circuit_breaker import (
+    STATE_CLOSED,
+    STATE_OPEN,
+    CircuitBreaker,
+)
+from astrbot_plugin_text2img.providers.errors import (
+    DeadlineExceededError,
+    InvalidPromptError,
+)
+from astrbot_plugin_text2img.providers.pool import PoolMember, ProviderPool
+from astrbot_plugin_text2img.providers.retry import (
+    Deadline,
+    RetryPolicy,
+    call_with_retry,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class HangingProvider:
+    """请求永不返回的 provider"""
+
+    def get_supported_ratios(self) -> dict[str, list[str]]:
+        return {"1:1": ["512x512", "1024x1024", "2048x2048"]}
+
+    async def hang(self) -> None:
+        await asyncio.sleep(3600)
+
+
+def test_deadline_exceeded_counts_as_failure():
+    assert CircuitBreaker.is_failure(DeadlineExceededError("timeout"))
+
+
+def test_deadline_exceeded_opens_breaker():
+    breaker = CircuitBreaker("test", min_calls=3, clock=FakeClock())
+    for _ in range(3):
+        breaker.record(False, error=DeadlineExceededError("timeout"), latency=240.0)
+    assert breaker.state == STATE_OPEN
+
+
+def test_slow_failed_call_counts_as_failure():
+    breaker = CircuitBreaker(
+        "test", min_calls=2, slow_call_seconds=60.0, clock=FakeClock()
+    )
+    # 参数错误本身不计入，但耗时超过阈值时计入
+    breaker.record(False, error=InvalidPromptError("bad"), latency=1.0)
+    breaker.record(False, error=InvalidPromptError("bad"), latency=1.0)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.snapshot()["failure_rate"] == 0.0
+    breaker.record(False, error=InvalidPromptError("bad"), latency=90.0)
+    breaker.record(False, error=InvalidPromptError("bad"), latency=90.0)
+    assert breaker.state == STATE_OPEN
+
+
+def test_pool_timeouts_open_breaker():
+    breaker = CircuitBreaker("hang", min_calls=3)
+    provider = HangingProvider()
+    pool = ProviderPool([PoolMember("hang", provider, breaker=breaker)])
+
+    async def call(_provider, _size):
+        return await call_with_retry(
+            provider.hang, RetryPolicy(max_attempts=1), Deadline(0.01)
+        )
+
+    async def run() -> None:
+        for _ in range(3):
+            with pytest.raises(DeadlineExceededError):
+                await pool._run("1:1", "s", call)
+
+    asyncio.run(run())
+    assert breaker.state == STATE_OPEN
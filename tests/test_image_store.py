@@ -0,0 +1,102 @@
+"""图片存储淘汰测试"""
+
+from astrbot_plugin_text2img.core.image_store import ImageStore
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_store(tmp_path, max_bytes: int, ttl_seconds: float = 0):
+    clock = FakeClock()
+    evicted: list[str] = []
+    store = ImageStore(
+        tmp_path,
+        max_bytes=max_bytes,
+        ttl_seconds=ttl_seconds,
+        on_evict=evicted.append,
+        clock=clock,
+    )
+    return store, clock, evicted
+
+
+def test_quota_evicts_least_recently_used_first(tmp_path):
+    store, clock, evicted = make_store(tmp_path, max_bytes=300)
+    for name in ("a", "b", "c"):
+        store.add(name, 100)
+        clock.now += 1
+    # 访问 a 后 b 成为最久未访问的文件
+    store.touch("a")
+    clock.now += 1
+    store.add("d", 100)
+
+    assert store.collect_evictions() == ["b"]
+    assert evicted == ["b"]
+    assert store.total_bytes == 300
+    assert "b" not in store and len(store) == 3
+
+    store.add("e", 250)
+    assert store.collect_evictions() == ["c", "a", "d"]
+    assert store.total_bytes == 250
+    assert store.stats() == {"files": 1, "bytes": 250, "evicted": 4}
+
+
+def test_within_quota_evicts_nothing(tmp_path):
+    store, _, _ = make_store(tmp_path, max_bytes=300)
+    store.add("a", 100)
+    store.add("b", 200)
+    assert store.collect_evictions() == []
+    assert store.total_bytes == 300
+
+
+def test_ttl_eviction(tmp_path):
+    store, clock, _ = make_store(tmp_path, max_bytes=10_000, ttl_seconds=60)
+    store.add("old", 100)
+    clock.now += 30
+    store.add("new", 100)
+    clock.now += 40
+    assert store.collect_evictions() == ["old"]
+    # 访问会推迟过期
+    store.touch("new")
+    clock.now += 50
+    assert store.collect_evictions() == []
+    clock.now += 20
+    assert store.collect_evictions() == ["new"]
+    assert len(store) == 0 and store.total_bytes == 0
+
+
+def test_removed_and_replaced_entries_are_cleaned_up(tmp_path):
+    store, clock, evicted = make_store(tmp_path, max_bytes=100)
+    store.add("a", 100)
+    store.remove("a")
+    assert store.total_bytes == 0 and "a" not in store
+    clock.now += 1
+    # 重新写入同一路径时替换旧记录，不重复计入字节数
+    store.add("b", 60)
+    store.add("b", 80)
+    assert store.total_bytes == 80
+    assert store.collect_evictions() == []
+    assert evicted == []
+    assert store.size("b") == 80 and store.size("a") is None
+
+
+def test_heap_is_compacted_after_many_touches(tmp_path):
+    store, clock, _ = make_store(tmp_path, max_bytes=10_000)
+    store.add("a", 100)
+    for _ in range(1000):
+        clock.now += 1
+        store.touch("a")
+    assert len(store._heap) <= 2 * len(store) + 64
+
+
+def test_load_keeps_existing_entries(tmp_path):
+    (tmp_path / "x.png").write_bytes(b"0" * 10)
+    (tmp_path / "notes.txt").write_text("skip")
+    store, _, _ = make_store(tmp_path, max_bytes=100)
+    store.add(str(tmp_path / "x.png"), 10)
+    store.load(store.scan())
+    assert len(store) == 1 and store.total_bytes == 10
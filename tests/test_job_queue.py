@@ -0,0 +1,131 @@
+"""公平任务队列测试"""
+
+import asyncio
+from typing import Optional
+
+import pytest
+
+from astrbot_plugin_text2img.core.job_queue import (
+    OVERFLOW_DROP_OLDEST,
+    FairJobQueue,
+    QueueFullError,
+)
+
+
+def job(order: list[str], name: str, gate: Optional[asyncio.Event] = None):
+    async def run() -> str:
+        order.append(name)
+        if gate is not None:
+            await gate.wait()
+        return name
+
+    return run
+
+
+def test_round_robin_order_and_positions():
+    async def run() -> None:
+        queue = FairJobQueue(max_workers=1, max_per_user=0)
+        order: list[str] = []
+        gate = asyncio.Event()
+        position, blocker = queue.submit("z", "g0", job(order, "z", gate))
+        assert position == 0
+
+        positions = {}
+        futures = []
+        for user, group, name in [
+            ("a", "g1", "a1"),
+            ("a", "g1", "a2"),
+            ("b", "g1", "b1"),
+            ("c", "g2", "c1"),
+            ("d", "", "d1"),
+        ]:
+            positions[name], future = queue.submit(user, group, job(order, name))
+            futures.append(future)
+        # 提交时的位置：群之间轮询，群内用户之间轮询
+        assert positions == {"a1": 1, "a2": 2, "b1": 2, "c1": 2, "d1": 3}
+        assert queue.pending == 5
+
+        gate.set()
+        await asyncio.gather(blocker, *futures)
+        assert order == ["z", "a1", "c1", "d1", "b1", "a2"]
+        assert queue.pending == 0 and queue.running == 0
+
+    asyncio.run(run())
+
+
+def test_per_user_limit():
+    async def run() -> None:
+        queue = FairJobQueue(max_workers=1, max_per_user=2)
+        gate = asyncio.Event()
+        order: list[str] = []
+        futures = [
+            queue.submit("a", "g", job(order, name, gate))[1] for name in ("a1", "a2")
+        ]
+        with pytest.raises(QueueFullError):
+            queue.submit("a", "g", job(order, "a3"))
+        # 其他用户不受影响
+        futures.append(queue.submit("b", "g", job(order, "b1"))[1])
+        assert queue.user_jobs("a") == 2
+        assert queue.rejected == 1
+        gate.set()
+        await asyncio.gather(*futures)
+        assert queue.user_jobs("a") == 0
+
+    asyncio.run(run())
+
+
+def test_reject_overflow():
+    async def run() -> None:
+        queue = FairJobQueue(max_workers=1, max_pending=2, max_per_user=0)
+        gate = asyncio.Event()
+        order: list[str] = []
+        futures = [
+            queue.submit(user, "", job(order, user, gate))[1] for user in "abc"
+        ]
+        with pytest.raises(QueueFullError):
+            queue.submit("d", "", job(order, "d"))
+        assert queue.rejected == 1 and queue.dropped == 0
+        gate.set()
+        assert await asyncio.gather(*futures) == ["a", "b", "c"]
+        assert "d" not in order
+
+    asyncio.run(run())
+
+
+def test_drop_oldest_overflow():
+    async def run() -> None:
+        queue = FairJobQueue(
+            max_workers=1, max_pending=2, max_per_user=0, overflow=OVERFLOW_DROP_OLDEST
+        )
+        gate = asyncio.Event()
+        order: list[str] = []
+        running = queue.submit("a", "", job(order, "a", gate))[1]
+        oldest = queue.submit("b", "", job(order, "b"))[1]
+        queued = queue.submit("c", "", job(order, "c"))[1]
+        position, newest = queue.submit("d", "", job(order, "d"))
+        # 最早排队的 b 被丢弃，新任务排在 c 之后
+        assert position == 2
+        assert queue.dropped == 1 and queue.rejected == 0
+        with pytest.raises(QueueFullError):
+            await oldest
+        gate.set()
+        await asyncio.gather(running, queued, newest)
+        assert order == ["a", "c", "d"]
+        assert queue.user_jobs("b") == 0
+
+    asyncio.run(run())
+
+
+def test_close_cancels_pending_jobs():
+    async def run() -> None:
+        queue = FairJobQueue(max_workers=1, max_per_user=0)
+        gate = asyncio.Event()
+        order: list[str] = []
+        running = queue.submit("a", "", job(order, "a", gate))[1]
+        pending = queue.submit("b", "", job(order, "b"))[1]
+        await asyncio.sleep(0)
+        await queue.close()
+        assert running.cancelled() and pending.cancelled()
+        assert order == ["a"]
+
+    asyncio.run(run())
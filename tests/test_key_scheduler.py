@@ -0,0 +1,126 @@
+"""API Key 调度器测试"""
+
+import asyncio
+
+import pytest
+
+from astrbot_plugin_text2img.providers.errors import AuthError, RateLimitedError
+from astrbot_plugin_text2img.providers.key_scheduler import KeyScheduler
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_spreads_in_flight_requests_across_keys():
+    scheduler = KeyScheduler(["a", "b", "c"], clock=FakeClock())
+
+    async def run():
+        return [await scheduler.acquire() for _ in range(3)]
+
+    assert sorted(asyncio.run(run())) == ["a", "b", "c"]
+    assert [s["in_flight"] for s in scheduler.snapshot()] == [1, 1, 1]
+
+
+def test_prefers_lowest_expected_latency():
+    clock = FakeClock()
+    scheduler = KeyScheduler(["a", "b"], clock=clock)
+
+    async def run():
+        for key, latency in (("a", 1.0), ("b", 3.0)):
+            assert await scheduler.acquire() == key
+            scheduler.release(key, latency=latency)
+            clock.now += 1
+        # a 的预计耗时依次为 1、2、3；第三个请求时与 b 持平，取进行中更少的 b
+        return [await scheduler.acquire() for _ in range(3)]
+
+    assert asyncio.run(run()) == ["a", "a", "b"]
+
+
+def test_latency_ewma_ignores_failed_calls():
+    scheduler = KeyScheduler(["a"], latency_alpha=0.5, clock=FakeClock())
+
+    async def run():
+        for latency, error in ((1.0, None), (3.0, None), (9.0, RuntimeError())):
+            await scheduler.acquire()
+            scheduler.release("a", latency=latency, error=error)
+
+    asyncio.run(run())
+    state = scheduler.snapshot()[0]
+    assert state["latency_ewma"] == pytest.approx(2.0)
+    assert state["in_flight"] == 0
+
+
+def test_rate_limited_key_cools_down():
+    clock = FakeClock()
+    scheduler = KeyScheduler(["a", "b"], cooldown_seconds=30, clock=clock)
+
+    async def run():
+        key = await scheduler.acquire()
+        scheduler.release(key, error=RateLimitedError("429", retry_after=5))
+        other = "b" if key == "a" else "a"
+        assert scheduler.snapshot()[0 if key == "a" else 1]["cooldown"] == 5
+        # 冷却期间只会选到另一个 Key
+        assert await scheduler.acquire() == other
+        scheduler.release(other, error=RateLimitedError("429"))
+        # 全部冷却时退回到最早恢复的 Key
+        assert scheduler.pick_key() == key
+
+        clock.now += 5
+        assert await scheduler.acquire() == key
+
+    asyncio.run(run())
+
+
+def test_auth_error_disables_key():
+    clock = FakeClock()
+    scheduler = KeyScheduler(["a", "b"], auth_disable_seconds=60, clock=clock)
+
+    async def run():
+        scheduler.release(await scheduler.acquire(), error=AuthError("401"))
+        scheduler.release(await scheduler.acquire(), error=AuthError("401"))
+        assert all(s["disabled"] for s in scheduler.snapshot())
+        assert not scheduler.has_spare_capacity()
+        with pytest.raises(AuthError):
+            await scheduler.acquire()
+
+        clock.now += 60
+        assert scheduler.has_spare_capacity()
+        assert await scheduler.acquire() in ("a", "b")
+
+    asyncio.run(run())
+
+
+def test_release_wakes_waiter_at_concurrency_limit():
+    scheduler = KeyScheduler(["a"], max_concurrency=1, clock=FakeClock())
+
+    async def run():
+        first = await scheduler.acquire()
+        assert not scheduler.has_spare_capacity()
+        waiter = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        scheduler.release(first, latency=1.0)
+        assert await asyncio.wait_for(waiter, 1) == "a"
+        assert scheduler.snapshot()[0]["in_flight"] == 1
+
+        # 未知的 Key 和重复归还都不会让计数出错
+        scheduler.release("missing")
+        scheduler.release("a")
+        scheduler.release("a")
+        assert scheduler.snapshot()[0]["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_empty_key_list():
+    scheduler = KeyScheduler([])
+    with pytest.raises(ValueError):
+        scheduler.pick_key()
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.acquire())
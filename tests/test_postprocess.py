@@ -0,0 +1,40 @@
+"""图片后处理测试"""
+
+import asyncio
+import os
+
+import pytest
+
+from astrbot_plugin_text2img.core.postprocess import (
+    FORMAT_WEBP,
+    ImagePostProcessor,
+    PostProcessOptions,
+)
+
+PILImage = pytest.importorskip("PIL.Image")
+
+
+def test_concurrent_process_runs_once(tmp_path):
+    source = tmp_path / "image.png"
+    PILImage.new("RGB", (256, 256), "red").save(source)
+    processor = ImagePostProcessor(PostProcessOptions(format=FORMAT_WEBP))
+
+    async def run():
+        return await asyncio.gather(
+            *(processor.process(str(source)) for _ in range(5))
+        )
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        processor.close()
+
+    outputs = {path for path, _ in results}
+    assert len(outputs) == 1
+    output = outputs.pop()
+    assert output != str(source)
+    assert sum(1 for _, size in results if size) == 1
+    assert processor.stats() == {"processed": 1, "failures": 0}
+    with PILImage.open(output) as image:
+        assert image.format == "WEBP"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,22 @@
+"""提示词规范化测试"""
+
+from astrbot_plugin_text2img.core.prompt import normalize_prompt
+
+
+def test_width_case_and_punctuation_fold():
+    assert normalize_prompt("Ａ　Cat，sleeping!") == normalize_prompt("a cat sleeping")
+
+
+def test_emoji_only_prompts_differ():
+    assert normalize_prompt("🐶") != normalize_prompt("🐱")
+    assert normalize_prompt("🐶") == "🐶"
+
+
+def test_symbols_are_kept():
+    assert normalize_prompt("C++ logo") != normalize_prompt("C logo")
+    assert normalize_prompt("1+1") != normalize_prompt("1-1")
+
+
+def test_never_empty_key():
+    assert normalize_prompt("!!!") == "!!!"
+    assert normalize_prompt("!!!") != normalize_prompt("???")
@@ -0,0 +1,114 @@
+"""令牌桶限流测试"""
+
+import pytest
+
+from astrbot_plugin_text2img.core.rate_limiter import RateLimiter, TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_tokens_refill_over_time():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(60, burst=2, clock=clock)
+    limiter.consume("u", 0.0)
+    limiter.consume("u", 0.0)
+    assert limiter.wait_time("u", 0.0) == pytest.approx(1.0)
+    assert limiter.wait_time("u", 0.5) == pytest.approx(0.5)
+    assert limiter.wait_time("u", 1.0) == 0.0
+
+
+def test_refill_is_capped_at_burst():
+    limiter = TokenBucketLimiter(60, burst=2, clock=FakeClock())
+    limiter.consume("u", 0.0)
+    limiter.consume("u", 0.0)
+    # 空闲很久后也只能连续通过 burst 次
+    limiter.consume("u", 100.0)
+    limiter.consume("u", 100.0)
+    assert limiter.wait_time("u", 100.0) == pytest.approx(1.0)
+
+
+def test_rejection_returns_retry_after_without_consuming():
+    clock = FakeClock()
+    limiter = RateLimiter(TokenBucketLimiter(6, burst=1, clock=clock), clock=clock)
+    assert limiter.check("u") == 0.0
+    assert limiter.check("u") == pytest.approx(10.0)
+    clock.now = 4.0
+    assert limiter.check("u") == pytest.approx(6.0)
+    assert limiter.rejected == 2
+    # 被拒绝的检查不消耗令牌，到点即可通过
+    clock.now = 10.0
+    assert limiter.check("u") == 0.0
+
+
+def test_full_buckets_expire_from_wheel():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(60, burst=2, clock=clock)
+    limiter.consume("a", 0.0)
+    limiter.consume("b", 0.0)
+    limiter.consume("b", 0.0)
+    assert len(limiter) == 2
+    # a 在 1s 时补满，b 在 2s 时补满
+    limiter.wait_time("other", 1.0)
+    assert len(limiter) == 1
+    limiter.wait_time("other", 2.0)
+    assert len(limiter) == 0
+    # 删除的桶等价于满桶
+    assert limiter.wait_time("b", 2.0) == 0.0
+
+
+def test_expiry_beyond_one_wheel_turn():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(6, burst=1, wheel_slots=4, clock=clock)
+    limiter.consume("u", 0.0)
+    # 10s 后补满，超过时间轮一圈 (4s)，中途不能删除
+    limiter.wait_time("other", 5.0)
+    assert len(limiter) == 1
+    assert limiter.wait_time("u", 5.0) == pytest.approx(5.0)
+    limiter.wait_time("other", 11.0)
+    assert len(limiter) == 0
+
+
+def test_reconsume_moves_bucket_to_new_slot():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(60, burst=1, wheel_slots=8, clock=clock)
+    limiter.consume("u", 0.0)
+    limiter.consume("u", 1.0)
+    # 第一次登记的 1s 到期项不应删除已重新消耗的桶
+    limiter.wait_time("other", 1.5)
+    assert len(limiter) == 1
+    assert limiter.wait_time("u", 1.5) == pytest.approx(0.5)
+    limiter.wait_time("other", 2.0)
+    assert len(limiter) == 0
+
+
+def test_user_and_group_limits():
+    clock = FakeClock()
+    limiter = RateLimiter(
+        TokenBucketLimiter(60, burst=1, clock=clock),
+        group=TokenBucketLimiter(60, burst=2, clock=clock),
+        clock=clock,
+    )
+    assert limiter.check("a", "g") == 0.0
+    # 用户桶已空
+    assert limiter.check("a", "g") > 0
+    assert limiter.check("b", "g") == 0.0
+    # 群桶已空，其他用户也被拒绝
+    assert limiter.check("c", "g") > 0
+    # 私聊不计入群限流，其他群不受影响
+    assert limiter.check("c") == 0.0
+    assert limiter.check("d", "h") == 0.0
+    assert limiter.stats() == {"user_buckets": 4, "group_buckets": 2, "rejected": 2}
+
+
+def test_zero_rate_disables_limit():
+    clock = FakeClock()
+    limiter = RateLimiter(TokenBucketLimiter(0, clock=clock), clock=clock)
+    for _ in range(100):
+        assert limiter.check("u") == 0.0
+    assert limiter.stats()["user_buckets"] == 0
@@ -0,0 +1,51 @@
+"""生图结果缓存测试"""
+
+from astrbot_plugin_text2img.core.image_store import ImageStore
+from astrbot_plugin_text2img.core.result_cache import ResultCache
+
+
+def make_key(prompt: str):
+    return ResultCache.make_key("p", "m", prompt, "", "1024x1024", 1)
+
+
+def test_liveness_checked_against_store_index(tmp_path):
+    store = ImageStore(tmp_path, max_bytes=1000)
+    cache = ResultCache(is_alive=store.__contains__)
+    # 路径不存在于磁盘上，只要仍在索引中就视为命中
+    store.add("a.png", 10)
+    store.add("b.png", 10)
+    cache.put(make_key("cat"), ["a.png", "b.png"], 20)
+
+    assert cache.get(make_key("cat")) == ["a.png", "b.png"]
+    store.remove("b.png")
+    assert cache.get(make_key("cat")) is None
+    assert len(cache) == 0 and cache.total_bytes == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_store_eviction_discards_cache_entry(tmp_path):
+    cache = ResultCache()
+    store = ImageStore(tmp_path, max_bytes=10, on_evict=cache.discard_path)
+    store.add("a.png", 10)
+    cache.put(make_key("cat"), ["a.png"], 10)
+    store.add("b.png", 10)
+    cache.put(make_key("dog"), ["b.png"], 10)
+
+    assert store.collect_evictions() == ["a.png"]
+    assert cache.get(make_key("cat")) is None
+    assert cache.get(make_key("dog")) == ["b.png"]
+
+
+def test_put_evicts_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2, max_bytes=100)
+    assert cache.put(make_key("a"), ["a.png"], 40) == []
+    assert cache.put(make_key("b"), ["b.png"], 40) == []
+    cache.get(make_key("a"))
+    # 条目数超限，淘汰最久未命中的 b
+    assert cache.put(make_key("c"), ["c.png"], 10) == ["b.png"]
+    # 字节数超限，淘汰 a
+    assert cache.put(make_key("d"), ["d.png"], 60) == ["a.png"]
+    # 单个条目超过总上限时不缓存
+    assert cache.put(make_key("e"), ["e.png"], 200) == []
+    assert cache.peek(make_key("e")) is None
+    assert cache.total_bytes == 70
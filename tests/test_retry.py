@@ -0,0 +1,128 @@
+"""重试引擎测试"""
+
+import asyncio
+import random
+import time
+
+import pytest
+
+from astrbot_plugin_text2img.providers.errors import (
+    DeadlineExceededError,
+    InvalidPromptError,
+    RetryableError,
+)
+from astrbot_plugin_text2img.providers.retry import (
+    Deadline,
+    RetryPolicy,
+    call_with_retry,
+)
+
+
+class RecordingPolicy(RetryPolicy):
+    """记录退避次数，不真正等待"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.backoffs: list[int] = []
+
+    def backoff(self, attempt: int) -> float:
+        self.backoffs.append(attempt)
+        return 0.0
+
+
+def failing(error: BaseException, calls: list):
+    async def func():
+        calls.append(time.monotonic())
+        raise error
+
+    return func
+
+
+def test_backoff_jitter_stays_within_cap():
+    random.seed(0)
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, multiplier=2.0)
+    for attempt, cap in ((1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (10, 5.0)):
+        delays = [policy.backoff(attempt) for _ in range(200)]
+        assert all(0 <= d <= cap for d in delays)
+        # 全抖动：取值覆盖整个区间，而不是集中在上限附近
+        assert min(delays) < cap * 0.1 and max(delays) > cap * 0.9
+
+
+def test_retries_until_success():
+    attempts = []
+
+    async def func():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RetryableError("busy")
+        return "ok"
+
+    policy = RecordingPolicy(max_attempts=3)
+    assert asyncio.run(call_with_retry(func, policy)) == "ok"
+    assert policy.backoffs == [1, 2]
+
+
+def test_gives_up_after_max_attempts():
+    calls = []
+    policy = RecordingPolicy(max_attempts=3)
+    with pytest.raises(RetryableError):
+        asyncio.run(call_with_retry(failing(RetryableError("busy"), calls), policy))
+    assert len(calls) == 3
+
+
+def test_non_retryable_error_is_raised_immediately():
+    calls = []
+    policy = RecordingPolicy(max_attempts=5)
+    with pytest.raises(InvalidPromptError):
+        asyncio.run(
+            call_with_retry(failing(InvalidPromptError("bad"), calls), policy)
+        )
+    assert len(calls) == 1
+    assert policy.backoffs == []
+
+
+def test_deadline_cuts_backoff_short():
+    calls = []
+    # 退避上限远大于剩余预算时不再等待，直接抛出最近一次的错误
+    policy = RetryPolicy(max_attempts=5, base_delay=100.0, max_delay=100.0)
+    random.seed(1)
+    started = time.monotonic()
+    with pytest.raises(RetryableError):
+        asyncio.run(
+            call_with_retry(
+                failing(RetryableError("busy"), calls), policy, Deadline(0.5)
+            )
+        )
+    assert len(calls) == 1
+    assert time.monotonic() - started < 0.5
+
+
+def test_deadline_interrupts_slow_call():
+    async def slow():
+        await asyncio.sleep(10)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(call_with_retry(slow, RecordingPolicy(), Deadline(0.05)))
+    assert time.monotonic() - started < 1
+
+
+def test_expired_deadline_skips_call():
+    calls = []
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(
+            call_with_retry(
+                failing(RetryableError("x"), calls), RetryPolicy(), deadline
+            )
+        )
+    assert calls == []
+
+
+def test_unlimited_deadline():
+    for seconds in (None, 0, -1):
+        deadline = Deadline(seconds)
+        assert deadline.remaining() is None
+        assert not deadline.expired()
@@ -0,0 +1,46 @@
+"""慢请求日志测试"""
+
+import json
+
+from astrbot_plugin_text2img.core.anonymize import Anonymizer
+from astrbot_plugin_text2img.core.tracing import SlowRequestLog, Trace
+
+
+def make_trace() -> Trace:
+    trace = Trace("t2img", user="12345", group="67890", prompt="一只猫")
+    trace.finish()
+    return trace
+
+
+def test_slow_log_redacts_by_default(tmp_path):
+    anonymizer = Anonymizer("salt")
+    log = SlowRequestLog(tmp_path / "slow.jsonl", 0.0, anonymizer=anonymizer)
+    log.write(log.make_record(make_trace()))
+    log.close()
+
+    content = (tmp_path / "slow.jsonl").read_text(encoding="utf-8")
+    assert "12345" not in content and "67890" not in content
+    assert "一只猫" not in content
+    record = json.loads(content)
+    assert record["user"] == anonymizer.hash_id("12345")
+    assert record["prompt_len"] == 3
+    assert record["prompt_hash"] == anonymizer.prompt_fields("一只猫")["prompt_hash"]
+
+
+def test_slow_log_batch_items_redacted(tmp_path):
+    trace = Trace("t2img_batch", user="12345", items=[("一只狗", "1:1", "s", 2)])
+    trace.finish()
+    log = SlowRequestLog(tmp_path / "slow.jsonl", 0.0, anonymizer=Anonymizer("salt"))
+    record = log.make_record(trace)
+    log.close()
+    assert record["items"][0]["prompt_len"] == 3
+    assert record["items"][0]["count"] == 2
+    assert "一只狗" not in json.dumps(record, ensure_ascii=False)
+
+
+def test_slow_log_raw_without_anonymizer(tmp_path):
+    log = SlowRequestLog(tmp_path / "slow.jsonl", 0.0)
+    record = log.make_record(make_trace())
+    log.close()
+    assert record["user"] == "12345"
+    assert record["prompt"] == "一只猫"
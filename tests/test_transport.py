@@ -0,0 +1,21 @@
+"""共享 HTTP 传输层测试"""
+
+import asyncio
+
+import pytest
+
+from astrbot_plugin_text2img.providers.transport import HttpTransport
+
+
+def test_closed_transport_does_not_reopen():
+    async def run() -> None:
+        transport = HttpTransport()
+        session = await transport.get_session()
+        await transport.close()
+        assert session.closed
+        with pytest.raises(RuntimeError):
+            await transport.get_session()
+        with pytest.raises(RuntimeError):
+            transport.get_httpx_client()
+
+    asyncio.run(run())